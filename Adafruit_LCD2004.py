@@ -1,4 +1,4 @@
-from time import sleep
+from time import sleep, monotonic
 
 
 class Adafruit_CharLCD(object):
@@ -45,7 +45,25 @@ class Adafruit_CharLCD(object):
     LCD_5x10DOTS            = 0x04
     LCD_5x8DOTS             = 0x00
 
-    def __init__(self, pin_rs=25, pin_e=24, pins_db=[23, 17, 21, 22], GPIO=None):
+    # Command execution times in microseconds: 'command' for ordinary commands
+    # and character writes, 'clear' for clear/home, 'init' for the 8-bit
+    # function-set steps of the power-on sequence. 'datasheet' is the HD44780U
+    # at its nominal 270 kHz oscillator (37 us + 4 us address update).
+    TIMING_PROFILES = {
+        'conservative': {'command': 1000, 'clear': 3000, 'init': 4100},
+        'datasheet':    {'command': 41,   'clear': 1520, 'init': 4100},
+    }
+
+    # Time for one byte on a 400 kHz I2C bus. Characters packed into one burst
+    # are latched at least three bytes apart, which covers the command time of
+    # any profile up to that many microseconds.
+    I2C_BYTE_MICROSECONDS = 22.5
+
+    # Give up on the busy flag after this many polls that never see it clear
+    # (R/W is probably tied low) and fall back to timed waits.
+    BUSY_TIMEOUT_LIMIT = 3
+
+    def __init__(self, pin_rs=25, pin_e=24, pins_db=[23, 17, 21, 22], GPIO=None, pin_rw=None, timing='conservative'):
         # Emulate the old behavior of using RPi.GPIO if we haven't been given
         # an explicit GPIO interface to use
         if not GPIO:
@@ -55,16 +73,38 @@ class Adafruit_CharLCD(object):
         self.pin_rs = pin_rs
         self.pin_e = pin_e
         self.pins_db = pins_db
+        # With R/W wired the busy flag tells us when a command has finished;
+        # otherwise we wait for the time given by the timing profile.
+        self.pin_rw = pin_rw
+        self.busy_flag = False  # enabled once the 4-bit interface is set up
+        self.busy_timeouts = 0
+        self.ready_at = 0.0
+        self.setTiming(timing)
 
         self.GPIO.setmode(GPIO.BCM) #GPIO=None use Raspi PIN in BCM mode
         self.GPIO.setup(self.pin_e, GPIO.OUT)
         self.GPIO.setup(self.pin_rs, GPIO.OUT)
+        if self.pin_rw is not None:
+            self.GPIO.setup(self.pin_rw, GPIO.OUT)
+            self.GPIO.output(self.pin_rw, False)
 
         for pin in self.pins_db:
             self.GPIO.setup(pin, GPIO.OUT)
 
-        self.write4bits(0x33)  # initialization
-        self.write4bits(0x32)  # initialization
+        # GPIO adapters that can latch a whole sequence of port states in one
+        # transfer (e.g. the PCF8574 backpack) get each command or character
+        # as a single precomputed burst instead of ~20 single-pin writes.
+        self.burst = hasattr(self.GPIO, 'outputBurst')
+        if self.burst:
+            self._buildBurstTables()
+
+        # Reset by instruction (HD44780U datasheet, figure 24): 8-bit function
+        # set three times, each as a single nibble given time to finish (the
+        # first needs more than 4.1 ms), then the switch to 4-bit mode
+        self.writeNibble(0x3, self.timing['init'])
+        self.writeNibble(0x3, 100)
+        self.writeNibble(0x3, self.timing['command'])
+        self.writeNibble(0x2, self.timing['command'])
         self.write4bits(0x28)  # 2 line 5x7 matrix
         self.write4bits(0x0C)  # turn cursor off 0x0E to enable cursor
         self.write4bits(0x06)  # shift cursor right
@@ -78,6 +118,7 @@ class Adafruit_CharLCD(object):
         self.displaymode = self.LCD_ENTRYLEFT | self.LCD_ENTRYSHIFTDECREMENT
         self.write4bits(self.LCD_ENTRYMODESET | self.displaymode)  # set the entry mode
 
+        self.busy_flag = self.pin_rw is not None
         self.clear()
 
     def begin(self, cols, lines):
@@ -85,13 +126,17 @@ class Adafruit_CharLCD(object):
             self.numlines = lines
             self.displayfunction |= self.LCD_2LINE
 
+    def setTiming(self, timing):
+        """ Select a timing profile by name or pass a dict of microsecond values """
+        if isinstance(timing, str):
+            timing = self.TIMING_PROFILES[timing]
+        self.timing = dict(self.TIMING_PROFILES['conservative'], **timing)
+
     def home(self):
-        self.write4bits(self.LCD_RETURNHOME)  # set cursor position to zero
-        self.delayMicroseconds(3000)  # this command takes a long time!
+        self.write4bits(self.LCD_RETURNHOME)  # set cursor position to zero, takes the 'clear' time
 
     def clear(self):
-        self.write4bits(self.LCD_CLEARDISPLAY)  # command to clear display
-        self.delayMicroseconds(3000)  # 3000 microsecond sleep, clearing the display takes a long time
+        self.write4bits(self.LCD_CLEARDISPLAY)  # command to clear display, takes the 'clear' time
 
     def setCursor(self, col, row):
         self.row_offsets = [0x00, 0x40, 0x14, 0x54]
@@ -157,9 +202,139 @@ class Adafruit_CharLCD(object):
         self.displaymode &= ~self.LCD_ENTRYSHIFTINCREMENT
         self.write4bits(self.LCD_ENTRYMODESET | self.displaymode)
 
+    def _buildBurstTables(self):
+        """ Precompute the port byte sequence for every command and character """
+        rs = 1 << self.pin_rs
+        e = 1 << self.pin_e
+        nibbles = []
+        for n in range(16):
+            value = 0
+            for i in range(4):
+                if n & (1 << i):
+                    value |= 1 << self.pins_db[i]
+            nibbles.append(value)
+        self.burst_mask = rs | e
+        for pin in self.pins_db:
+            self.burst_mask |= 1 << pin
+        if self.pin_rw is not None:
+            self.burst_mask |= 1 << self.pin_rw  # held low while writing
+        self.burst_tables = {}
+        for char_mode, select in ((False, 0), (True, rs)):
+            table = []
+            for bits in range(256):
+                seq = []
+                for nibble in (nibbles[bits >> 4], nibbles[bits & 0x0F]):
+                    # data set up with E low, then E high, then E low to latch
+                    seq += [select | nibble, select | nibble | e, select | nibble]
+                table.append(seq)
+            self.burst_tables[char_mode] = table
+
+    def executionTime(self, bits, char_mode=False):
+        """ Microseconds the controller needs to process this command """
+        if char_mode:
+            return self.timing['command']
+        if bits in (self.LCD_CLEARDISPLAY, self.LCD_RETURNHOME, self.LCD_RETURNHOME | 1):
+            return self.timing['clear']
+        if bits & 0xF0 == 0x30:
+            return self.timing['init']  # 8-bit function set, only sent while initialising
+        return self.timing['command']
+
+    def waitReady(self):
+        """ Wait until the previous command has finished, but no longer """
+        remaining = self.ready_at - monotonic()
+        if remaining <= 0:
+            return
+        if not self.busy_flag:
+            sleep(remaining)
+            return
+        # The profile time is the upper bound; the busy flag usually clears sooner.
+        while self.readBusyFlag():
+            if monotonic() >= self.ready_at:
+                self.busy_timeouts += 1
+                if self.busy_timeouts >= self.BUSY_TIMEOUT_LIMIT:
+                    self.busy_flag = False
+                return
+        self.busy_timeouts = 0
+
+    def readBusyFlag(self):
+        """ Read the HD44780 busy flag (DB7) through the R/W line """
+        rw = 1 << self.pin_rw
+        e = 1 << self.pin_e
+        if self.burst:
+            data = 0
+            for pin in self.pins_db:
+                data |= 1 << pin  # PCF8574 pins must be high to be read
+            mask = self.burst_mask | rw
+            self.GPIO.outputBurst(mask, [rw | data, rw | data | e])
+            busy = self.GPIO.input(self.pins_db[3])
+            # clock out the low nibble, which holds the address counter
+            self.GPIO.outputBurst(mask, [rw | data, rw | data | e, rw | data])
+            return busy
+        for pin in self.pins_db:
+            self.GPIO.setup(pin, self.GPIO.IN)
+        self.GPIO.output(self.pin_rs, False)
+        self.GPIO.output(self.pin_rw, True)
+        self.GPIO.output(self.pin_e, True)
+        busy = self.GPIO.input(self.pins_db[3])
+        self.GPIO.output(self.pin_e, False)
+        self.GPIO.output(self.pin_e, True)
+        self.GPIO.output(self.pin_e, False)
+        self.GPIO.output(self.pin_rw, False)
+        for pin in self.pins_db:
+            self.GPIO.setup(pin, self.GPIO.OUT)
+        return busy
+
+    def measureTiming(self, samples=5):
+        """ Time real command execution with the busy flag (needs pin_rw).
+        Returns a profile dict that can be passed to setTiming() """
+        if not self.busy_flag:
+            raise RuntimeError('measuring LCD timing needs the busy flag (pin_rw)')
+        limit = self.TIMING_PROFILES['conservative']
+
+        def worst(bits, timeout_us):
+            longest = 0.0
+            for _ in range(samples):
+                self.waitReady()
+                self.write4bits(bits)
+                start = monotonic()
+                while self.readBusyFlag():
+                    if (monotonic() - start) * 1000000 > timeout_us:
+                        raise RuntimeError('LCD busy flag never cleared; is R/W wired?')
+                longest = max(longest, monotonic() - start)
+                self.ready_at = 0.0
+            return int(longest * 1000000) + 1
+
+        profile = {
+            'command': worst(self.LCD_DISPLAYCONTROL | self.displaycontrol, limit['command'] * 10),
+            'clear': worst(self.LCD_CLEARDISPLAY, limit['clear'] * 10),
+            'init': limit['init'],
+        }
+        return profile
+
     def write4bits(self, bits, char_mode=False):
         """ Send command to LCD """
-        self.delayMicroseconds(1000)  # 1000 microsecond sleep
+        self.waitReady()
+        self._send(bits, char_mode)
+        self.ready_at = monotonic() + self.executionTime(bits, char_mode) / 1000000.0
+
+    def writeNibble(self, nibble, microseconds):
+        """ Send a lone 4-bit transfer (command mode) and allow it `microseconds`;
+        only meaningful before the controller is in 4-bit mode """
+        self.waitReady()
+        if self.burst:
+            # the first half of the table entry for the byte with this high nibble
+            self.GPIO.outputBurst(self.burst_mask, self.burst_tables[False][(nibble & 0x0F) << 4][:3])
+        else:
+            self.GPIO.output(self.pin_rs, False)
+            for i in range(4):
+                self.GPIO.output(self.pins_db[i], bool(nibble & (1 << i)))
+            self.pulseEnable()
+        self.ready_at = monotonic() + microseconds / 1000000.0
+
+    def _send(self, bits, char_mode):
+        if self.burst:
+            self.GPIO.outputBurst(self.burst_mask, self.burst_tables[bool(char_mode)][bits & 0xFF])
+            return
         bits = bin(bits)[2:].zfill(8)
         self.GPIO.output(self.pin_rs, char_mode)
         for pin in self.pins_db:
@@ -189,12 +364,46 @@ class Adafruit_CharLCD(object):
 
     def message(self, text):
         """ Send string to LCD. Newline wraps to second line"""
+        if self.burst and self.timing['command'] <= 3 * self.I2C_BYTE_MICROSECONDS:
+            # The I2C bus itself spaces the characters far enough apart, so
+            # the whole string goes out as one burst.
+            seq = []
+            for char in text:
+                if char == '\n':
+                    seq += self.burst_tables[False][0xC0]
+                else:
+                    seq += self.burst_tables[True][ord(char) & 0xFF]
+            if seq:
+                self.waitReady()
+                self.GPIO.outputBurst(self.burst_mask, seq)
+                self.ready_at = monotonic() + self.timing['command'] / 1000000.0
+            return
         for char in text:
             if char == '\n':
                 self.write4bits(0xC0)  # next line
             else:
                 self.write4bits(ord(char), True)
 
+    def write(self, codes):
+        """ Send raw character codes (a list of ints); no newline handling """
+        if self.burst and self.timing['command'] <= 3 * self.I2C_BYTE_MICROSECONDS:
+            seq = []
+            for code in codes:
+                seq += self.burst_tables[True][code & 0xFF]
+            if seq:
+                self.waitReady()
+                self.GPIO.outputBurst(self.burst_mask, seq)
+                self.ready_at = monotonic() + self.timing['command'] / 1000000.0
+            return
+        for code in codes:
+            self.write4bits(code, True)
+
+    def createChar(self, location, charmap):
+        """ Load a 5x8 custom character (8 row bitmaps) into CGRAM slot 0-7.
+        Leaves the address counter in CGRAM: call setCursor before writing text """
+        self.write4bits(self.LCD_SETCGRAMADDR | ((location & 0x7) << 3))
+        self.write([row & 0x1F for row in charmap[:8]])
+
 
 if __name__ == '__main__':
     lcd = Adafruit_CharLCD()
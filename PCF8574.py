@@ -4,29 +4,55 @@
 # Author      : freenove
 # modification: 2022/06/28
 ########################################################################
-import smbus
+try:
+    import smbus
+except ImportError:
+    smbus = None    # a bus must then be passed in, e.g. lcd_emulator.EmulatedSMBus
 import time
 class PCF8574_I2C(object):
     OUPUT = 0
     INPUT = 1
+    BLOCK_SIZE = 32     # SMBus block writes carry at most 32 data bytes after the command byte
     
-    def __init__(self,address):
+    def __init__(self,address,bus=None):
         # Note you need to change the bus number to 0 if running on a revision 1 Raspberry Pi.
-        self.bus = smbus.SMBus(1)
+        if bus is None:
+            bus = smbus.SMBus(1)
+        self.bus = bus
         self.address = address
         self.currentValue = 0
+        self.transactions = 0   # I2C transfers so far (for the metrics endpoint)
         self.writeByte(0)   #I2C test.
         
     def readByte(self):#Read PCF8574 all port of the data
-        #value = self.bus.read_byte(self.address)
-        return self.currentValue#value
+        # Pins written low always read low; pins written high read whatever
+        # drives them (quasi-bidirectional port).
+        self.transactions += 1
+        return self.bus.read_byte(self.address)
         
     def writeByte(self,value):#Write data to PCF8574 port
         self.currentValue = value
+        self.transactions += 1
         self.bus.write_byte(self.address,value)
 
+    def writeBytes(self,values):#Write a sequence of data to PCF8574 port in as few I2C transactions as possible
+        # The PCF8574 has no registers: every byte after the address, including the
+        # SMBus "command" byte, is latched onto the port in turn.
+        values = list(values)
+        if not values:
+            return
+        step = self.BLOCK_SIZE + 1
+        for i in range(0, len(values), step):
+            chunk = values[i:i+step]
+            self.transactions += 1
+            if len(chunk) == 1:
+                self.bus.write_byte(self.address,chunk[0])
+            else:
+                self.bus.write_i2c_block_data(self.address,chunk[0],chunk[1:])
+        self.currentValue = values[-1]
+
     def digitalRead(self,pin):#Read PCF8574 one port of the data
-        value = readByte()  
+        value = self.readByte()
         return (value&(1<<pin)==(1<<pin)) and 1 or 0
         
     def digitalWrite(self,pin,newvalue):#Write data to PCF8574 one port
@@ -54,17 +80,22 @@ class PCF8574_GPIO(object):#Standardization function interface
     IN = 1
     BCM = 0
     BOARD = 0
-    def __init__(self,address):
-        self.chip = PCF8574_I2C(address)
+    def __init__(self,address,bus=None):
+        self.chip = PCF8574_I2C(address,bus)
         self.address = address
     def setmode(self,mode):#PCF8574 port belongs to two-way IO, do not need to set the input and output model
         pass
     def setup(self,pin,mode):
-        pass
+        if mode == self.IN:
+            # a PCF8574 pin can only be read while it is written high
+            self.chip.digitalWrite(pin,1)
     def input(self,pin):#Read PCF8574 one port of the data
         return self.chip.digitalRead(pin)
     def output(self,pin,value):#Write data to PCF8574 one port
         self.chip.digitalWrite(pin,value)
+    def outputBurst(self,mask,values):#Write a sequence of port states in one burst; pins outside mask keep their value
+        base = self.chip.currentValue & ~mask
+        self.chip.writeBytes([base | (value & mask) for value in values])
         
 def destroy():
     bus.close()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""Benchmarks for the jumper's hot paths, runnable without any hardware.
+
+The LCD is the emulated one from lcd_emulator.py (simulated I2C time is
+reported next to the measured CPU time), the NeoPixel strip is a byte
+counter and SQS is the in-memory stand-in from sqs_local.py.
+
+    python3 benchmark.py                    # writes benchmarks/<commit>.json
+    python3 benchmark.py --compare benchmarks/abc1234.json
+
+Every result is per operation; `wall_ms` is CPU time on this machine and
+`bus_ms` the I2C time the same transfers take on a 400 kHz bus.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from lcd_bigdigits import BigCountdown
+from lcd_marquee import Marquee
+from message_layout import DisplayMessage, LayoutEngine
+from neopixel_effects import Chase, FrameEngine, Rainbow, Twinkle
+from sqs_local import LocalSQS, LOCAL_QUEUE_URL
+from sqs_pipeline import MessageFetcher
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(SCRIPT_DIR, 'benchmarks')
+
+# I2C time per byte at 400 kHz (9 clocks per byte)
+BYTE_SECONDS = 22.5e-6
+
+MESSAGES = [
+    'Merry Christmas!',
+    'Merry Christmas from everyone on the third floor, see you at the party',
+    '{"message": "Ho ho ho"}',
+    '{"message": "A very long message that will not fit on the screen at all, '
+    'so the last line has to take everything that is left over after wrapping"}',
+    'Short',
+]
+
+BODIES = [
+    'plain text body',
+    '{"message": "json body"}',
+    json.dumps({'Type': 'Notification', 'Message': json.dumps({'message': 'sns wrapped'})}),
+    json.dumps({'Type': 'Notification', 'Message': 'sns plain'}),
+    '[1, 2, 3]',
+]
+
+
+def load_jumper():
+    """Import cslm-christmas.py (its name is not a valid module name) with an emulated LCD."""
+    spec = importlib.util.spec_from_file_location('cslm_christmas', os.path.join(SCRIPT_DIR, 'cslm-christmas.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.LCD_EMULATOR = True
+    # the emulated controller keeps datasheet time, so results stay comparable
+    module.LCD_TIMING_PROFILE = 'datasheet'
+    module.LCD_EMULATOR_BYTE_SECONDS = BYTE_SECONDS
+    module.init_hardware()
+    # measure CPU time; the bus time is accounted for, not slept
+    module.lcd_bus.realtime = False
+    module.lcd_bus.unslept = 0.0
+    return module
+
+
+def measure(fn, min_time=0.5, min_runs=20, bus=None):
+    """Run `fn` repeatedly; returns per-call timings (and I2C counts if `bus` is given)."""
+    times = []
+    before = bus.stats() if bus is not None else None
+    deadline = time.perf_counter() + min_time
+    while len(times) < min_runs or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    result = {
+        'runs': len(times),
+        'wall_ms': statistics.mean(times) * 1000,
+        'wall_median_ms': statistics.median(times) * 1000,
+        'wall_min_ms': min(times) * 1000,
+    }
+    if bus is not None:
+        after = bus.stats()
+        runs = float(len(times))
+        result['transactions'] = (after['transactions'] - before['transactions']) / runs
+        result['bytes'] = (after['bytes'] - before['bytes']) / runs
+        result['bus_ms'] = (after['bus_time'] - before['bus_time']) * 1000 / runs
+        result['overruns'] = after['overruns'] - before['overruns']
+    return result
+
+
+def throughput(fn, items, min_time=0.5):
+    """Calls per second of `fn` over `items`."""
+    count = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            fn(item)
+        count += len(items)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return {'per_second': count / elapsed, 'us_per_call': elapsed * 1e6 / count}
+
+
+def bench_display(jumper, min_time):
+    fb, lcd, bus = jumper.fb, jumper.lcd, jumper.lcd_bus
+    results = {}
+    texts = ['Row repaint one xxxx', 'ROW REPAINT TWO yyyy']
+    state = {'n': 0}
+
+    def repaint():
+        state['n'] += 1
+        jumper.write_row(1, texts[state['n'] % 2])
+    results['row_repaint'] = measure(repaint, min_time, bus=bus)
+
+    def one_cell():
+        state['n'] += 1
+        jumper.write_row(3, 'Time: 12:3%d' % (state['n'] % 10))
+    results['row_one_cell'] = measure(one_cell, min_time, bus=bus)
+
+    def full_message():
+        state['n'] += 1
+        jumper.show_message_lines(jumper.layouts.layout(MESSAGES[state['n'] % 2]).pages[0])
+    results['full_screen_message'] = measure(full_message, min_time, bus=bus)
+
+    screens = ['\n'.join(line * 20 for line in 'abcd'), '\n'.join(line * 20 for line in 'wxyz')]
+
+    def raw_message():
+        state['n'] += 1
+        lcd.setCursor(0, 0)
+        lcd.message(screens[state['n'] % 2])
+    results['lcd_message'] = measure(raw_message, min_time, bus=bus)
+    fb.invalidate()
+
+    jumper.countdown_tick()
+    results['countdown_tick'] = measure(jumper.countdown_tick, min_time, bus=bus)
+
+    def countdown_repaint():
+        # worst case: every countdown row differs from the screen
+        for row in (1, 2, 3):
+            fb.write_row(row, '')
+        fb.commit()
+        jumper.countdown_tick()
+    results['countdown_repaint'] = measure(countdown_repaint, min_time, bus=bus)
+
+    # XMAS_COUNTDOWN=big: a seconds tick redraws one or two big digits, 2-5 transactions
+    big = BigCountdown(fb)
+
+    def big_countdown_tick():
+        state['n'] += 1
+        big.draw(68, 9, 59, state['n'] % 60)
+        fb.commit()
+    big_countdown_tick()
+    results['big_countdown_tick'] = measure(big_countdown_tick, min_time, bus=bus)
+
+    # the same emoji on every repaint: the glyphs stay in CGRAM
+    emoji = ['Merry Xmas 🎄❄★', 'Happy Xmas 🎄❄★']
+
+    def emoji_repaint():
+        state['n'] += 1
+        jumper.write_row(0, emoji[state['n'] % 2])
+    emoji_repaint()
+    uploads = jumper.glyphs.uploads
+    results['emoji_repaint'] = measure(emoji_repaint, min_time, bus=bus)
+    results['emoji_repaint']['glyph_uploads'] = jumper.glyphs.uploads - uploads
+
+    # one hardware-shifted step of a long message
+    marquee = Marquee(lcd, ' '.join(MESSAGES), glyphs=jumper.glyphs)
+    marquee.start()
+    results['marquee_step'] = measure(marquee.step, min_time, bus=bus)
+    marquee.stop()
+    fb.invalidate()
+    return results
+
+
+def bench_formatting(jumper, min_time):
+    uncached = LayoutEngine(jumper.LCD_COLS, jumper.LCD_ROWS, cache_size=0)
+    return {
+        'layout_uncached': throughput(uncached.layout, MESSAGES, min_time),
+        'layout_cached': throughput(jumper.layouts.layout, MESSAGES, min_time),
+        'parse_body': throughput(DisplayMessage.from_body, BODIES, min_time),
+    }
+
+
+class FakeStrip(object):
+    """Stands in for neopixel_write: counts frames and bytes."""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    def show(self, frame):
+        self.frames += 1
+        self.bytes += len(frame)
+
+
+def bench_neopixels(num_pixels, min_time):
+    engine = FrameEngine(num_pixels, brightness=0.2)
+    strip = FakeStrip()
+    results = {}
+    state = {'n': 0}
+
+    def rainbow_cold():
+        # a brightness change drops the frame cache
+        engine.set_brightness(0.2 + (state['n'] % 2) * 0.1)
+        state['n'] += 1
+        for step in range(256):
+            strip.show(engine.rainbow(step))
+    results['rainbow_cycle_cold'] = measure(rainbow_cold, min_time, min_runs=5)
+
+    def rainbow_warm():
+        for step in range(256):
+            strip.show(engine.rainbow(step))
+    rainbow_warm()
+    results['rainbow_cycle_warm'] = measure(rainbow_warm, min_time, min_runs=5)
+
+    for name, effect in (('rainbow_frame', Rainbow()), ('chase_frame', Chase([(255, 0, 0), (0, 255, 0)])),
+                         ('twinkle_frame', Twinkle((255, 255, 255), seed=1))):
+        def frame(effect=effect):
+            state['n'] += 1
+            strip.show(effect.render(engine, state['n'] / 60.0))
+        results[name] = measure(frame, min_time)
+    results['pixels'] = num_pixels
+    return results
+
+
+def bench_ingest(jumper, messages):
+    """Send one message at a time and time it until it is on the (emulated) LCD."""
+    sqs = LocalSQS(seed=1)
+    fetcher = MessageFetcher(sqs, LOCAL_QUEUE_URL, buffer_size=10, wait_time=20)
+    fetcher.start()
+    bus = jumper.lcd_bus
+    latencies = []
+    before = bus.stats()
+    try:
+        for n in range(messages):
+            body = json.dumps({'message': '%s #%d' % (MESSAGES[n % len(MESSAGES)], n)})
+            start = time.perf_counter()
+            sqs.send_message(QueueUrl=LOCAL_QUEUE_URL, MessageBody=body)
+            msg = fetcher.get(timeout=5)
+            if msg is None:
+                raise RuntimeError('message %d was not received' % n)
+            jumper.show_message_lines(jumper.layouts.layout(msg.message).pages[0])
+            latencies.append(time.perf_counter() - start)
+            fetcher.release(msg.receipt)
+            sqs.delete_message(QueueUrl=LOCAL_QUEUE_URL, ReceiptHandle=msg.receipt)
+    finally:
+        fetcher.stop()
+    latencies.sort()
+    after = bus.stats()
+    return {
+        'messages': messages,
+        'latency_median_ms': statistics.median(latencies) * 1000,
+        'latency_p95_ms': latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        'latency_max_ms': latencies[-1] * 1000,
+        # the I2C time is not slept by the emulator; add it for the time on real hardware
+        'bus_ms': (after['bus_time'] - before['bus_time']) * 1000 / messages,
+        'sqs_calls': dict(sqs.calls),
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        return out.stdout.strip() or 'unknown'
+    except Exception:
+        return 'unknown'
+
+
+def flatten(results, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}, numbers only."""
+    out = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            out.update(flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)):
+            out[prefix + key] = value
+    return out
+
+
+def compare(old, new):
+    """Print the metrics that are in both result files with their change."""
+    before = flatten(old['results'])
+    after = flatten(new['results'])
+    print('%-50s %12s %12s %8s' % ('metric', old.get('commit', 'old'), new.get('commit', 'new'), 'change'))
+    for key in sorted(set(before) & set(after)):
+        if key.endswith('.runs'):
+            continue
+        a, b = before[key], after[key]
+        change = '%+.0f%%' % ((b - a) * 100.0 / a) if a else ''
+        print('%-50s %12.4g %12.4g %8s' % (key, a, b, change))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help='result file (default: benchmarks/<commit>.json)')
+    parser.add_argument('--compare', metavar='JSON', help='print the change against an earlier result file')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds to spend on each measurement')
+    parser.add_argument('--pixels', type=int, default=int(os.environ.get('XMAS_NUM_PIXELS', '30')))
+    parser.add_argument('--messages', type=int, default=50, help='messages for the ingest latency run')
+    args = parser.parse_args(argv)
+
+    jumper = load_jumper()
+    report = {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'numpy': sys.modules.get('numpy') is not None,
+        'results': {
+            'display': bench_display(jumper, args.min_time),
+            'formatting': bench_formatting(jumper, args.min_time),
+            'neopixels': bench_neopixels(args.pixels, args.min_time),
+            'ingest_to_display': bench_ingest(jumper, args.messages),
+        },
+    }
+    output = args.output or os.path.join(RESULTS_DIR, '%s.json' % report['commit'])
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+    print(json.dumps(report['results'], indent=2, sort_keys=True))
+    print('Results written to %s' % output)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as fh:
+            compare(json.load(fh), report)
+
+
+if __name__ == '__main__':
+    main()
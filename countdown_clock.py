@@ -0,0 +1,88 @@
+"""Timing for the countdown screen: the Christmas target and when to redraw.
+
+`ChristmasTarget` works out the next Christmas midnight (local time) once
+per day and after that answers "how long to go" with a subtraction.
+`TickScheduler` keeps a refresh period for each field on the screen and
+wakes on wall-clock boundaries of that period (a per-minute field just
+after :00, a per-second one just after each whole second), so the values
+change on the display when they change on the clock instead of drifting
+with the time each tick takes. The caller sleeps on the event loop's
+monotonic clock for `delay()` seconds; a wall-clock step (NTP after boot)
+is noticed at the next wake and the schedule starts again from it.
+"""
+import time
+from datetime import datetime, timedelta
+
+
+class ChristmasTarget(object):
+
+    def __init__(self, month=12, day=25, clock=time.time):
+        self.month = month
+        self.day = day
+        self.clock = clock
+        self.target = None      # timestamp of the next Christmas midnight
+        self.valid_from = None  # local midnight the target was worked out on
+        self.valid_until = None # the following local midnight
+        self.computes = 0
+
+    def _compute(self, now):
+        today = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        target = datetime(today.year, self.month, self.day)
+        if target <= today:
+            # Christmas day itself counts down to next year's, as it always has
+            target = datetime(today.year + 1, self.month, self.day)
+        self.target = target.timestamp()
+        self.valid_from = today.timestamp()
+        self.valid_until = (today + timedelta(days=1)).timestamp()
+        self.computes += 1
+
+    def seconds_left(self, now=None):
+        now = self.clock() if now is None else now
+        if self.target is None or not self.valid_from <= now < self.valid_until:
+            self._compute(now)
+        return self.target - now
+
+    def remaining(self, now=None):
+        """(days, hours, minutes, seconds) to go, rounded down."""
+        left = max(0, int(self.seconds_left(now)))
+        days, left = divmod(left, 24 * 3600)
+        hours, left = divmod(left, 3600)
+        minutes, seconds = divmod(left, 60)
+        return days, hours, minutes, seconds
+
+
+class TickScheduler(object):
+
+    def __init__(self, periods, slack=0.005, clock=time.time):
+        self.periods = dict(periods)   # field name -> refresh period in seconds
+        self.slack = slack              # wake this long after a boundary, never just before it
+        self.clock = clock
+        self.next_due = {}
+        self.wakeups = 0
+
+    def reset(self):
+        """Make every field due now, e.g. when the countdown screen comes back."""
+        self.next_due = {}
+
+    def _boundary(self, period, now):
+        return (now // period + 1) * period
+
+    def due(self, now=None):
+        """The fields to redraw now; each one is then scheduled for its next boundary."""
+        now = self.clock() if now is None else now
+        self.wakeups += 1
+        fields = []
+        for name, period in self.periods.items():
+            due = self.next_due.get(name)
+            # a backwards clock step would leave `due` far in the future
+            if due is None or now >= due or due - now > period + self.slack:
+                fields.append(name)
+                self.next_due[name] = self._boundary(period, now) + self.slack
+        return fields
+
+    def delay(self, now=None):
+        """Seconds until the next field is due."""
+        now = self.clock() if now is None else now
+        if len(self.next_due) < len(self.periods):
+            return 0.0
+        return max(0.0, min(self.next_due.values()) - now)
@@ -5,24 +5,42 @@
 # Author      : freenove
 # modification: 2022/06/28
 ########################################################################
-from PCF8574 import PCF8574_GPIO
-from Adafruit_LCD2004 import Adafruit_CharLCD
+from time import perf_counter
+# start of the --profile-startup breakdown
+STARTUP_T0 = perf_counter()
 
-from time import sleep
+from neopixel_client import NeoPixelClient
+from sqs_ack import AckBuffer
+from sqs_local import LocalSQS, LOCAL_QUEUE_URL
+from sqs_pipeline import MessageFetcher
+from hold_policy import HoldPolicy
+from message_journal import MessageJournal
+from message_layout import LayoutEngine
+from lcd_marquee import Marquee
+from lcd_bigdigits import BigCountdown, PREVIEW, SEGMENTS
+from countdown_clock import ChristmasTarget, TickScheduler
+from message_trace import LatencyStats
+from network_monitor import NetworkMonitor
+from offline_replay import OfflineReplay
+from stats_store import MinuteRing, write_json_atomic
+
+from time import sleep, monotonic, time as wall_time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import signal
 import sys
 import json
-import textwrap
 import os
 import re
 import subprocess
 import logging
 import socket
-try:
-    import boto3
-    from botocore.exceptions import BotoCoreError, ClientError, NoRegionError
-except Exception:
-    boto3 = None
+
+# boto3 takes seconds to import on a Pi Zero, so it is only imported (by
+# import_boto3, off the event loop) once SQS polling with AWS is requested.
+boto3 = None
 
 # Configuration constants
 # LCD geometry
@@ -30,8 +48,12 @@ LCD_COLS = 20
 LCD_ROWS = 4
 LINE_WIDTH = 20
 
-# NeoPixel script (expected next to this file)
+# NeoPixel effects server script (expected next to this file), the effect
+# played while a message is shown, and how long to wait for a freshly
+# started server to answer
 NEOPIXEL_SCRIPT = 'neopixel1.py'
+NEOPIXEL_EFFECT = 'demo'
+NEOPIXEL_START_TIMEOUT = 15
 
 # Messages log filename (we store logs next to the script path)
 try:
@@ -40,27 +62,163 @@ except Exception:
     SCRIPT_DIR = os.getcwd()
 MESSAGES_FILENAME = 'messages'
 MESSAGES_FILE = os.path.join(SCRIPT_DIR, MESSAGES_FILENAME)
+# The log is rotated at this size or after a day, and the newest
+# MESSAGES_KEEP rotated files are kept (gzipped unless XMAS_MESSAGES_GZIP=0)
+MESSAGES_MAX_BYTES = int(os.environ.get('XMAS_MESSAGES_MAX_BYTES', str(1 << 20)))
+MESSAGES_ROTATE_SECONDS = 24 * 60 * 60
+MESSAGES_KEEP = int(os.environ.get('XMAS_MESSAGES_KEEP', '14'))
+MESSAGES_GZIP = os.environ.get('XMAS_MESSAGES_GZIP', '1') != '0'
+
+# HD44780 timing profile: 'conservative', 'datasheet' or 'measured'. The
+# default allows for slow clones; 'datasheet' is the nominal 270 kHz part,
+# and 'measured' is read from LCD_TIMING_FILE or, if the file is missing,
+# measured once with the busy flag.
+LCD_TIMING_PROFILE = os.environ.get('XMAS_LCD_TIMING', 'conservative')
+LCD_TIMING_FILE = os.path.join(SCRIPT_DIR, 'lcd_timing.json')
+# Set XMAS_LCD_BUSY_FLAG=1 when the backpack's R/W line (PCF8574 P1) reaches
+# the LCD; commands then wait on the controller's busy flag instead of a timer.
+LCD_BUSY_FLAG = os.environ.get('XMAS_LCD_BUSY_FLAG', '') == '1'
+LCD_PIN_RW = 1
+# XMAS_LCD_EMULATOR=1 (or --emulate-lcd) drives a software LCD (lcd_emulator.py)
+# instead of the I2C bus; each transferred byte costs the time it would take
+# at 400 kHz and the screen is logged whenever it changes.
+LCD_EMULATOR = os.environ.get('XMAS_LCD_EMULATOR', '') == '1'
+LCD_EMULATOR_BYTE_SECONDS = float(os.environ.get('XMAS_LCD_EMULATOR_BYTE_SECONDS', '22.5e-6'))
 
 # LCD header text
 #HEADER_TEXT = 'HAPPY CFS CHRISTMAS'
 HEADER_TEXT = 'Happy Christmas day'
+# XMAS_COUNTDOWN=big shows the countdown in two-row-tall digits (days on
+# rows 0-1, HH:MM:SS on rows 2-3) instead of the header and three text rows
+COUNTDOWN_STYLE = os.environ.get('XMAS_COUNTDOWN', 'text')
+# Countdown fields are redrawn on wall-clock boundaries of their own period:
+# the text countdown and the clock each minute, the big countdown (which
+# shows seconds) each second, the CPU temperature every CPU_TEMP_SECONDS
+CPU_TEMP_SECONDS = 5
 
-# Stats persistence
+# Stats persistence: stats.json is replaced atomically at most every
+# STATS_FLUSH_SECONDS (and at shutdown), and a per-minute snapshot of the
+# counters goes into a fixed-size ring file holding the last day.
 STATUS_FILENAME = 'stats.json'
 STATUS_FILE = os.path.join(SCRIPT_DIR, STATUS_FILENAME)
+STATS_RING_FILE = os.path.join(SCRIPT_DIR, 'stats-minutes.ring')
+STATS_RING_MINUTES = 24 * 60
 
 # SQS / polling defaults
 SQS_DEFAULT_QUEUE_URL = 'https://sqs.eu-west-2.amazonaws.com/567919078991/xmasjumper'
-POLL_NO_MESSAGE_SHOW = 15          # seconds to show countdown when no messages
-MESSAGE_HOLD_SECONDS = 60          # seconds to display an incoming message
+SQS_WAIT_TIME_SECONDS = 20         # long-poll wait per receive (SQS maximum)
+MESSAGE_BUFFER_SIZE = 10           # messages prefetched ahead of the display
+MESSAGE_HOLD_SECONDS = 60          # seconds to display an incoming message (when there is no backlog)
+MIN_MESSAGE_HOLD_SECONDS = 10      # shortest hold when a backlog builds up
+MESSAGE_PAGE_SECONDS = 5           # a message longer than the screen shows each page this long
+# ...or, with XMAS_LONG_MESSAGES=marquee, scrolls through rows 0 and 2 one cell per step
+LONG_MESSAGES = os.environ.get('XMAS_LONG_MESSAGES', 'page')
+MARQUEE_STEP_SECONDS = 0.3
+BACKLOG_TARGET_SECONDS = 300       # aim to work through any backlog within this time
+QUEUE_DEPTH_SAMPLE_SECONDS = 30    # min interval between SQS queue-depth samples
+SQS_VISIBILITY_TIMEOUT = MESSAGE_HOLD_SECONDS + 30   # visibility granted per receive/renewal
+SQS_VISIBILITY_RENEW_MARGIN = 30   # renew buffered messages this long before they reappear
+ACK_FLUSH_SECONDS = 2              # max delay before displayed messages are batch-deleted
+# While SQS is unreachable, recent messages from the `messages` log are shown
+# between stretches of countdown (the newest OFFLINE_REPLAY_WINDOW, favouring
+# ones from the last day and ones not replayed yet)
+OFFLINE_REPLAY_WINDOW = 200
+OFFLINE_REPLAY_HOLD_SECONDS = 20
+OFFLINE_REPLAY_GAP_SECONDS = 20    # countdown between two replayed messages
+OFFLINE_REPLAY_HALF_LIFE = 24 * 60 * 60
 # Default AWS region to use if none is provided via env or queue URL
 DEFAULT_AWS_REGION = 'eu-west-2'
 
+# Runtime: how long the network info is shown at startup, how often the
+# network is checked and stats are written, and how many threads may run
+# blocking calls (boto3, NeoPixel socket, files) at once. LCD/I2C calls get
+# a thread of their own so they are never reordered.
+NETWORK_INFO_SECONDS = 60
+NETWORK_CHECK_SECONDS = 30         # between probes while online
+NETWORK_RETRY_MAX_SECONDS = 60     # longest gap between probes while offline
+NETWORK_PROBE_ADDRESS = ('1.1.1.1', 53)   # TCP connect target (Cloudflare DNS)
+STATS_FLUSH_SECONDS = 60
+IO_WORKERS = 6
+
+# Prometheus metrics endpoint (http://<jumper>:9101/metrics); port 0 turns it off
+METRICS_ADDRESS = os.environ.get('XMAS_METRICS_ADDRESS', '0.0.0.0')
+METRICS_PORT = int(os.environ.get('XMAS_METRICS_PORT', '9101'))
+
+
+# Messages served by the local SQS stand-in (queue URL 'local')
+LOCAL_SQS_MESSAGES = ['Merry Christmas from the local queue!', '{"message": "Ho ho ho"}']
+
+
+# Startup stages as (label, perf_counter()) for --profile-startup
+startup_marks = [('start', STARTUP_T0)]
 
 # Simple runtime counters for logging
 api_call_count = 0
+api_calls = {}          # SQS API name -> calls since start
 messages_picked_count = 0
 
+# Pending SQS deletes, flushed in batches by a background worker
+sqs_acks = None
+# Prefetches SQS messages ahead of the display (set once ingestion is running)
+sqs_fetcher = None
+
+# Executors for blocking work started from the asyncio runtime
+lcd_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='lcd')
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='io')
+
+# Per-stage message latency histograms (SQS SentTimestamp to LCD and delete),
+# and the traces of displayed messages whose delete is still pending
+latency = LatencyStats()
+acked_traces = {}
+
+# Connectivity, checked in the background (see network_monitor.py)
+network = NetworkMonitor(NETWORK_PROBE_ADDRESS, interval=NETWORK_CHECK_SECONDS, max_backoff=NETWORK_RETRY_MAX_SECONDS)
+
+# Word-wrapped pages per message text (LRU cached), as many as fit in a full hold
+layouts = LayoutEngine(LCD_COLS, LCD_ROWS, max_pages=MESSAGE_HOLD_SECONDS // MESSAGE_PAGE_SECONDS)
+
+# Shown messages, see message_journal.py
+journal = MessageJournal(MESSAGES_FILE, max_bytes=MESSAGES_MAX_BYTES, rotate_seconds=MESSAGES_ROTATE_SECONDS,
+                         keep=MESSAGES_KEEP, compress=MESSAGES_GZIP)
+
+# Per-minute counter snapshots (see stats_store.MinuteRing)
+stats_ring = MinuteRing(STATS_RING_FILE, ('api_calls', 'messages', 'receives', 'empty_receives', 'deleted'),
+                        STATS_RING_MINUTES)
+
+# The next Christmas midnight (worked out once a day) and when each
+# countdown field is next due
+christmas = ChristmasTarget()
+if COUNTDOWN_STYLE == 'big':
+    countdown_schedule = TickScheduler({'countdown': 1})
+else:
+    countdown_schedule = TickScheduler({'countdown': 60, 'clock': 60, 'cpu': CPU_TEMP_SECONDS})
+countdown_cpu = None    # last CPU temperature shown
+
+# Shrinks the message hold time while a backlog is waiting
+hold_policy = HoldPolicy(MESSAGE_HOLD_SECONDS, MIN_MESSAGE_HOLD_SECONDS, BACKLOG_TARGET_SECONDS)
+
+def mark_startup(label):
+    """Record that a startup stage has finished (first occurrence only)."""
+    if all(name != label for name, t in startup_marks):
+        startup_marks.append((label, perf_counter()))
+
+
+def startup_report():
+    """Return the startup stages as text lines: time since start and since the previous stage."""
+    lines = []
+    prev = STARTUP_T0
+    for label, t in sorted(startup_marks, key=lambda mark: mark[1]):
+        lines.append('%8.1f ms %+8.1f ms  %s' % ((t - STARTUP_T0) * 1000, (t - prev) * 1000, label))
+        prev = t
+    return lines
+
+
+def count_api_call(name=None):
+    global api_call_count
+    api_call_count += 1
+    if name:
+        api_calls[name] = api_calls.get(name, 0) + 1
+
 # Cached sudo availability check (None = unknown, True/False = cached result)
 _sudo_n_available = None
 
@@ -76,23 +234,25 @@ def can_use_sudo_n():
         _sudo_n_available = False
     return _sudo_n_available
 
-def append_message_to_file(message_text, filename=None):
-    """Append a timestamped message to the `messages` file.
-    Each line: YYYY-MM-DD HH:MM:SS - message
-    """
-    if filename is None:
-        filename = MESSAGES_FILE
+def append_message_to_file(message_text):
+    """Add a message to the `messages` journal (YYYY-MM-DD HH:MM:SS - message)."""
     try:
-        ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        with open(filename, 'a', encoding='utf-8') as fh:
-            fh.write(f"{ts} - {message_text}\n")
-    except Exception as e:
+        journal.append(message_text)
+    except Exception:
         logging.exception('Failed to write message file')
 
 def log_stats():
     """Print simple stats about API usage and messages picked up."""
     try:
         logging.info(f"SQS API calls: {api_call_count}, messages picked: {messages_picked_count}")
+        last_hour = stats_ring.series(60)
+        if last_hour:
+            logging.info('Last hour: %s messages, %s SQS API calls',
+                         sum(v['messages'] for t, v in last_hour), sum(v['api_calls'] for t, v in last_hour))
+        end_to_end = latency.histograms['end_to_end']
+        if end_to_end.count:
+            logging.info('Sent-to-LCD latency: p50 %.1f s, p95 %.1f s, p99 %.1f s',
+                         end_to_end.percentile(50), end_to_end.percentile(95), end_to_end.percentile(99))
         # persist stats
         try:
             save_stats()
@@ -109,31 +269,64 @@ def load_stats():
                 data = json.load(fh)
                 api_call_count = int(data.get('api_call_count', 0))
                 messages_picked_count = int(data.get('messages_picked_count', 0))
+                hold_policy.max_clear_seconds = float(data.get('max_backlog_clear_seconds', 0))
+                hold_policy.backlogs_cleared = int(data.get('backlogs_cleared', 0))
+                latency.load(data.get('latency_histograms') or {})
                 logging.info('Loaded stats from %s', STATUS_FILE)
+                return
     except Exception:
         logging.exception('Failed to load stats')
+    # no usable stats.json (first boot, or written by an older version without
+    # the atomic replace): take the counters from the newest minute snapshot
+    latest = stats_ring.latest()
+    if latest:
+        api_call_count = latest['api_calls']
+        messages_picked_count = latest['messages']
+        logging.info('Loaded counters from %s', STATS_RING_FILE)
+
+def ring_values():
+    values = {'api_calls': api_call_count, 'messages': messages_picked_count}
+    if sqs_fetcher is not None:
+        values['receives'] = sqs_fetcher.receives
+        values['empty_receives'] = sqs_fetcher.empty_receives
+    if sqs_acks is not None:
+        values['deleted'] = sqs_acks.deleted
+    return values
 
 def save_stats():
     try:
         data = {'api_call_count': api_call_count, 'messages_picked_count': messages_picked_count}
-        with open(STATUS_FILE, 'w', encoding='utf-8') as fh:
-            json.dump(data, fh)
+        data.update(hold_policy.stats())
+        # percentiles for reading, buckets for reloading after a restart
+        data['latency'] = latency.summary()
+        data['latency_histograms'] = latency.to_dict()
+        write_json_atomic(STATUS_FILE, data)
     except Exception:
         logging.exception('Failed to save stats')
+    try:
+        stats_ring.write(ring_values())
+    except Exception:
+        logging.exception('Failed to save minute stats')
 
-# Neopixel subprocess controller
+# NeoPixel effects server. It is normally started as root by systemd
+# (neopixel-effects.service); if it is not running we start it once and then
+# only talk to it over its socket.
+neopixels = NeoPixelClient()
 neopixel_proc = None
 
-def start_neopixels():
-    """Start `neopixel1.py` using sudo. If already running, do nothing."""
+def ensure_neopixel_server():
+    """Return True if the effects server is answering, starting it once if needed."""
     global neopixel_proc
+    if neopixels.ping():
+        return True
     if neopixel_proc is not None and neopixel_proc.poll() is None:
-        return
+        # we already started it; it may still be importing the strip driver
+        return False
     path = os.path.join(os.path.dirname(__file__), NEOPIXEL_SCRIPT)
     if not os.path.exists(path):
         logging.error('Neopixel script not found: %s', path)
-        return
-    # Determine how to run the neopixel script:
+        return False
+    # Determine how to run the neopixel server:
     # - If running as root, execute directly.
     # - Else, if `sudo -n` works (won't prompt), use `sudo -n`.
     # - Otherwise, refuse to start and log a helpful message.
@@ -145,89 +338,76 @@ def start_neopixels():
         if can_use_sudo_n():
             cmd = ['sudo', '-n', sys.executable, path]
         else:
-            logging.error('Cannot start neopixels: sudo would prompt for a password.\nRun this script as root or configure passwordless sudo for the neopixel script.')
-            return
+            logging.error('Cannot start neopixels: sudo would prompt for a password.\nRun this script as root, configure passwordless sudo for the neopixel script, or enable neopixel-effects.service.')
+            return False
     try:
-        neopixel_proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        logging.info('Started neopixel process, pid=%s', getattr(neopixel_proc, 'pid', None))
-    except Exception as e:
-        logging.exception('Failed to start neopixel process')
+        # own session so the server outlives us and keeps serving the next run
+        neopixel_proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        logging.info('Started neopixel server, pid=%s', getattr(neopixel_proc, 'pid', None))
+    except Exception:
+        logging.exception('Failed to start neopixel server')
         neopixel_proc = None
+        return False
+    for _ in range(NEOPIXEL_START_TIMEOUT * 10):
+        sleep(0.1)
+        if neopixels.ping():
+            return True
+        if neopixel_proc.poll() is not None:
+            logging.error('Neopixel server exited with code %s', neopixel_proc.returncode)
+            neopixel_proc = None
+            return False
+    logging.error('Neopixel server did not answer within %s seconds', NEOPIXEL_START_TIMEOUT)
+    return False
+
+def start_neopixels(effect=NEOPIXEL_EFFECT):
+    """Play `effect` on the NeoPixel server; returns True if it is playing."""
+    if not ensure_neopixel_server():
+        return False
+    try:
+        neopixels.play(effect)
+        return True
+    except Exception:
+        logging.exception('Failed to start neopixel effect')
+        return False
 
 def stop_neopixels():
-    """Stop the running neopixel process if any."""
-    global neopixel_proc
-    if neopixel_proc is None:
-        return
+    """Blank the NeoPixels; the server keeps running for the next message."""
     try:
-        neopixel_proc.terminate()
-        try:
-            neopixel_proc.wait(timeout=5)
-        except Exception:
-            neopixel_proc.kill()
-    except Exception as e:
-        logging.exception('Error stopping neopixel process')
-    finally:
-        neopixel_proc = None
+        neopixels.stop()
+    except OSError:
+        # server not running: nothing is lit
+        pass
+    except Exception:
+        logging.exception('Error stopping neopixels')
 
 
  
-def get_cpu_temp():     # get CPU temperature and store it into file "/sys/class/thermal/thermal_zone0/temp"
+def read_cpu_temp():
+    """CPU temperature in degrees C, or None if it cannot be read."""
     try:
         with open('/sys/class/thermal/thermal_zone0/temp') as tmp:
-            cpu = tmp.read()
-        return '{:.2f}'.format(float(cpu)/1000) + ' C'
+            return float(tmp.read()) / 1000
     except Exception:
+        return None
+
+def get_cpu_temp():     # get CPU temperature and store it into file "/sys/class/thermal/thermal_zone0/temp"
+    cpu = read_cpu_temp()
+    if cpu is None:
         return 'N/A'
+    return '{:.2f}'.format(cpu) + ' C'
 
-def is_network_available(timeout=2):
-    """Quick check for basic network connectivity.
-    Tries to open a socket to a well-known public DNS server (TCP) to
-    determine if the network is up. Returns True if connection succeeds.
-    """
+def read_rss_bytes():
+    """Resident set size of this process, or None off Linux."""
     try:
-        # use TCP to 1.1.1.1:53 (Cloudflare DNS) which should be reachable
-        socket.setdefaulttimeout(timeout)
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        try:
-            s.connect(('1.1.1.1', 53))
-            return True
-        finally:
-            s.close()
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
     except Exception:
-        return False
+        return None
  
-def calculate_time_to_christmas():
-    # Set the target date for Christmas Day at midnight (00:00:00)
-    # The year is set to the current year (2025 in this context)
-    christmas_year = datetime.now().year
-    christmas_day = datetime(christmas_year, 12, 25, 0, 0, 0)
-    
-    # Get the current date and time
-    current_time = datetime.now()
-    
-    # Check if Christmas has already passed this year, and if so, target next year
-    if current_time > christmas_day:
-        christmas_year += 1
-        christmas_day = datetime(christmas_year, 12, 25, 0, 0, 0)
-        
-    # Calculate the difference (timedelta)
-    time_to_christmas = christmas_day - current_time
-    
-    # Calculate days, hours, minutes, and seconds from the timedelta object
-    days = time_to_christmas.days
-    seconds_in_day = time_to_christmas.seconds
-    hours = seconds_in_day // 3600
-    minutes = (seconds_in_day % 3600) // 60
-    seconds = seconds_in_day % 60
-    
-    #print(f"Current Date and Time: {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    #print(f"Christmas Day: {christmas_day.strftime('%Y-%m-%d %H:%M:%S')}")
-    #print("\n--- Results ---")
-    #print(f"Time to Christmas (D:H:M:S): {days} days, {hours} hours, {minutes} minutes, {seconds} seconds")
-    #print(f"Total seconds to Christmas: {total_seconds} seconds")
-    # Return only the values the rest of the program uses (days, hours, minutes, seconds)
-    return (days, hours, minutes, seconds)
+def calculate_time_to_christmas(now=None):
+    """(days, hours, minutes, seconds) to Christmas Day midnight; on the day
+    itself, to next year's. The target is only worked out once a day."""
+    return christmas.remaining(now)
 
 
 def get_wifi_ssid():
@@ -301,220 +481,209 @@ def get_ip_address():
         return 'N/A'
 
 
-def display_network_info(hold_seconds=60):
-    """Display the Wi-Fi SSID and IP address on the LCD for `hold_seconds` seconds.
-    This is intended to run once at startup.
-    """
+def show_network_info(ssid, ip):
+    """Display the Wi-Fi SSID and IP address on the LCD (shown at startup)."""
     try:
-        ssid = get_wifi_ssid()
-        ip = get_ip_address()
-        # Ensure backlight and LCD init like other display functions
-        try:
-            mcp.output(3, 1)
-            lcd.begin(LCD_COLS, LCD_ROWS)
-        except Exception:
-            # If hardware calls fail, continue and try writing anyway
-            pass
-
-        # Use the same per-row writer as the rest of the app so behaviour is consistent
-        try:
-            write_row(0, HEADER_TEXT)
-            write_row(1, f"WIFI: {ssid}")
-            write_row(2, f"IP: {ip}")
-            write_row(3, "")
-            sleep(int(hold_seconds))
-            # restore header after the hold
-            write_row(0, HEADER_TEXT)
-        except Exception:
-            logging.exception('Failed to write network info rows')
+        # Render through the shared framebuffer so only changed cells are sent
+        fb.write_row(0, HEADER_TEXT)
+        fb.write_row(1, f"WIFI: {ssid}")
+        fb.write_row(2, f"IP: {ip}")
+        fb.write_row(3, "")
+        fb.commit()
     except Exception:
         logging.exception('Failed to display network info')
  
-def loop():
-    mcp.output(3,1)     # turn on LCD backlight
-    lcd.begin(LCD_COLS, LCD_ROWS)     # set number of LCD lines and columns
-    # draw static header once
-    write_row(0, HEADER_TEXT)
-
-    # track previous values so we only write changed rows
-    prev_line1 = prev_line2 = prev_line3 = None
-    while True:
-        days, hours, minutes, seconds = calculate_time_to_christmas()
-        # Prepare the text for each row. Use minute granularity to avoid per-second updates.
-        line1 = f"{days} days {hours} hours"
-        line2 = f"{minutes} minutes to xmas"
-        # show time as HH:MM plus CPU temperature to reduce updates
-        now = datetime.now()
-        cpu = get_cpu_temp()
-        # Format as 'HH:MM  xx.xx C' (fits in LINE_WIDTH); write_row will truncate/pad
-        line3 = f"Time: {now.strftime('%H:%M')} CPU: {cpu}"
-
-        # Only update rows that changed
-        if line1 != prev_line1:
-            write_row(1, line1)
-            prev_line1 = line1
-        if line2 != prev_line2:
-            write_row(2, line2)
-            prev_line2 = line2
-        if line3 != prev_line3:
-            write_row(3, line3)
-            prev_line3 = line3
-
-        sleep(1)
- 
+def countdown_tick(fields=('countdown', 'clock', 'cpu')):
+    """Render the countdown fields in `fields` (see countdown_schedule): the
+    days, hours and minutes on rows 1-2 and the clock and CPU temperature on
+    row 3, under the header on row 0; or the whole screen in big digits."""
+    global countdown_cpu
+    now = wall_time()
+    days, hours, minutes, seconds = calculate_time_to_christmas(now)
+    if big_countdown is not None:
+        # only the digits that changed are redrawn
+        big_countdown.draw(days, hours, minutes, seconds)
+    else:
+        if 'countdown' in fields:
+            fb.write_row(1, f"{days} days {hours} hours")
+            fb.write_row(2, f"{minutes} minutes to xmas")
+        if 'cpu' in fields or countdown_cpu is None:
+            countdown_cpu = get_cpu_temp()
+        if 'clock' in fields or 'cpu' in fields:
+            # 'HH:MM  xx.xx C'; the framebuffer truncates/pads
+            fb.write_row(3, f"Time: {datetime.fromtimestamp(now).strftime('%H:%M')} CPU: {countdown_cpu}")
+    # the framebuffer only sends the cells that changed since the last tick
+    try:
+        fb.commit()
+    except Exception:
+        logging.info('Countdown values: %s days %s hours %s minutes %s seconds', days, hours, minutes, seconds)
+
+
 def destroy():
     try:
         stop_neopixels()
     except Exception:
         pass
+    network.stop()
+    if sqs_fetcher is not None:
+        sqs_fetcher.stop()
+    try:
+        # delete what has been shown so it is not displayed again after restart
+        if sqs_acks is not None:
+            sqs_acks.close()
+    except Exception:
+        logging.exception('Failed to flush SQS deletes')
+    # counters and messages since the last periodic flush
+    save_stats()
+    try:
+        journal.close()
+    except Exception:
+        logging.exception('Failed to flush message file')
+    # let a queued LCD update finish before clearing; an in-flight SQS long
+    # poll is left to time out on its own
+    io_executor.shutdown(wait=False)
+    lcd_executor.shutdown(wait=True)
+    if lcd is None:
+        return
     try:
         lcd.clear()
+        fb.invalidate()
     except Exception:
         pass
 
 
 def write_row(row, text):
     """Write a single 20-char row without clearing the display.
-    Pads or truncates text to exactly 20 chars so previous content is overwritten."""
+    Pads or truncates text to exactly 20 chars; only the cells that differ
+    from what is already on the LCD are sent."""
     try:
-        s = str(text)[:LINE_WIDTH].ljust(LINE_WIDTH)
-        lcd.setCursor(0, row)
-        lcd.message(s)
+        fb.write_row(row, text)
+        fb.commit()
     except Exception:
         # If LCD fails, ignore and continue
         pass
 
 
-def _format_to_4_lines(text, width=20):
-    """Format arbitrary text into up to four lines of given width for a 20x4 LCD.
-    Returns a list of 4 strings (may be empty strings).
-    """
-    if text is None:
-        text = ''
-    # Normalize whitespace
-    txt = ' '.join(str(text).split())
-    # If text is JSON string representing an object with a 'message' key, prefer that
+def _page_due(layout, elapsed):
+    """Index of the page of `layout` to show `elapsed` seconds into its hold."""
+    return int(elapsed // MESSAGE_PAGE_SECONDS) % len(layout.pages)
+
+
+def open_message_screen(text, layout, trace=None):
+    """Put the start of a message on the LCD. Returns the Marquee scrolling
+    it, or None when it is paged (or fits)."""
+    if LONG_MESSAGES != 'marquee' or len(layout.pages) < 2:
+        show_message_lines(layout.pages[0], trace)
+        return None
+    marquee = Marquee(lcd, text, glyphs=glyphs)
+    if trace is not None:
+        trace.mark('lcd')
     try:
-        parsed = json.loads(txt)
-        if isinstance(parsed, dict) and 'message' in parsed:
-            txt = str(parsed['message'])
+        marquee.start()
     except Exception:
-        pass
+        logging.exception('LCD display error')
+    return marquee
 
-    # Wrap into lines
-    parts = textwrap.wrap(txt, width=width)
-    # If there are more than 4 lines, concatenate extras into the last line truncated
-    if len(parts) > 4:
-        parts = parts[:3] + [ ' '.join(parts[3:]) ]
-    # Ensure exactly 4 lines
-    while len(parts) < 4:
-        parts.append('')
-    # Truncate each line to width
-    parts = [p[:width] for p in parts]
-    return parts
-
-
-def _display_on_lcd_multiline(text, hold_seconds=6):
-    """Clear the LCD and display `text` across 4 lines (20 chars each).
-    Keeps message on screen for `hold_seconds` seconds.
-    """
-    lines = _format_to_4_lines(text, width=20)
+
+def update_message_screen(layout, marquee, elapsed):
+    """Turn the page or scroll the marquee as due `elapsed` seconds into the hold."""
+    if marquee is None:
+        # unchanged cells are not sent, so repainting the current page is free
+        show_message_lines(layout.pages[_page_due(layout, elapsed)])
+        return
     try:
-        lcd.clear()
-        for row, line in enumerate(lines):
-            lcd.setCursor(0, row)
-            # Adafruit LCD's message accepts a string
-            lcd.message(line)
-        # start neopixel effects while message is shown
-        try:
-            start_neopixels()
-        except Exception:
-            pass
-        # keep the message visible for a short while
-        sleep(hold_seconds)
-        # stop neopixels and restore the static header after the message is shown
-        try:
-            stop_neopixels()
-        except Exception:
-            pass
-        try:
-                write_row(0, HEADER_TEXT)
-        except Exception:
-            pass
+        marquee.advance(int(elapsed / MARQUEE_STEP_SECONDS))
     except Exception:
-        # ensure neopixels stopped on unexpected errors
-        try:
-            stop_neopixels()
-        except Exception:
-            pass
         logging.exception('LCD display error')
 
 
-def show_countdown_for(duration_seconds):
-    """Display the Christmas countdown (similar to loop()) for duration_seconds seconds.
-    Updates once per second and then returns.
-    """
+def close_message_screen(marquee):
+    if marquee is None:
+        return
     try:
-        end = int(duration_seconds)
-        # ensure backlight
-        try:
-            mcp.output(3,1)
-            lcd.begin(20,4)
-        except Exception:
-            pass
-
-        # draw static header for countdown
-        try:
-            write_row(0, HEADER_TEXT)
-        except Exception:
-            pass
-
-        # Only update rows that changed while counting down to avoid excessive writes
-        prev1 = prev2 = prev3 = None
-        for i in range(end):
-            days, hours, minutes, seconds = calculate_time_to_christmas()
-            line1 = f"{days} days {hours} hours"
-            line2 = f"{minutes} minutes to xmas"
-            now = datetime.now()
-            cpu = get_cpu_temp()
-            line3 = f"Time: {now.strftime('%H:%M')} CPU: {cpu}"
-            try:
-                if line1 != prev1:
-                    write_row(1, line1)
-                    prev1 = line1
-                if line2 != prev2:
-                    write_row(2, line2)
-                    prev2 = line2
-                if line3 != prev3:
-                    write_row(3, line3)
-                    prev3 = line3
-            except Exception:
-                logging.info('Countdown values: %s days %s hours %s minutes %s seconds', days, hours, minutes, seconds)
-            sleep(1)
+        marquee.stop()
     except Exception:
-        logging.exception('Countdown display error')
+        logging.exception('LCD display error')
+    # DDRAM holds the marquee ring now, not what the framebuffer thinks
+    fb.invalidate()
 
 
-def poll_sqs_and_display(queue_url, wait_time=10):
-    """Long-poll the given SQS queue and display each incoming message on the LCD.
+def _message_screen_seconds(layout, marquee):
+    """How long it takes to show all of a message once."""
+    if marquee is not None:
+        return marquee.pass_steps() * MARQUEE_STEP_SECONDS
+    return len(layout.pages) * MESSAGE_PAGE_SECONDS
 
-    This function requires `boto3` and valid AWS credentials (environment, IAM role, etc.).
-    It deletes messages after displaying them.
-    """
-    if boto3 is None:
-        raise RuntimeError('boto3 is required for SQS polling')
 
-    # If there's no network connectivity, bail out so the main program can
-    # continue displaying the local countdown instead of blocking here.
+def _message_screen_tick(marquee):
+    return MARQUEE_STEP_SECONDS if marquee is not None else 1
+
+
+def show_message_lines(lines, trace=None):
+    """Overwrite all four rows with a formatted message (unchanged cells stay put)."""
     try:
-        if not is_network_available():
-            logging.warning('Network appears to be offline; skipping SQS poller')
-            return
+        for row, line in enumerate(lines):
+            fb.write_row(row, line)
+        if trace is not None:
+            trace.mark('lcd')   # the first byte goes out now
+        fb.commit()
     except Exception:
-        # If the network check itself fails for any reason, don't prevent
-        # the program from continuing.
-        logging.exception('Network check failed; skipping SQS poller')
+        logging.exception('LCD display error')
+
+
+def _prepare_countdown():
+    # ensure backlight
+    try:
+        mcp.output(3,1)
+        lcd.begin(20,4)
+        # begin() clears DDRAM; re-upload custom characters too in case the
+        # panel lost power
+        fb.invalidate()
+        glyphs.reset()
+        if big_countdown is not None:
+            # all 8 slots hold digit segments until a message needs them
+            big_countdown.invalidate()
+            glyphs.load(''.join(SEGMENTS))
+    except Exception:
+        pass
+    # every field is drawn on the next tick
+    countdown_schedule.reset()
+    if big_countdown is not None:
         return
+    # draw static header for countdown
+    try:
+        write_row(0, HEADER_TEXT)
+    except Exception:
+        pass
+
+
+def import_boto3():
+    """Import boto3 on first use (it is slow to load); raises RuntimeError if it is missing."""
+    global boto3
+    if boto3 is None:
+        try:
+            import boto3 as module
+        except ImportError:
+            raise RuntimeError('boto3 is required for SQS polling')
+        boto3 = module
+        mark_startup('import boto3')
+    return boto3
+
+
+def create_sqs_client(queue_url):
+    """Return an SQS client for `queue_url`, or None if one cannot be created.
+
+    This requires `boto3` and valid AWS credentials (environment, IAM role, etc.),
+    unless `queue_url` is 'local', which uses the in-memory stand-in from sqs_local.
+    """
+    if queue_url == LOCAL_QUEUE_URL:
+        sqs = LocalSQS()
+        for body in LOCAL_SQS_MESSAGES:
+            sqs.send_message(QueueUrl=queue_url, MessageBody=body)
+        return sqs
+
+    import_boto3()
+    from botocore.exceptions import NoRegionError
 
     # Determine AWS region: prefer environment settings, then parse from the
     # queue URL, otherwise fall back to the configured default region.
@@ -528,189 +697,528 @@ def poll_sqs_and_display(queue_url, wait_time=10):
 
     try:
         if region:
-            sqs = boto3.client('sqs', region_name=region)
-        else:
-            sqs = boto3.client('sqs')
+            return boto3.client('sqs', region_name=region)
+        return boto3.client('sqs')
     except NoRegionError:
         raise RuntimeError('AWS region not configured. Set AWS_REGION or AWS_DEFAULT_REGION, or provide a queue URL that contains the region.')
     except Exception:
         logging.exception('Failed to create SQS client (network/credentials issue)')
-        return
-    logging.info('Polling SQS queue: %s', queue_url)
-    # ensure backlight and LCD are ready
+        return None
+
+
+# Asyncio runtime. The display, SQS ingestion, NeoPixels, stats and network
+# checks run as concurrent tasks; anything that blocks (I2C, boto3, the
+# NeoPixel socket, subprocesses, files) is handed to an executor so one slow
+# call never holds up the others. Only the display task touches the LCD.
+
+async def run_lcd(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(lcd_executor, _lcd_job, fn, args)
+
+
+def _lcd_job(fn, args):
+    result = fn(*args)
+    if lcd_bus is not None:
+        log_emulated_screen()
+    return result
+
+
+async def run_io(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(io_executor, fn, *args)
+
+
+async def _wait_event(event, timeout):
+    """Wait up to `timeout` seconds for `event`; returns True (and clears it) if it was set."""
     try:
-        mcp.output(3,1)
-        lcd.begin(20,4)
-    except Exception:
-        pass
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    event.clear()
+    return True
+
 
-    # Poll every 15 seconds. We'll do a short receive (no long-poll) and then
-    # when there are no messages display the countdown for 15 seconds.
+async def supervise(name, factory, restart_delay=5):
+    """Run the coroutine made by `factory`, restarting it if it fails."""
     while True:
         try:
-            # Count the API call (receive)
-            global api_call_count, messages_picked_count
-            api_call_count += 1
-            resp = sqs.receive_message(
-                QueueUrl=queue_url,
-                MaxNumberOfMessages=1,
-                WaitTimeSeconds=0,
-                VisibilityTimeout=MESSAGE_HOLD_SECONDS,
-                MessageAttributeNames=['All']
-            )
-
-            messages = resp.get('Messages') or []
-            if not messages:
-                # no messages — show countdown for POLL_NO_MESSAGE_SHOW seconds then poll again
-                show_countdown_for(POLL_NO_MESSAGE_SHOW)
-                continue
-
-            # we received one or more messages
-            messages_picked_count += len(messages)
-            for msg in messages:
-                body = msg.get('Body', '')
-                display_text = None
-                # body may itself be JSON; try to extract sensible text
-                try:
-                    parsed = json.loads(body)
-                    # If SQS message contains SNS envelope or stringified message, try common fields
-                    if isinstance(parsed, dict):
-                        # Common SNS -> message key
-                        if 'Message' in parsed and isinstance(parsed['Message'], str):
-                            # Message may itself be JSON
-                            try:
-                                inner = json.loads(parsed['Message'])
-                                if isinstance(inner, dict) and 'message' in inner:
-                                    display_text = inner['message']
-                                else:
-                                    display_text = parsed['Message']
-                            except Exception:
-                                display_text = parsed['Message']
-                        elif 'message' in parsed:
-                            display_text = parsed['message']
-                        else:
-                            # fallback to the stringified dict
-                            display_text = json.dumps(parsed)
-                    else:
-                        display_text = str(parsed)
-                except Exception:
-                    display_text = str(body)
-
-                # Show on LCD for MESSAGE_HOLD_SECONDS seconds
-                logging.info('Displaying message: %s', display_text)
-                _display_on_lcd_multiline(display_text, hold_seconds=MESSAGE_HOLD_SECONDS)
-
-                # append to messages file with timestamp
-                try:
-                    append_message_to_file(display_text)
-                except Exception:
-                    pass
-
-                # Delete message from queue
-                receipt = msg.get('ReceiptHandle')
-                if receipt:
-                    try:
-                        # Count the API call (delete)
-                        api_call_count += 1
-                        sqs.delete_message(QueueUrl=queue_url, ReceiptHandle=receipt)
-                    except Exception:
-                        logging.exception('Failed to delete message')
-            # Log stats after processing this batch
-            try:
-                log_stats()
-            except Exception:
-                pass
-        except (BotoCoreError, ClientError) as e:
-            logging.exception('SQS receive error')
-            sleep(5)
+            await factory()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception('%s task failed; restarting in %s s', name, restart_delay)
+            await asyncio.sleep(restart_delay)
+
+
+async def display_task(arrived, effects, online=None):
+    """Owns the LCD: network info at startup, then the countdown with each
+    incoming message shown for its hold time in between. With `online`
+    given, messages from the journal are replayed while it is clear. Only
+    the countdown and message loop is restarted after a failure; the
+    network info is shown once."""
+    try:
+        await show_startup_screen(arrived)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logging.exception('Failed to show the network info')
+    await supervise('display', lambda: display_loop(arrived, effects, online))
+
+
+async def show_startup_screen(arrived):
+    """Initialise the LCD and show the SSID and IP address for
+    NETWORK_INFO_SECONDS, or until the first message arrives."""
+    ssid = asyncio.ensure_future(run_io(get_wifi_ssid))
+    ip, _ = await asyncio.gather(run_io(get_ip_address), run_lcd(init_hardware))
+    # the SSID lookup can take seconds (nmcli, rescans): show the IP first
+    await run_lcd(show_network_info, '...', ip)
+    mark_startup('network info on LCD')
+    shown = monotonic()
+    # ingestion warms up meanwhile; its first message ends the network info
+    # early, even while the SSID lookup is still running
+    message = asyncio.ensure_future(arrived.wait())
+    try:
+        await asyncio.wait([ssid, message], timeout=NETWORK_INFO_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+        if message.done():
+            arrived.clear()
+            return
+        if ssid.done():
+            await run_lcd(show_network_info, ssid.result(), ip)
+            await asyncio.wait([message], timeout=NETWORK_INFO_SECONDS - (monotonic() - shown))
+            if message.done():
+                arrived.clear()
+    finally:
+        message.cancel()
+
+
+async def display_loop(arrived, effects, online=None):
+    replay = OfflineReplay(journal, window=OFFLINE_REPLAY_WINDOW, half_life=OFFLINE_REPLAY_HALF_LIFE)
+    next_replay = None
+    await run_lcd(init_hardware)    # a no-op unless the startup screen failed
+    await run_lcd(_prepare_countdown)
+    while True:
+        msg = sqs_fetcher.get(timeout=0) if sqs_fetcher is not None else None
+        if msg is None:
+            if online is not None and not online.is_set():
+                if next_replay is None:
+                    count = await run_io(replay.reload)
+                    logging.info('Offline: replaying %d recent messages', count)
+                    next_replay = monotonic() + OFFLINE_REPLAY_GAP_SECONDS
+                elif monotonic() >= next_replay:
+                    await replay_message(replay, arrived, online)
+                    await run_lcd(_prepare_countdown)
+                    next_replay = monotonic() + OFFLINE_REPLAY_GAP_SECONDS
+                    continue
+            elif next_replay is not None:
+                logging.info('Online again: back to live messages')
+                next_replay = None
+            fields = countdown_schedule.due()
+            if fields:
+                await run_lcd(countdown_tick, fields)
+            # sleep until the next field is due (or a replay), or a message arrives
+            wait = countdown_schedule.delay()
+            if next_replay is not None:
+                wait = min(wait, max(0.0, next_replay - monotonic()))
+            await _wait_event(arrived, wait)
             continue
-        except Exception as e:
-            # Unexpected error — log and return to allow main to fall back to loop()
-            logging.exception('Unexpected error in SQS poller')
-            try:
-                stop_neopixels()
-            except Exception:
-                pass
+        msg.trace.mark('dequeued')
+        await show_message(msg, effects)
+        mark_startup('first message shown')
+        if sqs_fetcher.pending() == 0:
+            await run_lcd(_prepare_countdown)
+
+
+async def replay_message(replay, arrived, online):
+    """Show a message from the journal for OFFLINE_REPLAY_HOLD_SECONDS, or
+    until a live message arrives or the network is back."""
+    picked = replay.next()
+    if picked is None:
+        return
+    when, text = picked
+    logging.info('Replaying message from %s: %s', datetime.fromtimestamp(when).strftime('%Y-%m-%d %H:%M'), text)
+    layout = layouts.layout(text)
+    marquee = await run_lcd(open_message_screen, text, layout)
+    start = monotonic()
+    hold = max(OFFLINE_REPLAY_HOLD_SECONDS, min(MESSAGE_HOLD_SECONDS, _message_screen_seconds(layout, marquee)))
+    while not online.is_set():
+        elapsed = monotonic() - start
+        if elapsed >= hold:
+            break
+        await run_lcd(update_message_screen, layout, marquee, elapsed)
+        if await _wait_event(arrived, min(_message_screen_tick(marquee), hold - elapsed)):
+            break
+    await run_lcd(close_message_screen, marquee)
+
+
+async def show_message(msg, effects):
+    """Show one message for up to MESSAGE_HOLD_SECONDS, less while a backlog is
+    waiting (the hold is re-evaluated every second), then acknowledge it. A
+    message longer than the screen is paged or scrolled, and held until all
+    of it has been shown once (within MESSAGE_HOLD_SECONDS)."""
+    global messages_picked_count
+    messages_picked_count += 1
+    logging.info('Displaying message: %s', msg.text)
+    layout = layouts.layout(msg.message)
+    msg.trace.mark('formatted')
+    marquee = await run_lcd(open_message_screen, msg.text, layout, msg.trace)
+    mark_startup('first message on LCD')
+    effects.put_nowait((NEOPIXEL_EFFECT, msg.trace))
+    start = monotonic()
+    whole = min(MESSAGE_HOLD_SECONDS, _message_screen_seconds(layout, marquee))
+    while True:
+        hold = max(hold_policy.hold_seconds(sqs_fetcher.backlog()), whole)
+        elapsed = monotonic() - start
+        if elapsed >= hold:
+            break
+        await run_lcd(update_message_screen, layout, marquee, elapsed)
+        await asyncio.sleep(min(_message_screen_tick(marquee), hold - elapsed))
+    await run_lcd(close_message_screen, marquee)
+    effects.put_nowait((None, None))
+    await run_lcd(write_row, 0, HEADER_TEXT)
+    await run_io(append_message_to_file, msg.text)
+    # Queue the delete; the AckBuffer sends them in batches and the trace is
+    # recorded once SQS has confirmed it
+    if msg.receipt:
+        sqs_fetcher.release(msg.receipt)
+        msg.trace.mark('acked')
+        acked_traces[msg.receipt] = msg.trace
+        sqs_acks.add(msg.receipt)
+    else:
+        latency.record(msg.trace)
+    hold_policy.observe(sqs_fetcher.backlog())
+
+
+async def neopixel_task(effects):
+    """Play or stop NeoPixel effects as the display asks; only the latest
+    request matters, so queued ones are skipped while the server is slow."""
+    while True:
+        effect, trace = await effects.get()
+        while not effects.empty():
+            effect, trace = effects.get_nowait()
+        if effect is None:
+            await run_io(stop_neopixels)
+        elif await run_io(start_neopixels, effect) and trace is not None:
+            trace.mark('neopixels')
+
+
+async def stats_task():
+    """Log and persist the counters every STATS_FLUSH_SECONDS when they change."""
+    last = None
+    while True:
+        await asyncio.sleep(STATS_FLUSH_SECONDS)
+        current = (api_call_count, messages_picked_count)
+        if current != last:
+            await run_io(log_stats)
+            # a message shown since the last journal write is still buffered
+            await run_io(journal.flush)
+            last = current
+
+
+async def network_task(online):
+    """Keep `online` set while the network monitor reports the network up.
+    The monitor probes and watches the links on its own thread."""
+    loop = asyncio.get_running_loop()
+
+    def changed(up):
+        loop.call_soon_threadsafe(online.set if up else online.clear)
+    network.on_change = changed
+    if network.online:
+        online.set()
+    network.start()
+    try:
+        await loop.create_future()
+    finally:
+        network.on_change = None
+
+
+def ack_settled(receipt, deleted):
+    """AckBuffer callback: a shown message's delete succeeded or was given up."""
+    trace = acked_traces.pop(receipt, None)
+    if trace is None:
+        return
+    if deleted:
+        trace.mark('deleted')
+    latency.record(trace)
+
+
+async def sqs_task(queue_url, arrived, online):
+    """Receive messages from SQS into the prefetch buffer and delete shown ones."""
+    global sqs_acks, sqs_fetcher
+    if queue_url != LOCAL_QUEUE_URL:
+        # import boto3 while the network info is on screen
+        try:
+            await run_io(import_boto3)
+        except RuntimeError:
+            logging.error('boto3 is not installed; cannot start SQS polling. Showing the countdown only.')
             return
-    
+        if not online.is_set():
+            logging.info('Waiting for the network before polling SQS')
+            await online.wait()
+    try:
+        sqs = await run_io(create_sqs_client, queue_url)
+    except RuntimeError as e:
+        # a configuration problem: restarting the task will not fix it
+        logging.error('%s Showing the countdown only.', e)
+        return
+    mark_startup('SQS client ready')
+    if sqs is None:
+        logging.error('No SQS client; showing the countdown only')
+        return
+    logging.info('Polling SQS queue: %s', queue_url)
+    sqs_acks = AckBuffer(sqs, queue_url, flush_interval=ACK_FLUSH_SECONDS, on_api_call=count_api_call,
+                         on_result=ack_settled)
+    # The fetcher keeps up to MESSAGE_BUFFER_SIZE messages ready (renewing
+    # their visibility) while the display task shows them at the hold rate.
+    sqs_fetcher = MessageFetcher(sqs, queue_url, buffer_size=MESSAGE_BUFFER_SIZE, wait_time=SQS_WAIT_TIME_SECONDS,
+                                 visibility_timeout=SQS_VISIBILITY_TIMEOUT, renew_margin=SQS_VISIBILITY_RENEW_MARGIN,
+                                 depth_interval=QUEUE_DEPTH_SAMPLE_SECONDS, on_api_call=count_api_call)
+    # the local test queue needs no network
+    gate = online if queue_url != LOCAL_QUEUE_URL else None
+    await asyncio.gather(sqs_fetcher.run_async(io_executor, arrived, gate), sqs_acks.run_async(io_executor))
+
+
+async def report_startup(stages, timeout=120):
+    """Print the --profile-startup breakdown once all `stages` are marked (or after `timeout`)."""
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        marked = {label for label, t in startup_marks}
+        if all(stage in marked for stage in stages):
+            break
+        await asyncio.sleep(0.1)
+    print('Startup profile (since start / since previous stage):')
+    for line in startup_report():
+        print(line)
+    sys.stdout.flush()
+
+
+def collect_metrics(out):
+    """Fill a metrics.MetricsWriter at scrape time (runs on the metrics server's thread)."""
+    for name, calls in sorted(api_calls.items()):
+        out.counter('xmas_sqs_api_calls_total', 'SQS API calls by API since start', calls, {'api': name})
+    fetcher = sqs_fetcher
+    if fetcher is not None:
+        out.counter('xmas_sqs_receives_total', 'SQS receive_message calls', fetcher.receives)
+        out.counter('xmas_sqs_empty_receives_total', 'SQS receives that returned no messages', fetcher.empty_receives)
+        out.gauge('xmas_sqs_empty_receive_ratio', 'Share of SQS receives that returned no messages',
+                  fetcher.empty_receives / float(fetcher.receives) if fetcher.receives else 0.0)
+        out.gauge('xmas_messages_buffered', 'Messages prefetched and waiting for the display', fetcher.pending())
+        out.gauge('xmas_message_backlog', 'Messages waiting locally and on the queue', fetcher.backlog())
+    out.counter('xmas_messages_displayed_total', 'Messages shown on the LCD', messages_picked_count)
+    if sqs_acks is not None:
+        out.counter('xmas_sqs_messages_deleted_total', 'Displayed messages deleted from SQS', sqs_acks.deleted)
+        out.counter('xmas_sqs_delete_failures_total', 'Displayed messages that could not be deleted', sqs_acks.failed)
+    out.counter('xmas_message_redeliveries_total', 'Messages SQS had delivered before', latency.redelivered)
+    with latency.lock:
+        for stage, hist in latency.histograms.items():
+            out.histogram('xmas_message_latency_seconds', 'Time each message spent in each stage',
+                          hist.cumulative(), hist.sum, hist.count, {'stage': stage})
+    out.counter('xmas_layout_cache_hits_total', 'Message layouts served from the cache', layouts.hits)
+    out.counter('xmas_layout_cache_misses_total', 'Message layouts that had to be wrapped', layouts.misses)
+    out.counter('xmas_countdown_wakeups_total', 'Countdown scheduler wake-ups', countdown_schedule.wakeups)
+    if glyphs is not None:
+        out.counter('xmas_lcd_glyph_uploads_total', 'Custom characters written to CGRAM', glyphs.uploads)
+        out.counter('xmas_lcd_glyph_hits_total', 'Custom characters needed that were already in CGRAM', glyphs.hits)
+    if mcp is not None:
+        out.counter('xmas_lcd_i2c_transactions_total', 'I2C transfers to the LCD backpack', mcp.chip.transactions)
+    try:
+        frames = neopixels.status().get('frames') or {}
+        out.gauge('xmas_neopixel_up', 'NeoPixel effects server answering', 1)
+        out.gauge('xmas_neopixel_fps', 'Measured NeoPixel frame rate', frames.get('fps'))
+        out.gauge('xmas_neopixel_target_fps', 'Target NeoPixel frame rate', frames.get('target_fps'))
+        out.counter('xmas_neopixel_frames_total', 'NeoPixel frames sent', frames.get('frames'))
+        out.counter('xmas_neopixel_dropped_frames_total', 'NeoPixel frames skipped to keep up', frames.get('dropped'))
+        out.counter('xmas_neopixel_late_frames_total', 'NeoPixel frames sent after their deadline', frames.get('late'))
+    except Exception:
+        out.gauge('xmas_neopixel_up', 'NeoPixel effects server answering', 0)
+    state = network.state()
+    if state['online'] is not None:
+        out.gauge('xmas_network_online', 'Network reachable at the last check', int(state['online']))
+        out.gauge('xmas_network_last_change_timestamp_seconds', 'When the network last went up or down',
+                  state['changed_at'])
+    out.counter('xmas_network_probes_total', 'Connectivity probes sent', state['probes'])
+    out.counter('xmas_network_probe_failures_total', 'Connectivity probes that failed', state['probe_failures'])
+    out.counter('xmas_network_link_changes_total', 'Network link changes seen', state['link_changes'])
+    cpu = read_cpu_temp()
+    if cpu is not None:
+        out.gauge('xmas_cpu_temperature_celsius', 'CPU temperature', cpu)
+    rss = read_rss_bytes()
+    if rss is not None:
+        out.gauge('process_resident_memory_bytes', 'Resident memory size in bytes', rss)
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve collect_metrics() in Prometheus format; returns the server or None."""
+    if not port:
+        return None
+    from metrics import MetricsServer
+    try:
+        server = MetricsServer(collect_metrics, METRICS_ADDRESS, port)
+    except OSError:
+        logging.exception('Cannot serve metrics on port %s', port)
+        return None
+    server.start()
+    logging.info('Serving metrics on http://%s:%s/metrics', METRICS_ADDRESS, port)
+    return server
+
+
+async def run(queue_url=None, profile_startup=False):
+    """Run the jumper until cancelled (Ctrl-C or SIGTERM). `queue_url` enables SQS."""
+    loop = asyncio.get_running_loop()
+    main = asyncio.current_task()
+    loop.add_signal_handler(signal.SIGTERM, main.cancel)
+    arrived = asyncio.Event()
+    online = asyncio.Event()
+    effects = asyncio.Queue()
+    tasks = [
+        display_task(arrived, effects, online if queue_url not in (None, LOCAL_QUEUE_URL) else None),
+        supervise('neopixel', lambda: neopixel_task(effects)),
+        supervise('stats', stats_task),
+        supervise('network', lambda: network_task(online)),
+    ]
+    if queue_url:
+        tasks.append(supervise('sqs', lambda: sqs_task(queue_url, arrived, online)))
+    if profile_startup:
+        stages = ['network info on LCD']
+        if queue_url:
+            stages.append('SQS client ready')
+        tasks.append(report_startup(stages))
+    mark_startup('event loop running')
+    await asyncio.gather(*tasks)
+
+
+def load_lcd_timing():
+    """Return the LCD timing profile to use; 'measured' comes from LCD_TIMING_FILE."""
+    if LCD_TIMING_PROFILE != 'measured':
+        return LCD_TIMING_PROFILE
+    try:
+        if os.path.exists(LCD_TIMING_FILE):
+            with open(LCD_TIMING_FILE, 'r', encoding='utf-8') as fh:
+                return json.load(fh)
+    except Exception:
+        logging.exception('Failed to load LCD timing')
+    # measured once below if the busy flag is available
+    return 'conservative'
+
+
+def save_measured_lcd_timing():
+    """Measure the panel with the busy flag and store it for boots without R/W."""
+    try:
+        profile = lcd.measureTiming()
+        with open(LCD_TIMING_FILE, 'w', encoding='utf-8') as fh:
+            json.dump(profile, fh)
+        lcd.setTiming(profile)
+        logging.info('Measured LCD timing: %s', profile)
+    except Exception:
+        logging.exception('Failed to measure LCD timing')
+
+
 # I2C addresses (kept here for historic reasons; can be changed)
 PCF8574_address = 0x27  # I2C address of the PCF8574 chip.
 PCF8574A_address = 0x3F  # I2C address of the PCF8574A chip.
-# Create PCF8574 GPIO adapter.
-try:
-    mcp = PCF8574_GPIO(PCF8574_address)
-except:
+
+# LCD hardware, created once by init_hardware()
+mcp = None
+lcd = None
+fb = None
+glyphs = None
+big_countdown = None    # with XMAS_COUNTDOWN=big
+# the emulated bus when LCD_EMULATOR is set
+lcd_bus = None
+_emulated_screen = None
+
+
+def log_emulated_screen():
+    """Log the emulated panel if it changed since the last call."""
+    global _emulated_screen
+    screen = lcd_bus.screen()
+    if screen != _emulated_screen:
+        _emulated_screen = screen
+        logging.info('LCD (%s I2C transactions):\n%s', lcd_bus.transactions, screen)
+
+
+def init_hardware():
+    """Create the PCF8574 adapter, LCD and framebuffer and initialise the panel.
+    Runs once, on the LCD executor, when the display task starts; later calls
+    do nothing."""
+    global mcp, lcd, fb, lcd_bus, glyphs, big_countdown
+    if lcd is not None:
+        return
+    from PCF8574 import PCF8574_GPIO
+    from Adafruit_LCD2004 import Adafruit_CharLCD
+    from lcd_framebuffer import LCDFramebuffer
+    from lcd_glyphs import GLYPHS, GlyphCache
+    mark_startup('import LCD drivers')
+    if LCD_EMULATOR:
+        from lcd_emulator import EmulatedSMBus
+        lcd_bus = EmulatedSMBus(address=PCF8574_address, byte_time=LCD_EMULATOR_BYTE_SECONDS)
+        # log custom characters as what they are meant to be
+        lcd_bus.lcd.glyph_names = {rows: char for char, rows in GLYPHS.items()}
+        lcd_bus.lcd.glyph_names.update((rows, PREVIEW[char]) for char, rows in SEGMENTS.items())
+    # Create PCF8574 GPIO adapter.
     try:
-        mcp = PCF8574_GPIO(PCF8574A_address)
+        mcp = PCF8574_GPIO(PCF8574_address, bus=lcd_bus)
     except:
-        print ('I2C Address Error !')
-        exit(1)
-# Create LCD, passing in MCP GPIO adapter.
-lcd = Adafruit_CharLCD(pin_rs=0, pin_e=2, pins_db=[4,5,6,7], GPIO=mcp)
-try:
-    # Ensure the LCD object knows its dimensions early so startup displays
-    # (network info, etc.) can call setCursor safely.
-    lcd.begin(LCD_COLS, LCD_ROWS)
-except Exception:
-    # If begin fails, continue — other code will attempt to call begin when needed.
-    logging.exception('LCD begin() failed at startup')
+        try:
+            mcp = PCF8574_GPIO(PCF8574A_address, bus=lcd_bus)
+        except:
+            print ('I2C Address Error !')
+            sys.exit(1)
+    # Create LCD, passing in MCP GPIO adapter.
+    lcd = Adafruit_CharLCD(pin_rs=0, pin_e=2, pins_db=[4,5,6,7], GPIO=mcp,
+                           pin_rw=LCD_PIN_RW if LCD_BUSY_FLAG else None,
+                           timing=load_lcd_timing())
+    if LCD_TIMING_PROFILE == 'measured' and LCD_BUSY_FLAG and not os.path.exists(LCD_TIMING_FILE):
+        save_measured_lcd_timing()
+    # Shadow copy of the 20x4 DDRAM; everything on screen is rendered through
+    # it, with emoji and other non-ROM characters drawn in CGRAM.
+    glyphs = GlyphCache(lcd, {**GLYPHS, **SEGMENTS})
+    fb = LCDFramebuffer(lcd, LCD_COLS, LCD_ROWS, glyphs=glyphs)
+    if COUNTDOWN_STYLE == 'big':
+        big_countdown = BigCountdown(fb)
+    try:
+        mcp.output(3, 1)     # turn on LCD backlight
+        lcd.begin(LCD_COLS, LCD_ROWS)
+    except Exception:
+        # If begin fails, continue — _prepare_countdown() calls begin again later.
+        logging.exception('LCD begin() failed at startup')
+    mark_startup('LCD initialised')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Christmas jumper: LCD countdown, SQS messages and NeoPixels.')
+    parser.add_argument('mode', nargs='?', default='countdown',
+                        help="'sq', 'sqs' or 'poll' to display messages from SQS; anything else shows the countdown only")
+    parser.add_argument('queue_url', nargs='?', default=SQS_DEFAULT_QUEUE_URL,
+                        help="SQS queue URL, or 'local' for the in-memory stand-in")
+    parser.add_argument('--emulate-lcd', action='store_true', default=LCD_EMULATOR,
+                        help='draw on a software LCD and log its contents instead of using I2C (XMAS_LCD_EMULATOR=1)')
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                        help='port for the Prometheus /metrics endpoint, 0 to disable (XMAS_METRICS_PORT)')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print how long imports and initialisation took once the jumper is up')
+    return parser.parse_args(argv)
+
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    logging.info('Program is starting ...')
+    logging.info('Script directory: %s', SCRIPT_DIR)
+    logging.info('Messages file: %s', MESSAGES_FILE)
+    logging.info('Stats file: %s', STATUS_FILE)
+    args = parse_args()
+    LCD_EMULATOR = args.emulate_lcd
+    mark_startup('imports')
+    # load persisted stats if present
+    load_stats()
+    start_metrics_server(args.metrics_port)
+    # If the user passed 'sq', 'sqs' or 'poll' as an argument, poll SQS as well
+    queue_url = None
+    if args.mode.lower().startswith(('sq','sqs','poll')):
+        queue_url = args.queue_url
     try:
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
-        logging.info('Program is starting ...')
-        logging.info('Script directory: %s', SCRIPT_DIR)
-        logging.info('Messages file: %s', MESSAGES_FILE)
-        logging.info('Stats file: %s', STATUS_FILE)
-        # load persisted stats if present
-        load_stats()
-        # Show network info once at startup for 60 seconds (SSID + IP)
-        try:
-            display_network_info(60)
-        except Exception:
-            logging.exception('Error showing network info')
-        # If boto3 is available and the user passed 'sq', 'sqs' or 'poll' as an argument, poll SQS
-        if len(sys.argv) > 1 and sys.argv[1].lower().startswith(('sq','sqs','poll')):
-            if boto3 is None:
-                logging.error('boto3 is not installed; cannot start SQS polling. Falling back to local display loop.')
-                try:
-                    loop()
-                except KeyboardInterrupt:
-                    destroy()
-                sys.exit(0)
-
-            # allow optional queue URL as second argument, otherwise use the default from the request
-            queue_url = sys.argv[2] if len(sys.argv) > 2 else SQS_DEFAULT_QUEUE_URL
-
-            try:
-                poll_sqs_and_display(queue_url)
-                # if poller returns (unexpectedly), fall back to loop()
-                logging.info('SQS poller exited; falling back to local loop()')
-                try:
-                    loop()
-                except KeyboardInterrupt:
-                    destroy()
-            except KeyboardInterrupt:
-                destroy()
-            except Exception as e:
-                logging.exception('Error starting poller')
-                logging.info('Falling back to loop()')
-                try:
-                    loop()
-                except KeyboardInterrupt:
-                    destroy()
-        else:
-            try:
-                loop()
-            except KeyboardInterrupt:
-                destroy()
-    except KeyboardInterrupt:
-        destroy()
-    except Exception as e:
-        # On any unexpected error, log and fall back to the loop display
+        asyncio.run(run(queue_url, profile_startup=args.profile_startup))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    except Exception:
         logging.exception('Unhandled exception at top level')
-        try:
-            loop()
-        except KeyboardInterrupt:
-            destroy()
-
+    finally:
+        destroy()
@@ -0,0 +1,47 @@
+"""Adaptive message hold time.
+
+Each message is normally shown for the full hold time, but when a backlog
+builds up (a QR-code burst at a party) the hold shrinks so the backlog is
+worked through in roughly `target_clear` seconds, never dropping below
+`min_hold`. As the backlog drains the hold stretches back to `max_hold`.
+"""
+import time
+
+
+class HoldPolicy(object):
+
+    def __init__(self, max_hold=60, min_hold=10, target_clear=300, clock=time.monotonic):
+        self.max_hold = max_hold
+        self.min_hold = min_hold
+        self.target_clear = target_clear
+        self.clock = clock
+        self.backlog_since = None   # when the current backlog started
+        self.last_clear_seconds = None
+        self.max_clear_seconds = 0.0
+        self.backlogs_cleared = 0
+
+    def hold_seconds(self, backlog):
+        """Seconds to show a message with `backlog` more waiting behind it."""
+        self.observe(backlog)
+        if backlog <= 0:
+            return self.max_hold
+        return max(self.min_hold, min(self.max_hold, self.target_clear / float(backlog)))
+
+    def observe(self, backlog):
+        """Track when a backlog appears and how long it takes to clear."""
+        now = self.clock()
+        if backlog > 0:
+            if self.backlog_since is None:
+                self.backlog_since = now
+        elif self.backlog_since is not None:
+            self.last_clear_seconds = now - self.backlog_since
+            self.max_clear_seconds = max(self.max_clear_seconds, self.last_clear_seconds)
+            self.backlogs_cleared += 1
+            self.backlog_since = None
+
+    def stats(self):
+        return {
+            'last_backlog_clear_seconds': self.last_clear_seconds,
+            'max_backlog_clear_seconds': self.max_clear_seconds,
+            'backlogs_cleared': self.backlogs_cleared,
+        }
@@ -0,0 +1,114 @@
+"""Two-row-tall digits for the 20x4 LCD, built from 8 CGRAM segments.
+
+Each digit is 3 cells wide and 2 rows tall, drawn with the 8 segment
+glyphs below (private-use characters, so they go through the shared
+`lcd_glyphs.GlyphCache` like any other custom character) plus the ROM's
+full block. `BigCountdown` puts the days on rows 0-1 and HH:MM:SS on rows
+2-3 of a framebuffer and only redraws the digits that changed since the
+last frame. Rows 2 and 3 are separate controller lines, so each changed
+row of a digit costs a cursor move and a data write: a seconds tick is 2
+or 4 I2C transactions (24-48 bytes), 5 when the tens of seconds change,
+and up to 10 when the minutes or hours roll over, about 3.7 on average.
+"""
+
+# segment glyphs, named after where they sit in a digit
+LT = '\ue000'   # left top: rounded corner
+UB = '\ue001'   # upper bar
+RT = '\ue002'   # right top
+LL = '\ue003'   # lower left
+LB = '\ue004'   # lower bar
+LR = '\ue005'   # lower right
+UMB = '\ue006'  # upper and middle bars
+LMB = '\ue007'  # middle and lower bars
+FULL = '█'      # ROM 0xFF
+
+SEGMENTS = {
+    LT: (0b00111, 0b01111, 0b11111, 0b11111, 0b11111, 0b11111, 0b11111, 0b11111),
+    UB: (0b11111, 0b11111, 0b11111, 0b00000, 0b00000, 0b00000, 0b00000, 0b00000),
+    RT: (0b11100, 0b11110, 0b11111, 0b11111, 0b11111, 0b11111, 0b11111, 0b11111),
+    LL: (0b11111, 0b11111, 0b11111, 0b11111, 0b11111, 0b11111, 0b01111, 0b00111),
+    LB: (0b00000, 0b00000, 0b00000, 0b00000, 0b00000, 0b11111, 0b11111, 0b11111),
+    LR: (0b11111, 0b11111, 0b11111, 0b11111, 0b11111, 0b11111, 0b11110, 0b11100),
+    UMB: (0b11111, 0b11111, 0b11111, 0b00000, 0b00000, 0b00000, 0b11111, 0b11111),
+    LMB: (0b11111, 0b00000, 0b00000, 0b00000, 0b00000, 0b11111, 0b11111, 0b11111),
+}
+
+# block characters that look like each segment, for logging an emulated screen
+PREVIEW = {LT: '▛', UB: '▀', RT: '▜', LL: '▙', LB: '▄', LR: '▟', UMB: '▀', LMB: '▄'}
+
+# (top row, bottom row) of each digit
+DIGITS = {
+    '0': (LT + UB + RT, LL + LB + LR),
+    '1': (UB + RT + ' ', LB + FULL + LB),
+    '2': (UMB + UMB + RT, LL + LB + LB),
+    '3': (UMB + UMB + RT, LB + LB + LR),
+    '4': (LL + LB + FULL, '  ' + FULL),
+    '5': (LL + UMB + UMB, LB + LB + LR),
+    '6': (LT + UMB + UMB, LL + LB + LR),
+    '7': (UB + UB + RT, '  ' + FULL),
+    '8': (LT + UMB + RT, LL + LB + LR),
+    '9': (LT + UMB + RT, '  ' + FULL),
+    ' ': ('   ', '   '),
+}
+COLON = ('･', '･')  # ROM 0xA5, a centred dot in each row
+
+
+def big_text(text):
+    """(top, bottom) rows for a string of digits, spaces and colons."""
+    top = []
+    bottom = []
+    for char in text:
+        cells = COLON if char == ':' else DIGITS[char]
+        top.append(cells[0])
+        bottom.append(cells[1])
+    return ''.join(top), ''.join(bottom)
+
+
+class BigCountdown(object):
+    """Days, hours, minutes and seconds to go in big digits.
+
+    Rows 0-1: up to three digits of days and a small label; rows 2-3:
+    HH:MM:SS across the full 20 columns."""
+
+    # (row, col) of each big character; days get a column of space between digits
+    DAYS = [(0, 0), (0, 4), (0, 8)]
+    CLOCK = [(2, 0), (2, 3), (2, 6), (2, 7), (2, 10), (2, 13), (2, 14), (2, 17)]
+    LABEL_COL = 12
+
+    def __init__(self, fb, label=('days to', 'Xmas!')):
+        self.fb = fb
+        self.label = label
+        self.drawn = {}         # (row, col) -> character drawn there
+        self.frame = None       # fb.lines() after the last draw
+
+    def invalidate(self):
+        """Redraw everything next time, e.g. after something else used the screen."""
+        self.drawn = {}
+        self.frame = None
+
+    def _put(self, row, col, char):
+        if self.drawn.get((row, col)) == char:
+            return False
+        top, bottom = big_text(char)
+        self.fb.write(row, col, top)
+        self.fb.write(row + 1, col, bottom)
+        self.drawn[(row, col)] = char
+        return True
+
+    def draw(self, days, hours, minutes, seconds):
+        """Write the changed digits into the framebuffer; returns how many
+        big characters were redrawn (commit() is left to the caller)."""
+        if self.frame != self.fb.lines():
+            # the screen was used for something else since the last draw
+            self.invalidate()
+            self.fb.clear()
+            for row, text in enumerate(self.label):
+                self.fb.write(row, self.LABEL_COL, text[:self.fb.cols - self.LABEL_COL])
+        changed = 0
+        for (row, col), char in zip(self.DAYS, '%3d' % min(days, 999)):
+            changed += self._put(row, col, char)
+        clock = '%02d:%02d:%02d' % (hours, minutes, seconds)
+        for (row, col), char in zip(self.CLOCK, clock):
+            changed += self._put(row, col, char)
+        self.frame = self.fb.lines()
+        return changed
@@ -0,0 +1,337 @@
+"""Software stand-in for the I2C LCD: a fake SMBus with an emulated PCF8574
+backpack and HD44780 controller behind it.
+
+Port writes are decoded the way the real chips see them: every byte of an
+I2C write (including the SMBus command byte) is latched onto the PCF8574
+pins, the falling edge of E clocks a nibble into the controller, and the
+controller keeps DDRAM, CGRAM, the address counter, display shift and the
+busy flag. Transactions and bytes are counted and each transaction can cost
+simulated bus time, so display code can be measured and its output checked
+without hardware.
+
+    bus = EmulatedSMBus(latency=0.0005)
+    mcp = PCF8574_GPIO(0x27, bus=bus)
+    ...
+    print('\\n'.join(bus.lcd.lines()))
+
+cslm-christmas.py uses it when XMAS_LCD_EMULATOR=1 or --emulate-lcd is given.
+"""
+import threading
+import time
+
+# Pin assignment on the usual backpack (as wired in cslm-christmas.py)
+PIN_RS = 0
+PIN_RW = 1
+PIN_E = 2
+PIN_BACKLIGHT = 3
+DATA_SHIFT = 4      # D4-D7 on P4-P7
+
+# A00 character ROM codes above ASCII that the jumper uses
+ROM_CHARACTERS = {
+    0x5C: '¥', 0x7E: '→', 0x7F: '←', 0xA5: '･',
+    0xDF: '°', 0xE0: 'α', 0xE1: 'ä', 0xE2: 'β', 0xE3: 'ε', 0xE4: 'µ', 0xE5: 'σ', 0xE6: 'ρ',
+    0xE8: '√', 0xEC: '¢', 0xEE: 'ñ', 0xEF: 'ö',
+    0xF2: 'θ', 0xF3: '∞', 0xF4: 'Ω', 0xF5: 'ü', 0xF6: 'Σ', 0xF7: 'π', 0xFD: '÷',
+    0xFF: '█',
+}
+
+
+class HD44780(object):
+    """The controller: 2 x 40 bytes of DDRAM shown as a 20x4 panel."""
+
+    LINE_LENGTH = 40
+    LINE_ADDRESSES = (0x00, 0x40)
+    # execution times in seconds (datasheet, 270 kHz oscillator)
+    COMMAND_TIME = 37e-6
+    CLEAR_TIME = 1.52e-3
+
+    def __init__(self, cols=20, rows=4, clock=time.monotonic):
+        self.cols = cols
+        self.rows = rows
+        self.clock = clock
+        self.ddram = [[0x20] * self.LINE_LENGTH for _ in self.LINE_ADDRESSES]
+        self.cgram = [0] * 64
+        self.address = 0        # address counter
+        self.cgram_mode = False  # last address set was a CGRAM address
+        self.increment = True
+        self.shift_on_write = False
+        self.shift = 0          # display shift in cells (positive = content moved left)
+        self.display_on = False
+        self.cursor_on = False
+        self.blink_on = False
+        self.eight_bit = True   # power-on state until a 4-bit function set
+        self.two_line = False
+        self.high_nibble = None  # first half of a 4-bit transfer
+        self.read_low = False   # next 4-bit read returns the low nibble
+        self.busy_until = 0.0
+        self.instructions = 0
+        self.characters = 0
+        self.overruns = 0       # writes that arrived while the controller was busy
+        # {8 row bitmaps: character} to show known CGRAM glyphs by name in lines()
+        self.glyph_names = {}
+
+    def busy(self):
+        return self.clock() < self.busy_until
+
+    def write_nibble(self, rs, nibble):
+        if self.eight_bit:
+            # only D4-D7 are wired: the low half of the byte reads as zero
+            self._execute(rs, nibble << 4)
+        elif self.high_nibble is None:
+            self.high_nibble = nibble
+        else:
+            value = (self.high_nibble << 4) | nibble
+            self.high_nibble = None
+            self._execute(rs, value)
+
+    def read_nibble(self, rs):
+        """Nibble the controller drives onto D4-D7 while E is high in a read."""
+        if rs:
+            value = self._memory_value()
+        else:
+            value = (0x80 if self.busy() else 0) | (self.address & 0x7F)
+        if self.eight_bit:
+            return value >> 4
+        return value & 0x0F if self.read_low else value >> 4
+
+    def end_read(self, rs):
+        """E fell at the end of a read cycle."""
+        if not self.eight_bit:
+            self.read_low = not self.read_low
+            if self.read_low:
+                return      # the low nibble is still to come
+        if rs:
+            self._move(self.increment)
+
+    def _execute(self, rs, value):
+        if self.busy():
+            self.overruns += 1
+        duration = self.COMMAND_TIME
+        if rs:
+            self.characters += 1
+            self._memory_write(value)
+        else:
+            self.instructions += 1
+            duration = self._instruction(value)
+        self.busy_until = self.clock() + duration
+
+    def _instruction(self, value):
+        if value & 0x80:        # set DDRAM address
+            self.address = value & 0x7F
+            self.cgram_mode = False
+        elif value & 0x40:      # set CGRAM address
+            self.address = value & 0x3F
+            self.cgram_mode = True
+        elif value & 0x20:      # function set
+            self.eight_bit = bool(value & 0x10)
+            self.two_line = bool(value & 0x08)
+            self.high_nibble = None
+            self.read_low = False
+        elif value & 0x10:      # cursor or display shift
+            step = 1 if value & 0x04 else -1
+            if value & 0x08:
+                self.shift -= step
+            else:
+                self._move(step > 0)
+        elif value & 0x08:      # display control
+            self.display_on = bool(value & 0x04)
+            self.cursor_on = bool(value & 0x02)
+            self.blink_on = bool(value & 0x01)
+        elif value & 0x04:      # entry mode
+            self.increment = bool(value & 0x02)
+            self.shift_on_write = bool(value & 0x01)
+        elif value & 0x02:      # return home
+            self.address = 0
+            self.cgram_mode = False
+            self.shift = 0
+            return self.CLEAR_TIME
+        elif value & 0x01:      # clear display
+            for line in self.ddram:
+                line[:] = [0x20] * self.LINE_LENGTH
+            self.address = 0
+            self.cgram_mode = False
+            self.shift = 0
+            self.increment = True
+            return self.CLEAR_TIME
+        return self.COMMAND_TIME
+
+    def _locate(self, address):
+        line = 1 if address >= self.LINE_ADDRESSES[1] else 0
+        return line, (address - self.LINE_ADDRESSES[line]) % self.LINE_LENGTH
+
+    def _move(self, forward):
+        if self.cgram_mode:
+            self.address = (self.address + (1 if forward else -1)) % len(self.cgram)
+            return
+        line, col = self._locate(self.address)
+        col += 1 if forward else -1
+        if col >= self.LINE_LENGTH:
+            line, col = 1 - line, 0
+        elif col < 0:
+            line, col = 1 - line, self.LINE_LENGTH - 1
+        self.address = self.LINE_ADDRESSES[line] + col
+
+    def _memory_write(self, value):
+        if self.cgram_mode:
+            self.cgram[self.address] = value & 0x1F
+        else:
+            line, col = self._locate(self.address)
+            self.ddram[line][col] = value
+            if self.shift_on_write:
+                self.shift += 1 if self.increment else -1
+        self._move(self.increment)
+
+    def _memory_value(self):
+        if self.cgram_mode:
+            return self.cgram[self.address]
+        line, col = self._locate(self.address)
+        return self.ddram[line][col]
+
+    def codes(self):
+        """Character codes currently visible, one list per panel row."""
+        out = []
+        for row in range(self.rows):
+            # rows 2 and 3 continue lines 0 and 1 past the first 20 cells
+            line = self.ddram[row % 2]
+            start = (row // 2) * self.cols + self.shift
+            out.append([line[(start + col) % self.LINE_LENGTH] for col in range(self.cols)])
+        return out
+
+    def lines(self):
+        """Visible text, one string per row. CGRAM characters come out as the
+        character `glyph_names` gives for their bitmap, else chr(0)-chr(7);
+        unknown ROM codes as '?'."""
+        out = []
+        for row in self.codes():
+            chars = []
+            for code in row:
+                if code < 0x10:
+                    chars.append(self.glyph_names.get(tuple(self.glyph(code & 0x07)), chr(code & 0x07)))
+                else:
+                    chars.append(self.character(code))
+            out.append(''.join(chars))
+        return out
+
+    @staticmethod
+    def character(code):
+        if code < 0x10:
+            return chr(code & 0x07)
+        if code in ROM_CHARACTERS:
+            return ROM_CHARACTERS[code]
+        if 0x20 <= code < 0x80:
+            return chr(code)
+        return '?'
+
+    def glyph(self, slot):
+        """The 8 rows (5 bits each) of a CGRAM character."""
+        return self.cgram[slot * 8:slot * 8 + 8]
+
+
+class EmulatedSMBus(object):
+    """Drop-in for smbus.SMBus with a PCF8574 LCD backpack at `address`.
+
+    `latency` seconds are charged per transaction and `byte_time` per byte
+    (about 90 us at 100 kHz); they are added to `bus_time` and, with
+    `realtime`, also slept so wall-clock measurements see them. Either way
+    the controller's busy time is measured against the simulated bus time,
+    so `overruns` shows writes a real bus would deliver too early."""
+
+    def __init__(self, bus=1, address=None, latency=0.0, byte_time=0.0, realtime=True, cols=20, rows=4):
+        self.address = address      # None answers on any address
+        self.latency = latency
+        self.byte_time = byte_time
+        self.realtime = realtime
+        self.lock = threading.Lock()
+        self.lcd = HD44780(cols, rows, clock=self.now)
+        self.port = 0xFF            # PCF8574 outputs are high after power-on
+        self.transactions = 0
+        self.bytes_written = 0
+        self.reads = 0
+        self.bus_time = 0.0
+        self.unslept = 0.0
+
+    def now(self):
+        """Time as the controller sees it: wall clock plus bus time not slept (yet)."""
+        return time.monotonic() + self.unslept
+
+    def _charge(self, seconds):
+        self.bus_time += seconds
+        self.unslept += seconds
+
+    def _transaction(self, address):
+        if self.address is not None and address != self.address:
+            raise IOError(121, 'Remote I/O error')    # what smbus raises for a missing device
+        self.transactions += 1
+        # start condition and address byte
+        self._charge(self.latency + self.byte_time)
+
+    def _finish(self):
+        if self.realtime and self.unslept > 0:
+            time.sleep(self.unslept)
+            self.unslept = 0.0
+
+    def _latch(self, value):
+        self.bytes_written += 1
+        # each byte reaches the port only once it has been clocked out
+        self._charge(self.byte_time)
+        value &= 0xFF
+        e_fell = self.port & (1 << PIN_E) and not value & (1 << PIN_E)
+        # the controller samples RS, R/W and the data lines while E is high
+        sampled = self.port
+        self.port = value
+        if not e_fell:
+            return
+        rs = sampled & (1 << PIN_RS)
+        if sampled & (1 << PIN_RW):
+            self.lcd.end_read(rs)
+            return
+        self.lcd.write_nibble(bool(rs), (sampled >> DATA_SHIFT) & 0x0F)
+
+    def write_byte(self, address, value):
+        with self.lock:
+            self._transaction(address)
+            self._latch(value)
+            self._finish()
+
+    def write_i2c_block_data(self, address, command, values):
+        with self.lock:
+            self._transaction(address)
+            for value in [command] + list(values):
+                self._latch(value)
+            self._finish()
+
+    def read_byte(self, address):
+        with self.lock:
+            self._transaction(address)
+            self._charge(self.byte_time)
+            self._finish()
+            self.reads += 1
+            port = self.port
+            if port & (1 << PIN_E) and port & (1 << PIN_RW):
+                # the controller pulls data lines low; the backpack's weak
+                # pull-ups provide the ones
+                nibble = self.lcd.read_nibble(port & (1 << PIN_RS))
+                port &= ~(0x0F << DATA_SHIFT) | (nibble << DATA_SHIFT)
+            return port & 0xFF
+
+    def close(self):
+        pass
+
+    def backlight(self):
+        return bool(self.port & (1 << PIN_BACKLIGHT))
+
+    def stats(self):
+        return {
+            'transactions': self.transactions,
+            'bytes': self.bytes_written,
+            'reads': self.reads,
+            'bus_time': self.bus_time,
+            'instructions': self.lcd.instructions,
+            'characters': self.lcd.characters,
+            'overruns': self.lcd.overruns,
+        }
+
+    def screen(self):
+        """The panel as a framed block of text, for logs."""
+        border = '+' + '-' * self.lcd.cols + '+'
+        return '\n'.join([border] + ['|%s|' % line for line in self.lcd.lines()] + [border])
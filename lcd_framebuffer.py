@@ -0,0 +1,106 @@
+"""Shadow framebuffer for HD44780 character LCDs.
+
+Keeps a model of what is currently in DDRAM and of what should be shown
+next. `commit()` only sends the runs of cells that differ, ordered by DDRAM
+address so the controller's address auto-increment saves `setCursor` calls.
+With a `lcd_glyphs.GlyphCache`, cells hold Unicode characters and commit()
+loads the custom glyphs the frame needs before sending its codes.
+"""
+from lcd_glyphs import normalise
+
+# DDRAM start address of each visible row on a 20x4 panel
+ROW_OFFSETS = [0x00, 0x40, 0x14, 0x54]
+
+
+class LCDFramebuffer(object):
+
+    # Rewriting an unchanged cell costs the same single byte as a setCursor
+    # jump, so gaps this small are sent as data rather than skipped.
+    MAX_GAP = 1
+
+    def __init__(self, lcd, cols=20, rows=4, glyphs=None):
+        self.lcd = lcd
+        self.glyphs = glyphs
+        self.cols = cols
+        self.rows = rows
+        self.pending = [[' '] * cols for _ in range(rows)]
+        self.shown = [[None] * cols for _ in range(rows)]
+        self.cursor = None      # DDRAM address the controller will write next, None if unknown
+
+    def invalidate(self):
+        """Forget what is on the panel, e.g. after lcd.clear() or a display shift."""
+        self.shown = [[None] * self.cols for _ in range(self.rows)]
+        self.cursor = None
+
+    def clear(self):
+        """Blank the whole frame (sent on the next commit)."""
+        for row in self.pending:
+            row[:] = [' '] * self.cols
+
+    def write(self, row, col, text):
+        """Place `text` at (col, row), clipped to the row."""
+        if row < 0 or row >= self.rows:
+            return
+        text = str(text)
+        if self.glyphs is not None:
+            text = normalise(text)
+        for i, char in enumerate(text):
+            c = col + i
+            if c >= self.cols:
+                break
+            if c >= 0:
+                self.pending[row][c] = char
+
+    def write_row(self, row, text):
+        """Replace a whole row, padding or truncating to the panel width."""
+        text = str(text)
+        if self.glyphs is not None:
+            text = normalise(text)
+        self.write(row, 0, text[:self.cols].ljust(self.cols))
+
+    def lines(self):
+        """Return the pending frame as a list of strings."""
+        return [''.join(row) for row in self.pending]
+
+    def dirty_runs(self):
+        """Return [(row, col, text)] for the changed cells, in DDRAM order."""
+        runs = []
+        for row in sorted(range(self.rows), key=lambda r: ROW_OFFSETS[r]):
+            pending = self.pending[row]
+            shown = self.shown[row]
+            start = end = None
+            for col in range(self.cols):
+                if pending[col] == shown[col]:
+                    continue
+                if start is not None and col - end - 1 <= self.MAX_GAP:
+                    end = col
+                    continue
+                if start is not None:
+                    runs.append((row, start, ''.join(pending[start:end + 1])))
+                start = end = col
+            if start is not None:
+                runs.append((row, start, ''.join(pending[start:end + 1])))
+        return runs
+
+    def commit(self):
+        """Send the changed cells to the LCD. Returns the number of runs written."""
+        runs = self.dirty_runs()
+        if runs and self.glyphs is not None:
+            # the whole frame, so glyphs on unchanged cells keep their slots
+            if self.glyphs.load(''.join(self.lines())):
+                self.cursor = None      # the address counter is in CGRAM now
+        for row, col, text in runs:
+            address = ROW_OFFSETS[row] + col
+            if address != self.cursor:
+                self.lcd.setCursor(col, row)
+            # forget the cursor until the write completes in case it fails part way
+            self.cursor = None
+            if self.glyphs is not None:
+                self.lcd.write(self.glyphs.encode(text))
+            else:
+                self.lcd.message(text)
+            self.shown[row][col:col + len(text)] = list(text)
+            # row 0 runs on into row 2 (and row 1 into row 3) inside the
+            # controller's 40-byte lines, so the next run may need no jump
+            self.cursor = address + len(text)
+        return len(runs)
@@ -0,0 +1,144 @@
+"""Unicode text on an HD44780 with the A00 (Japanese) character ROM.
+
+ASCII mostly maps to itself, a few more characters (°, ä, ö, ü, π, ...)
+are in the ROM, and festive symbols, emoji and the two ASCII characters the
+ROM replaces (backslash is ¥, tilde is →) are drawn as custom characters in
+the 8 CGRAM slots. `GlyphCache` keeps track of which glyph is in which slot,
+uploads a glyph only when it is not already resident and evicts the least
+recently used one when a new glyph needs a slot, so redrawing a screen with
+the same emoji costs no CGRAM writes. Anything else falls back to its
+unaccented ASCII letter or '?'.
+"""
+import unicodedata
+
+# A00 ROM codes for characters outside (or replaced in) its ASCII range
+ROM_CODES = {
+    '¥': 0x5C, '→': 0x7E, '←': 0x7F, '･': 0xA5,
+    '°': 0xDF, 'α': 0xE0, 'ä': 0xE1, 'β': 0xE2, 'ß': 0xE2, 'ε': 0xE3, 'µ': 0xE4, 'μ': 0xE4,
+    'σ': 0xE5, 'ρ': 0xE6, '√': 0xE8, '¢': 0xEC, 'ñ': 0xEE, 'ö': 0xEF,
+    'θ': 0xF2, '∞': 0xF3, 'Ω': 0xF4, 'ü': 0xF5, 'Σ': 0xF6, 'π': 0xF7, '÷': 0xFD,
+    '█': 0xFF,
+}
+
+# 5x8 custom characters, one 5-bit row each, top to bottom
+GLYPHS = {
+    '\\': (0b00000, 0b10000, 0b01000, 0b00100, 0b00010, 0b00001, 0b00000, 0b00000),
+    '~': (0b00000, 0b00000, 0b01000, 0b10101, 0b00010, 0b00000, 0b00000, 0b00000),
+    '♥': (0b00000, 0b01010, 0b11111, 0b11111, 0b11111, 0b01110, 0b00100, 0b00000),
+    '★': (0b00100, 0b00100, 0b11111, 0b01110, 0b01110, 0b01010, 0b10001, 0b00000),
+    '🎄': (0b00100, 0b01110, 0b11111, 0b01110, 0b11111, 0b00100, 0b00100, 0b00000),
+    '❄': (0b00000, 0b10101, 0b01110, 0b11111, 0b01110, 0b10101, 0b00000, 0b00000),
+    '🎁': (0b01010, 0b00100, 0b11111, 0b10101, 0b11111, 0b10101, 0b11111, 0b00000),
+    '🔔': (0b00100, 0b01110, 0b01110, 0b01110, 0b11111, 0b00000, 0b00100, 0b00000),
+    '⛄': (0b01110, 0b01110, 0b00100, 0b01110, 0b11111, 0b11111, 0b01110, 0b00000),
+    '🙂': (0b00000, 0b01010, 0b01010, 0b00000, 0b10001, 0b01110, 0b00000, 0b00000),
+    '€': (0b00111, 0b01000, 0b11110, 0b01000, 0b11110, 0b01000, 0b00111, 0b00000),
+    '£': (0b00110, 0b01001, 0b01000, 0b11110, 0b01000, 0b01000, 0b11111, 0b00000),
+}
+
+# variants drawn with the same glyph (so they share a slot)
+ALIASES = {
+    '❤': '♥', '♡': '♥', '💖': '♥', '💕': '♥', '😍': '♥',
+    '⭐': '★', '🌟': '★', '✨': '★', '☆': '★',
+    '❅': '❄', '❆': '❄', '🌨': '❄',
+    '☃': '⛄',
+    '😀': '🙂', '😃': '🙂', '😄': '🙂', '😊': '🙂', '☺': '🙂',
+    '🛎': '🔔',
+}
+
+# emoji modifiers that only change how the previous character looks
+_MODIFIERS = {chr(c) for c in range(0x1F3FB, 0x1F400)}
+
+
+def normalise(text):
+    """Text as the LCD will show it, one cell per character: composed
+    accents, aliases folded, and zero-width joiners, variation selectors and
+    skin-tone modifiers dropped."""
+    out = []
+    for char in unicodedata.normalize('NFC', str(text)):
+        if char.isascii():
+            out.append(char)
+            continue
+        if char in _MODIFIERS or unicodedata.category(char) in ('Cf', 'Mn'):
+            continue
+        out.append(ALIASES.get(char, char))
+    return ''.join(out)
+
+
+def fallback(char):
+    """Closest plain character for one that cannot be shown."""
+    ascii_form = unicodedata.normalize('NFKD', char).encode('ascii', 'ignore').decode('ascii')
+    if len(ascii_form) == 1 and ascii_form.isprintable() and ascii_form not in GLYPHS:
+        return ascii_form
+    return '?'
+
+
+class GlyphCache(object):
+    """The 8 CGRAM slots of one LCD, filled on demand with LRU eviction."""
+
+    SLOTS = 8
+
+    def __init__(self, lcd, glyphs=GLYPHS):
+        self.lcd = lcd
+        self.glyphs = glyphs
+        self.slots = [None] * self.SLOTS    # glyph character in each slot
+        self.resident = {}                  # glyph character -> slot
+        self.last_used = [0] * self.SLOTS
+        self.clock = 0
+        self.uploads = 0
+        self.hits = 0
+
+    def reset(self):
+        """Forget the slots, e.g. after the LCD has been re-initialised."""
+        self.slots = [None] * self.SLOTS
+        self.resident = {}
+        self.last_used = [0] * self.SLOTS
+
+    def needs_slot(self, char):
+        return char in self.glyphs and char not in ROM_CODES
+
+    def load(self, text):
+        """Make the custom glyphs used in `text` resident, keeping the slots of
+        every glyph in it. Returns the number of glyphs uploaded (the LCD's
+        address counter is in CGRAM afterwards if that is not 0). Past 8
+        distinct glyphs, the ones seen last fall back to plain characters."""
+        wanted = []
+        for char in text:
+            if self.needs_slot(char) and char not in wanted:
+                wanted.append(char)
+        self.clock += 1
+        wanted = wanted[:self.SLOTS]
+        uploads = 0
+        for char in wanted:
+            slot = self.resident.get(char)
+            if slot is None:
+                # empty slots have never been used, so they go first
+                slot = min((s for s in range(self.SLOTS) if self.slots[s] not in wanted),
+                           key=lambda s: self.last_used[s])
+                evicted = self.slots[slot]
+                if evicted is not None:
+                    del self.resident[evicted]
+                self.lcd.createChar(slot, self.glyphs[char])
+                self.slots[slot] = char
+                self.resident[char] = slot
+                uploads += 1
+            else:
+                self.hits += 1
+            self.last_used[slot] = self.clock
+        self.uploads += uploads
+        return uploads
+
+    def code(self, char):
+        """The character code that shows `char` with the current slots."""
+        if char in ROM_CODES:
+            return ROM_CODES[char]
+        slot = self.resident.get(char)
+        if slot is not None:
+            return slot
+        if char.isascii() and char.isprintable() and char not in self.glyphs:
+            return ord(char)
+        return ord(fallback(char))
+
+    def encode(self, text):
+        """Character codes for `text` (call load() with it first)."""
+        return [self.code(char) for char in text]
@@ -0,0 +1,80 @@
+"""Hardware-scrolled marquee for HD44780 character LCDs.
+
+Each controller line is a ring of 40 bytes of DDRAM that the display shift
+moves across the panel: on a 20x4 the first line is rows 0 and 2, so a
+shifted display shows ring cells p..p+19 on row 0 and p+20..p+39 on row 2,
+and text read row 0 then row 2 runs on. The marquee loads the ring once
+and then runs the controller in autoscroll mode, where each character
+written also shifts the display one cell left. A step is therefore a
+single data write: the cell that is just leaving the window (and will next
+show up at the far end of it) gets the character that belongs there, and
+the controller moves the window past it.
+
+The second line (rows 1 and 3) shifts along with the first, so it holds
+fixed text that is the same all the way round (blank by default).
+
+With a `lcd_glyphs.GlyphCache` the custom glyphs in the text are loaded
+once at start() and stay resident while it scrolls.
+"""
+from lcd_glyphs import normalise
+
+
+class Marquee(object):
+
+    LINE_LENGTH = 40    # DDRAM cells per controller line
+
+    def __init__(self, lcd, text, gap=6, fill=' ', glyphs=None):
+        self.lcd = lcd
+        self.glyphs = glyphs
+        # the text followed by a gap, repeated for as long as the marquee runs
+        self.stream = normalise(' '.join(str(text).split())) + ' ' * gap
+        self.fill = fill
+        self.position = 0       # steps taken; ring cell position % 40 is at the top left
+
+    def _chars(self, start, count):
+        size = len(self.stream)
+        return ''.join(self.stream[(start + i) % size] for i in range(count))
+
+    def _write(self, text):
+        if self.glyphs is not None:
+            self.lcd.write(self.glyphs.encode(text))
+        else:
+            self.lcd.message(text)
+
+    def start(self):
+        """Load both lines and switch to autoscroll; the text starts at the top left."""
+        lcd = self.lcd
+        if self.glyphs is not None:
+            self.glyphs.load(self.stream)
+        lcd.noAutoscroll()
+        lcd.home()          # display shift back to 0
+        lcd.setCursor(0, 0)
+        self._write(self._chars(0, self.LINE_LENGTH))
+        lcd.setCursor(0, 1)
+        self._write(self.fill * self.LINE_LENGTH)
+        lcd.setCursor(0, 0)
+        lcd.autoscroll()
+        self.position = 0
+
+    def step(self):
+        """Scroll one cell left with a single character write."""
+        cell = self.position % self.LINE_LENGTH
+        if cell == 0 and self.position:
+            # the address counter ran off the end of the first line
+            self.lcd.setCursor(0, 0)
+        self._write(self.stream[(self.position + self.LINE_LENGTH) % len(self.stream)])
+        self.position += 1
+
+    def advance(self, position):
+        """Step until `position` steps have been taken."""
+        while self.position < position:
+            self.step()
+
+    def pass_steps(self):
+        """Steps for the whole text to scroll past the top left."""
+        return len(self.stream)
+
+    def stop(self):
+        """Leave autoscroll and undo the shift; DDRAM still holds marquee text."""
+        self.lcd.noAutoscroll()
+        self.lcd.home()
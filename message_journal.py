@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""Rotating journal of the messages shown on the jumper.
+
+Lines keep the format of the old `messages` file
+(`YYYY-MM-DD HH:MM:SS - message`) but go through one open, buffered file
+instead of an open/append/close per message. The active segment is rotated
+once it reaches `max_bytes` or is older than `rotate_seconds`; rotated
+segments are named after their first message (`messages.20251224-183000`),
+optionally gzipped, and only the newest `keep` are kept.
+
+Every segment has a sidecar index (`<segment>.idx`) with the time, byte
+offset and sequence number of every `index_every`-th message, so the last N
+messages, or the messages since a date, are found by seeking instead of
+reading the whole journal.
+
+    python3 message_journal.py --last 20
+    python3 message_journal.py --since '2025-12-24 18:00'
+"""
+import argparse
+import bisect
+import collections
+import glob
+import gzip
+import os
+import shutil
+import struct
+import threading
+import time
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+SEPARATOR = ' - '
+
+# time of the message (epoch seconds), byte offset of its line, its number in the segment
+INDEX_RECORD = struct.Struct('<dQI')
+
+
+def format_line(when, text):
+    # one message per line: newlines in a message would split it on reload
+    text = ' '.join(str(text).splitlines())
+    return '%s%s%s\n' % (time.strftime(TIME_FORMAT, time.localtime(when)), SEPARATOR, text)
+
+
+def parse_line(line):
+    """(epoch seconds, text) for a journal line, or None if it is not one."""
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', 'replace')
+    stamp, sep, text = line.rstrip('\n').partition(SEPARATOR)
+    if not sep:
+        return None
+    try:
+        return time.mktime(time.strptime(stamp, TIME_FORMAT)), text
+    except ValueError:
+        return None
+
+
+def index_path(segment):
+    if segment.endswith('.gz'):
+        segment = segment[:-3]
+    return segment + '.idx'
+
+
+def read_index(segment):
+    """[(time, offset, sequence)] for a segment; [] if it has no index."""
+    try:
+        with open(index_path(segment), 'rb') as fh:
+            data = fh.read()
+    except OSError:
+        return []
+    # a record torn by a crash is dropped
+    usable = len(data) - len(data) % INDEX_RECORD.size
+    return [INDEX_RECORD.unpack_from(data, offset) for offset in range(0, usable, INDEX_RECORD.size)]
+
+
+def open_segment(segment):
+    if segment.endswith('.gz'):
+        return gzip.open(segment, 'rb')
+    return open(segment, 'rb')
+
+
+class MessageJournal(object):
+
+    def __init__(self, path, max_bytes=1 << 20, rotate_seconds=86400, keep=14, compress=True,
+                 index_every=32, flush_seconds=5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.keep = keep
+        self.compress = compress
+        self.index_every = index_every
+        self.flush_seconds = flush_seconds
+        self.lock = threading.RLock()
+        self.fh = None
+        self.index_fh = None
+        self.size = 0
+        self.count = 0          # messages in the active segment
+        self.started = None     # time of the active segment's first message
+        self.last_flush = time.monotonic()
+        self.dirty = False
+        self.flush_timer = None  # flushes a write that no later append flushes
+        self.rotations = 0
+
+    # -- writing
+
+    def _open(self):
+        if self.fh is not None:
+            return
+        index = read_index(self.path)
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        # drop index entries for data a crash kept from reaching the disk
+        index = [entry for entry in index if entry[1] < size]
+        if size and not index:
+            # a journal from before the index (or an index lost with a crash)
+            index = self._build_index(self.path)
+            with open(index_path(self.path), 'wb') as fh:
+                fh.write(b''.join(INDEX_RECORD.pack(*entry) for entry in index))
+        self.size = size
+        self.started = index[0][0] if index else None
+        self.count = 0
+        if index:
+            # count the lines after the last indexed one
+            self.count = index[-1][2]
+            with open(self.path, 'rb') as fh:
+                fh.seek(index[-1][1])
+                self.count += sum(1 for line in fh if parse_line(line) is not None)
+        self.fh = open(self.path, 'ab', buffering=64 * 1024)
+        self.index_fh = open(index_path(self.path), 'ab')
+
+    def _build_index(self, segment):
+        index = []
+        offset = 0
+        count = 0
+        with open_segment(segment) as fh:
+            for line in fh:
+                parsed = parse_line(line)
+                if parsed is not None:
+                    if count % self.index_every == 0:
+                        index.append((parsed[0], offset, count))
+                    count += 1
+                offset += len(line)
+        return index
+
+    def append(self, text, when=None):
+        """Add a message; it reaches the disk within `flush_seconds` (or on flush())."""
+        when = time.time() if when is None else when
+        data = format_line(when, text).encode('utf-8')
+        with self.lock:
+            self._open()
+            if self.started is not None and (self.size + len(data) > self.max_bytes or
+                                             when - self.started >= self.rotate_seconds):
+                self._rotate()
+                self._open()
+            if self.count % self.index_every == 0:
+                self.index_fh.write(INDEX_RECORD.pack(when, self.size, self.count))
+            if self.started is None:
+                self.started = when
+            self.fh.write(data)
+            self.size += len(data)
+            self.count += 1
+            self.dirty = True
+            if time.monotonic() - self.last_flush >= self.flush_seconds:
+                self.flush()
+            elif self.flush_timer is None:
+                self.flush_timer = threading.Timer(self.flush_seconds, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            if self.fh is not None and self.dirty:
+                # data before index, so the index never points past the data
+                self.fh.flush()
+                os.fsync(self.fh.fileno())
+                self.index_fh.flush()
+            self.dirty = False
+            self.last_flush = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if self.fh is None:
+                return
+            self.flush()
+            self.fh.close()
+            self.index_fh.close()
+            self.fh = self.index_fh = None
+
+    def _rotate(self):
+        self.close()
+        name = '%s.%s' % (self.path, time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started)))
+        target = name
+        n = 1
+        while os.path.exists(target) or os.path.exists(target + '.gz'):
+            target = '%s-%d' % (name, n)
+            n += 1
+        os.replace(index_path(self.path), index_path(target))
+        os.replace(self.path, target)
+        if self.compress:
+            with open(target, 'rb') as src, gzip.open(target + '.gz.tmp', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(target + '.gz.tmp', target + '.gz')
+            os.remove(target)
+        self.rotations += 1
+        self.started = None
+        rotated = self.segments()
+        for segment in rotated[:max(0, len(rotated) - self.keep)]:
+            for name in (segment, index_path(segment)):
+                try:
+                    os.remove(name)
+                except OSError:
+                    pass
+
+    # -- reading
+
+    def segments(self):
+        """Segment files, oldest first; the active one last."""
+        rotated = [name for name in glob.glob(glob.escape(self.path) + '.*')
+                   if not name.endswith(('.idx', '.tmp'))]
+        rotated.sort(key=lambda name: os.path.basename(name).replace('.gz', ''))
+        if os.path.exists(self.path):
+            rotated.append(self.path)
+        return rotated
+
+    def _read(self, segment, offset=0):
+        """(time, text) for the messages in a segment from byte `offset` on."""
+        try:
+            with open_segment(segment) as fh:
+                fh.seek(offset)
+                for line in fh:
+                    parsed = parse_line(line)
+                    if parsed is not None:
+                        yield parsed
+        except (OSError, EOFError):
+            return      # removed by a rotation, or a gzip cut short
+
+    def since(self, when):
+        """Messages at or after `when` (epoch seconds), oldest first."""
+        self.flush()
+        segments = self.segments()
+        for i, segment in enumerate(segments):
+            if i + 1 < len(segments):
+                following = read_index(segments[i + 1])
+                if following and following[0][0] < when:
+                    continue    # everything here is older
+            index = read_index(segment)
+            position = bisect.bisect_left([entry[0] for entry in index], when)
+            offset = index[position - 1][1] if position else 0
+            for stamp, text in self._read(segment, offset):
+                if stamp >= when:
+                    yield stamp, text
+
+    def last(self, n):
+        """The newest `n` messages, oldest first."""
+        self.flush()
+        out = []
+        for segment in reversed(self.segments()):
+            wanted = n - len(out)
+            if wanted <= 0:
+                break
+            index = read_index(segment)
+            # start at the last index entry that still leaves `wanted` messages
+            # (the index lags the lines after its last entry, so count them)
+            tail = list(self._read(segment, index[-1][1])) if index else []
+            total = index[-1][2] + len(tail) if index else 0
+            start = max(0, total - wanted)
+            position = bisect.bisect_right([entry[2] for entry in index], start) - 1
+            if index and position == len(index) - 1:
+                messages = tail[-wanted:]
+            else:
+                offset = index[position][1] if position >= 0 else 0
+                messages = collections.deque(self._read(segment, offset), maxlen=wanted)
+            out[:0] = messages
+        return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('journal', nargs='?',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'messages'))
+    parser.add_argument('--last', type=int, metavar='N', help='show the newest N messages')
+    parser.add_argument('--since', metavar='DATE', help="show messages from 'YYYY-MM-DD[ HH:MM[:SS]]' on")
+    args = parser.parse_args(argv)
+    journal = MessageJournal(args.journal)
+    if args.since:
+        for fmt in (TIME_FORMAT, '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+            try:
+                start = time.mktime(time.strptime(args.since, fmt))
+                break
+            except ValueError:
+                continue
+        else:
+            parser.error('cannot parse --since %r' % args.since)
+        messages = journal.since(start)
+    else:
+        messages = journal.last(args.last or 20)
+    for stamp, text in messages:
+        print(format_line(stamp, text), end='')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Message parsing and layout for the 20x4 LCD.
+
+A message body is parsed once, when it is received, into a
+`DisplayMessage` (plain text, JSON with a 'message' key, or an SNS envelope
+around either). `LayoutEngine` then word-wraps the text into pages of
+`rows` lines of exactly `cols` characters, so a long message is paged
+instead of squashed into the last line. Layouts are kept in an LRU keyed
+by text, so a message shown again (a replay, a repeated greeting) is not
+wrapped again.
+"""
+import collections
+import json
+import threading
+
+from lcd_glyphs import normalise
+
+
+class DisplayMessage(object):
+    """The text to show for a message body, with its whitespace normalised."""
+
+    __slots__ = ('text', 'kind')
+
+    def __init__(self, text, kind='text'):
+        # a JSON null ({"message": null}) is an empty message, not "None"
+        self.text = ' '.join(str(text).split()) if text is not None else ''
+        self.kind = kind    # 'text', 'json' or 'sns'
+
+    @classmethod
+    def from_body(cls, body):
+        """Parse an SQS message body: plain text, JSON with a 'message' key, or
+        an SNS envelope whose 'Message' is itself either of those."""
+        try:
+            parsed = json.loads(body)
+        except Exception:
+            return cls(body)
+        if not isinstance(parsed, dict):
+            return cls(parsed, 'json')
+        if isinstance(parsed.get('Message'), str):
+            try:
+                inner = json.loads(parsed['Message'])
+                if isinstance(inner, dict) and 'message' in inner:
+                    return cls(inner['message'], 'sns')
+            except Exception:
+                pass
+            return cls(parsed['Message'], 'sns')
+        if 'message' in parsed:
+            return cls(parsed['message'], 'json')
+        # no known field: show the JSON itself
+        return cls(json.dumps(parsed), 'json')
+
+
+def wrap(text, width):
+    """Greedy word wrap into lines of at most `width` characters; words longer
+    than a line are split. `text` must already be whitespace-normalised."""
+    lines = []
+    line = ''
+    for word in text.split(' '):
+        if not word:
+            continue
+        if line and len(line) + 1 + len(word) <= width:
+            line += ' ' + word
+            continue
+        if line:
+            if len(word) > width and len(line) + 1 < width:
+                # a word too long for any line starts in the space left on this one
+                room = width - len(line) - 1
+                line += ' ' + word[:room]
+                word = word[room:]
+            lines.append(line)
+        while len(word) > width:
+            lines.append(word[:width])
+            word = word[width:]
+        line = word
+    if line:
+        lines.append(line)
+    return lines
+
+
+class Layout(object):
+    """A message laid out as pages of `rows` padded lines."""
+
+    __slots__ = ('pages', 'truncated')
+
+    def __init__(self, pages, truncated=False):
+        self.pages = pages          # tuple of tuples of strings
+        self.truncated = truncated  # text ran past max_pages
+
+
+class LayoutEngine(object):
+
+    ELLIPSIS = '...'
+
+    def __init__(self, cols=20, rows=4, max_pages=12, cache_size=256):
+        self.cols = cols
+        self.rows = rows
+        self.max_pages = max_pages
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        # the display and replay code lay out from the event loop, benchmarks and
+        # tools from other threads
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def layout(self, text):
+        """The Layout for `text` (a str or DisplayMessage), from the cache when possible."""
+        if isinstance(text, DisplayMessage):
+            text = text.text
+        text = '' if text is None else text
+        with self.lock:
+            layout = self.cache.get(text)
+            if layout is not None:
+                self.cache.move_to_end(text)
+                self.hits += 1
+                return layout
+            self.misses += 1
+        layout = self._layout(normalise(' '.join(str(text).split())))
+        with self.lock:
+            self.cache[text] = layout
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return layout
+
+    def _layout(self, text):
+        lines = wrap(text, self.cols)
+        capacity = self.rows * self.max_pages
+        truncated = len(lines) > capacity
+        if truncated:
+            lines = lines[:capacity]
+            last = lines[-1][:self.cols - len(self.ELLIPSIS)]
+            lines[-1] = last + self.ELLIPSIS
+        if not lines:
+            lines = ['']
+        pages = []
+        for start in range(0, len(lines), self.rows):
+            page = [line.ljust(self.cols) for line in lines[start:start + self.rows]]
+            page += [' ' * self.cols] * (self.rows - len(page))
+            pages.append(tuple(page))
+        return Layout(tuple(pages), truncated)
@@ -0,0 +1,167 @@
+"""Per-message latency tracing from SQS to the LCD.
+
+Each message carries a `MessageTrace` with the wall-clock time of every
+stage it passes (SQS SentTimestamp, received, parsed, taken by the display,
+formatted, first byte on the LCD, NeoPixels started, queued for delete,
+deleted). When the message is finished with, `LatencyStats` adds the time
+between stages to fixed-bucket histograms, so percentiles stay cheap and
+the memory bounded however many messages go through, and the buckets can
+be saved and reloaded with the rest of the stats.
+"""
+import bisect
+import math
+import threading
+import time
+
+# (histogram, stage, measured from): time spent in each step
+STAGES = [
+    ('sqs', 'received', 'sent'),            # on the queue, including client clock skew
+    ('parse', 'parsed', 'received'),
+    ('buffer', 'dequeued', 'parsed'),        # waiting behind the messages on screen
+    ('format', 'formatted', 'dequeued'),
+    ('lcd', 'lcd', 'formatted'),
+    ('neopixels', 'neopixels', 'lcd'),
+    ('delete', 'deleted', 'acked'),
+    ('end_to_end', 'lcd', 'sent'),           # submitted to on screen
+]
+
+
+class MessageTrace(object):
+
+    def __init__(self, sent=None, receive_count=1):
+        self.times = {}
+        if sent is not None:
+            self.times['sent'] = sent
+        self.receive_count = receive_count
+
+    @classmethod
+    def from_sqs(cls, raw):
+        """Trace for a received SQS message (uses SentTimestamp/ApproximateReceiveCount)."""
+        attributes = raw.get('Attributes') or {}
+        sent = None
+        try:
+            sent = int(attributes['SentTimestamp']) / 1000.0
+        except (KeyError, ValueError):
+            pass
+        try:
+            count = int(attributes.get('ApproximateReceiveCount', 1))
+        except ValueError:
+            count = 1
+        return cls(sent, count)
+
+    def mark(self, stage, when=None):
+        """Record the time a stage was reached (the first time only)."""
+        if stage not in self.times:
+            self.times[stage] = time.time() if when is None else when
+
+    def durations(self):
+        """{histogram name: seconds} for the stages this message has reached."""
+        out = {}
+        for name, stage, since in STAGES:
+            if stage in self.times and since in self.times:
+                out[name] = max(0.0, self.times[stage] - self.times[since])
+        return out
+
+
+class Histogram(object):
+    """Log-scale buckets from 1 ms to about 15 days (each ~19% wider than the
+    last), so messages that sat in SQS while the jumper was offline (up to
+    the 14-day retention limit) still land in a bucket."""
+
+    BOUNDS = [0.001 * 2 ** (i / 4.0) for i in range(122)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)   # the last bucket is overflow
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (None when empty)."""
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * p / 100.0)))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.BOUNDS[i], self.max) if i < len(self.BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        def rounded(seconds):
+            return None if seconds is None else round(seconds, 4)
+        return {
+            'count': self.count,
+            'mean': rounded(self.sum / self.count if self.count else None),
+            'p50': rounded(self.percentile(50)),
+            'p95': rounded(self.percentile(95)),
+            'p99': rounded(self.percentile(99)),
+            'max': rounded(self.max),
+        }
+
+    def cumulative(self, step=4):
+        """[(upper bound, count at or below it)] for every `step`-th bucket
+        (the default gives powers of two: 1 ms, 2 ms, 4 ms, ...)."""
+        out = []
+        seen = 0
+        for i, bound in enumerate(self.BOUNDS):
+            seen += self.counts[i]
+            if i % step == 0:
+                out.append((bound, seen))
+        return out
+
+    def to_dict(self):
+        # sparse: most buckets are empty
+        return {'buckets': {str(i): n for i, n in enumerate(self.counts) if n},
+                'count': self.count, 'sum': self.sum, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls()
+        for i, n in (data.get('buckets') or {}).items():
+            if 0 <= int(i) < len(hist.counts):
+                hist.counts[int(i)] = int(n)
+        hist.count = int(data.get('count', sum(hist.counts)))
+        hist.sum = float(data.get('sum', 0.0))
+        hist.max = float(data.get('max', 0.0))
+        return hist
+
+
+class LatencyStats(object):
+    """Histograms for every stage in STAGES, fed with finished traces."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: Histogram() for name, stage, since in STAGES}
+        self.redelivered = 0    # messages SQS had handed out before
+
+    def record(self, trace):
+        with self.lock:
+            for name, seconds in trace.durations().items():
+                self.histograms[name].record(seconds)
+            if trace.receive_count > 1:
+                self.redelivered += 1
+
+    def summary(self):
+        """{stage: {count, mean, p50, p95, p99, max}} in seconds."""
+        with self.lock:
+            return {name: hist.summary() for name, hist in self.histograms.items()}
+
+    def to_dict(self):
+        with self.lock:
+            return {'histograms': {name: hist.to_dict() for name, hist in self.histograms.items()},
+                    'redelivered': self.redelivered}
+
+    def load(self, data):
+        with self.lock:
+            for name, hist in (data.get('histograms') or {}).items():
+                if name in self.histograms:
+                    self.histograms[name] = Histogram.from_dict(hist)
+            self.redelivered = int(data.get('redelivered', 0))
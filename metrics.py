@@ -0,0 +1,109 @@
+"""Prometheus text-format metrics over HTTP.
+
+A small threaded HTTP server answers GET /metrics by calling a collect
+function that fills a `MetricsWriter`, so values are read at scrape time and
+nothing is kept or computed between scrapes.
+
+    def collect(out):
+        out.counter('xmas_messages_displayed_total', 'Messages shown', shown)
+    server = MetricsServer(collect, port=9101)
+    server.start()
+"""
+import http.server
+import logging
+import math
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, _escape(v)) for k, v in sorted(labels.items()))
+
+
+def _number(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class MetricsWriter(object):
+    """Collects metric families and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self.families = {}      # name -> (type, help, [lines]), in first-seen order
+
+    def _family(self, name, kind, help_text):
+        if name not in self.families:
+            self.families[name] = (kind, help_text, [])
+        return self.families[name][2]
+
+    def counter(self, name, help_text, value, labels=None):
+        self._family(name, 'counter', help_text).append('%s%s %s' % (name, _labels(labels), _number(value)))
+
+    def gauge(self, name, help_text, value, labels=None):
+        self._family(name, 'gauge', help_text).append('%s%s %s' % (name, _labels(labels), _number(value)))
+
+    def histogram(self, name, help_text, buckets, total, count, labels=None):
+        """`buckets` is [(upper bound, cumulative count)], without +Inf."""
+        lines = self._family(name, 'histogram', help_text)
+        labels = dict(labels or {})
+        for bound, cumulative in buckets:
+            lines.append('%s_bucket%s %d' % (name, _labels(dict(labels, le='%g' % bound)), cumulative))
+        lines.append('%s_bucket%s %d' % (name, _labels(dict(labels, le='+Inf')), count))
+        lines.append('%s_sum%s %s' % (name, _labels(labels), _number(float(total))))
+        lines.append('%s_count%s %d' % (name, _labels(labels), count))
+
+    def render(self):
+        out = []
+        for name, (kind, help_text, lines) in self.families.items():
+            out.append('# HELP %s %s' % (name, help_text.replace('\\', '\\\\').replace('\n', '\\n')))
+            out.append('# TYPE %s %s' % (name, kind))
+            out.extend(lines)
+        return '\n'.join(out) + '\n'
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        out = MetricsWriter()
+        try:
+            self.server.collect(out)
+            body = out.render().encode('utf-8')
+        except Exception:
+            logging.exception('Failed to collect metrics')
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # scrapes every few seconds would flood the log
+        pass
+
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, collect, address='0.0.0.0', port=9101):
+        http.server.ThreadingHTTPServer.__init__(self, (address, port), MetricsHandler)
+        self.collect = collect
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='metrics', daemon=True)
+        thread.start()
+        return thread
@@ -1,79 +1,186 @@
 # SPDX-FileCopyrightText: 2021 ladyada for Adafruit Industries
 # SPDX-License-Identifier: MIT
 
-# Simple test for NeoPixels on Raspberry Pi
-import time
+# NeoPixel effects server for the jumper.
+#
+# Started once as root (the strip driver needs it) and then controlled over a
+# Unix socket by cslm-christmas.py through neopixel_client.py, so switching
+# effect takes milliseconds instead of a new interpreter and library import.
+#
+#   sudo python3 neopixel1.py            # run the effects server
+#   sudo python3 neopixel1.py demo       # play one effect without a server
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
 import board
 import neopixel
+from neopixel_write import neopixel_write
+
+from neopixel_client import NEOPIXEL_SOCKET
+from neopixel_effects import (AnimationScheduler, Chase, Fade, Fill, FrameEngine,
+                              Off, Rainbow, Sequence, Twinkle)
 
 # Choose an open pin connected to the Data In of the NeoPixel strip, i.e. board.D18
 # NeoPixels must be connected to D10, D12, D18 or D21 to work.
 pixel_pin = board.D18
 
 # The number of NeoPixels
-num_pixels = 30
+num_pixels = int(os.environ.get('XMAS_NUM_PIXELS', '30'))
 
 # The order of the pixel colors - RGB or GRB. Some NeoPixels have red and green reversed!
 # For RGBW NeoPixels, simply change the ORDER to RGBW or GRBW.
 ORDER = neopixel.GRB
 
+# Only used to claim and configure the data pin: frames are built as whole
+# buffers by the FrameEngine (gamma and brightness already applied) and sent
+# with a single neopixel_write per frame.
 pixels = neopixel.NeoPixel(
-    pixel_pin, num_pixels, brightness=0.01, auto_write=False, pixel_order=ORDER
+    pixel_pin, num_pixels, brightness=1.0, auto_write=False, pixel_order=ORDER
 )
+engine = FrameEngine(num_pixels, order=ORDER, brightness=0.01)
+
+# Colours used by the fill and demo effects; replaced by the 'palette' command
+palette = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+
+# Target frame rate and the blend time when switching effect
+FPS = int(os.environ.get('XMAS_NEOPIXEL_FPS', '60'))
+CROSSFADE_SECONDS = 0.5
+
+
+def show(frame):
+    neopixel_write(pixels.pin, frame)
+
+
+# Effects are built from the current palette each time they are played
+EFFECTS = {
+    # the original demo: one second of each palette colour, then a rainbow
+    'demo': lambda colours: Sequence([(Fill(rgb), 1) for rgb in colours] + [(Rainbow(), 2)]),
+    'rainbow': lambda colours: Rainbow(),
+    'fill': lambda colours: Fill(colours[0]),
+    'chase': lambda colours: Chase(colours),
+    'twinkle': lambda colours: Twinkle(colours[0]),
+    'fade': lambda colours: Fade(colours[0]),
+    'off': lambda colours: Off(),
+}
+
+
+class EffectPlayer(threading.Thread):
+    """Runs the animation scheduler; commands take effect at the next frame."""
+
+    def __init__(self):
+        threading.Thread.__init__(self, daemon=True)
+        self.lock = threading.Lock()
+        self.scheduler = AnimationScheduler(engine, show, fps=FPS)
+        self.effect = 'off'
+        self.brightness = engine.brightness
+        self.palette = list(palette)
+
+    def play(self, name, crossfade=CROSSFADE_SECONDS):
+        if name not in EFFECTS:
+            raise ValueError('unknown effect: %s' % name)
+        with self.lock:
+            self.effect = name
+            effect = EFFECTS[name](self.palette)
+        self.scheduler.play(effect, crossfade)
+
+    def set_brightness(self, value):
+        with self.lock:
+            self.brightness = min(1.0, max(0.0, float(value)))
+        self.scheduler.set_brightness(self.brightness)
+
+    def set_palette(self, colours):
+        colours = [tuple(int(c) & 0xFF for c in rgb[:3]) for rgb in colours]
+        if not colours:
+            raise ValueError('palette needs at least one colour')
+        with self.lock:
+            self.palette = colours
+            name = self.effect
+        # replay the current effect in the new colours
+        self.play(name)
+
+    def run(self):
+        self.scheduler.run()
+
+
+def handle_command(player, request):
+    cmd = request.get('cmd')
+    if cmd == 'ping':
+        return {'ok': True}
+    if cmd == 'play':
+        player.play(request.get('effect', 'demo'), float(request.get('crossfade', CROSSFADE_SECONDS)))
+    elif cmd == 'stop':
+        player.play('off', float(request.get('crossfade', CROSSFADE_SECONDS)))
+    elif cmd == 'brightness':
+        player.set_brightness(request['value'])
+    elif cmd == 'palette':
+        player.set_palette(request['colours'])
+    elif cmd != 'status':
+        raise ValueError('unknown command: %s' % cmd)
+    with player.lock:
+        return {'ok': True, 'effect': player.effect, 'brightness': player.brightness,
+                'palette': [list(c) for c in player.palette], 'frames': player.scheduler.stats()}
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = handle_command(self.server.player, json.loads(line.decode('utf-8')))
+            except Exception as e:
+                reply = {'ok': False, 'error': str(e)}
+            self.wfile.write((json.dumps(reply) + '\n').encode('utf-8'))
+
+
+class EffectServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path=NEOPIXEL_SOCKET):
+    player = EffectPlayer()
+    player.start()
+    directory = os.path.dirname(path) or '.'
+    if not os.path.isdir(directory):
+        # started by hand or through sudo rather than by systemd's
+        # RuntimeDirectory=: give the directory to the caller's group
+        os.makedirs(directory, mode=0o750)
+        os.chown(directory, -1, int(os.environ.get('SUDO_GID', os.getgid())))
+    if os.path.exists(path):
+        os.unlink(path)  # stale socket from a previous run
+    server = EffectServer(path, CommandHandler)
+    server.player = player
+    # the LCD script runs unprivileged: its group may connect, nobody else
+    os.chown(path, -1, os.stat(directory).st_gid)
+    os.chmod(path, 0o660)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
 
+def destroy():
+    show(engine.blank())
 
-def wheel(pos):
-    # Input a value 0 to 255 to get a color value.
-    # The colours are a transition r - g - b - back to r.
-    if pos < 0 or pos > 255:
-        r = g = b = 0
-    elif pos < 85:
-        r = int(pos * 3)
-        g = int(255 - pos * 3)
-        b = 0
-    elif pos < 170:
-        pos -= 85
-        r = int(255 - pos * 3)
-        g = 0
-        b = int(pos * 3)
-    else:
-        pos -= 170
-        r = 0
-        g = int(pos * 3)
-        b = int(255 - pos * 3)
-    return (r, g, b) if ORDER in {neopixel.RGB, neopixel.GRB} else (r, g, b, 0)
-
-
-def rainbow_cycle(wait):
-    for j in range(255):
-        for i in range(num_pixels):
-            pixel_index = (i * 256 // num_pixels) + j
-            pixels[i] = wheel(pixel_index & 255)
-        pixels.show()
-        time.sleep(wait)
-
-
-while True:
-    # Comment this line out if you have RGBW/GRBW NeoPixels
-    pixels.fill((255, 0, 0))
-    # Uncomment this line if you have RGBW/GRBW NeoPixels
-    # pixels.fill((255, 0, 0, 0))
-    pixels.show()
-    time.sleep(1)
-
-    # Comment this line out if you have RGBW/GRBW NeoPixels
-    pixels.fill((0, 255, 0))
-    # Uncomment this line if you have RGBW/GRBW NeoPixels
-    # pixels.fill((0, 255, 0, 0))
-    pixels.show()
-    time.sleep(1)
-
-    # Comment this line out if you have RGBW/GRBW NeoPixels
-    pixels.fill((0, 0, 255))
-    # Uncomment this line if you have RGBW/GRBW NeoPixels
-    # pixels.fill((0, 0, 255, 0))
-    pixels.show()
-    time.sleep(1)
-
-    rainbow_cycle(0.001)  # rainbow cycle with 1ms delay per step
 
+if __name__ == '__main__':
+    # turn SIGTERM (systemd stop, client kill) into a clean shutdown
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        if len(sys.argv) > 1 and sys.argv[1] in EFFECTS:
+            # play one effect in the foreground, e.g. `neopixel1.py demo`
+            scheduler = AnimationScheduler(engine, show, fps=FPS)
+            scheduler.play(EFFECTS[sys.argv[1]](palette))
+            scheduler.run()
+        else:
+            serve(sys.argv[1] if len(sys.argv) > 1 else NEOPIXEL_SOCKET)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        destroy()
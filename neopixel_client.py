@@ -0,0 +1,65 @@
+"""Client for the NeoPixel effects server in `neopixel1.py`.
+
+The server runs once as root and listens on a Unix socket; each request is
+one line of JSON and gets one line of JSON back, e.g.
+
+    {"cmd": "play", "effect": "rainbow"}  ->  {"ok": true}
+"""
+import json
+import os
+import socket
+
+# Socket the effects server listens on (override with XMAS_NEOPIXEL_SOCKET).
+# Its directory is only open to the group of the user running the LCD script.
+NEOPIXEL_SOCKET = os.environ.get('XMAS_NEOPIXEL_SOCKET', '/run/xmasjumper/neopixel.sock')
+
+
+class NeoPixelClient(object):
+
+    def __init__(self, path=NEOPIXEL_SOCKET, timeout=0.5):
+        self.path = path
+        self.timeout = timeout
+
+    def send(self, cmd, **params):
+        """Send one command and return the server's reply dict.
+        Raises OSError if the server is unreachable and RuntimeError if it
+        rejected the command."""
+        request = dict(params, cmd=cmd)
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(self.timeout)
+        try:
+            s.connect(self.path)
+            s.sendall((json.dumps(request) + '\n').encode('utf-8'))
+            with s.makefile('rb') as fh:
+                line = fh.readline()
+        finally:
+            s.close()
+        if not line:
+            raise OSError('NeoPixel server closed the connection')
+        reply = json.loads(line.decode('utf-8'))
+        if not reply.get('ok'):
+            raise RuntimeError(reply.get('error', 'NeoPixel command failed'))
+        return reply
+
+    def ping(self):
+        """Return True if the server is up and answering."""
+        try:
+            self.send('ping')
+            return True
+        except (OSError, ValueError, RuntimeError):
+            return False
+
+    def play(self, effect, **params):
+        return self.send('play', effect=effect, **params)
+
+    def stop(self):
+        return self.send('stop')
+
+    def set_brightness(self, value):
+        return self.send('brightness', value=value)
+
+    def set_palette(self, colours):
+        return self.send('palette', colours=[list(c) for c in colours])
+
+    def status(self):
+        return self.send('status')
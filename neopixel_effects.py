@@ -0,0 +1,369 @@
+"""Frame generation for the NeoPixel effects server.
+
+Frames are whole-strip byte buffers in the strip's wire order, ready for a
+single `neopixel_write`. Colour wheel values are looked up in a 256-entry
+table that already has gamma and brightness applied, and each frame is built
+with one NumPy gather when NumPy is installed (or a cached join otherwise),
+instead of a Python call per pixel.
+
+Effects are small objects whose `render(engine, t)` returns the frame for
+`t` seconds into the effect, so they can be combined (sequences, crossfades)
+and driven by `AnimationScheduler` at a fixed frame rate: a slow frame makes
+the next one skip ahead in time rather than slowing the animation down.
+
+Nothing here touches hardware, so it can be imported and timed anywhere.
+"""
+import math
+import random
+import threading
+import time
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Perceptual correction applied with brightness when building colours
+GAMMA = 2.2
+
+
+def wheel_rgb(pos):
+    # Input a value 0 to 255 to get a color value.
+    # The colours are a transition r - g - b - back to r.
+    if pos < 85:
+        return (pos * 3, 255 - pos * 3, 0)
+    if pos < 170:
+        pos -= 85
+        return (255 - pos * 3, 0, pos * 3)
+    pos -= 170
+    return (0, pos * 3, 255 - pos * 3)
+
+
+def encode(rgb, order='GRB', brightness=1.0, gamma=GAMMA):
+    """Return the wire bytes for one (r, g, b) colour."""
+    r, g, b = rgb[:3]
+    levels = {'R': r, 'G': g, 'B': b, 'W': 0}
+    out = bytearray()
+    for channel in order:
+        value = levels[channel] / 255.0
+        out.append(int(round(255 * (value ** gamma) * brightness)))
+    return bytes(out)
+
+
+def build_wheel_lut(order='GRB', brightness=1.0, gamma=GAMMA):
+    """Return the 256 wheel colours as one bytearray of len(order) bytes each."""
+    lut = bytearray()
+    for pos in range(256):
+        lut += encode(wheel_rgb(pos), order, brightness, gamma)
+    return lut
+
+
+class FrameEngine(object):
+    """Builds whole-strip frames for a strip of `num_pixels` LEDs."""
+
+    def __init__(self, num_pixels, order='GRB', brightness=1.0, gamma=GAMMA):
+        self.num_pixels = num_pixels
+        self.order = order
+        self.bpp = len(order)
+        self.gamma = gamma
+        # wheel position of each pixel in rainbow frame 0
+        self.rainbow_base = [(i * 256 // num_pixels) & 255 for i in range(num_pixels)]
+        self.set_brightness(brightness)
+
+    def set_brightness(self, brightness):
+        self.brightness = brightness
+        self.lut = build_wheel_lut(self.order, brightness, self.gamma)
+        if numpy is not None:
+            self.lut_array = numpy.frombuffer(bytes(self.lut), dtype=numpy.uint8).reshape(256, self.bpp)
+            self.base_array = numpy.array(self.rainbow_base, dtype=numpy.uint8)
+        else:
+            self.lut_entries = [bytes(self.lut[i * self.bpp:(i + 1) * self.bpp]) for i in range(256)]
+        self.rainbow_cache = {}
+
+    def encode(self, rgb):
+        return encode(rgb, self.order, self.brightness, self.gamma)
+
+    def blank(self):
+        return bytes(self.num_pixels * self.bpp)
+
+    def fill(self, rgb):
+        return self.encode(rgb) * self.num_pixels
+
+    def rainbow(self, step):
+        """Frame `step` (0-255) of the rainbow cycle."""
+        step &= 255
+        frame = self.rainbow_cache.get(step)
+        if frame is None:
+            if numpy is not None:
+                # uint8 addition wraps, which is the & 255 of the wheel position
+                frame = self.lut_array[self.base_array + numpy.uint8(step)].tobytes()
+            else:
+                entries = self.lut_entries
+                frame = b''.join([entries[(base + step) & 255] for base in self.rainbow_base])
+            self.rainbow_cache[step] = frame
+        return frame
+
+    def scaled_fill(self, rgb, level):
+        """Fill with `rgb` dimmed to `level` (0.0-1.0) before gamma."""
+        return self.fill([c * level for c in rgb[:3]])
+
+
+def blend(a, b, alpha):
+    """Mix two frames: alpha 0.0 gives `a`, 1.0 gives `b`."""
+    if alpha <= 0:
+        return a
+    if alpha >= 1:
+        return b
+    w = int(alpha * 256)
+    if numpy is not None:
+        fa = numpy.frombuffer(a, dtype=numpy.uint8).astype(numpy.uint16)
+        fb = numpy.frombuffer(b, dtype=numpy.uint8).astype(numpy.uint16)
+        return ((fa * (256 - w) + fb * w) >> 8).astype(numpy.uint8).tobytes()
+    return bytes([(x * (256 - w) + y * w) >> 8 for x, y in zip(a, b)])
+
+
+class Effect(object):
+    """Base for effects; on its own it shows nothing (all pixels off)."""
+    # Static effects look the same at any t, so they are drawn once and held.
+    static = False
+
+    def render(self, engine, t):
+        return engine.blank()
+
+
+class Fill(Effect):
+    static = True
+
+    def __init__(self, rgb):
+        self.rgb = tuple(rgb)
+
+    def render(self, engine, t):
+        return engine.fill(self.rgb)
+
+
+class Off(Fill):
+
+    def __init__(self):
+        Fill.__init__(self, (0, 0, 0))
+
+
+class Rainbow(Effect):
+    """The wheel across the strip, advancing `speed` wheel steps per second."""
+
+    def __init__(self, speed=128):
+        self.speed = speed
+
+    def render(self, engine, t):
+        return engine.rainbow(int(t * self.speed))
+
+
+class Chase(Effect):
+    """Blocks of `length` lit pixels, one per colour with equal gaps, moving
+    along the strip at `speed` pixels per second."""
+
+    def __init__(self, colours, length=4, speed=30):
+        self.colours = [tuple(c) for c in colours]
+        self.length = length
+        self.speed = speed
+        self.cache = None
+
+    def render(self, engine, t):
+        if self.cache is None or self.cache[0] is not engine.lut:
+            off = engine.encode((0, 0, 0))
+            pattern = b''
+            for rgb in self.colours:
+                pattern += engine.encode(rgb) * self.length + off * self.length
+            period = len(pattern) // engine.bpp
+            # long enough that any rotation is a plain slice
+            repeats = engine.num_pixels // period + 2
+            self.cache = (engine.lut, pattern * repeats, period)
+        lut, strip, period = self.cache
+        offset = (period - int(t * self.speed) % period) * engine.bpp
+        return strip[offset:offset + engine.num_pixels * engine.bpp]
+
+
+class Fade(Effect):
+    """Breathe a single colour in and out once every `period` seconds."""
+
+    def __init__(self, rgb, period=2.0):
+        self.rgb = tuple(rgb)
+        self.period = period
+
+    def render(self, engine, t):
+        level = (1 - math.cos(2 * math.pi * t / self.period)) / 2
+        return engine.scaled_fill(self.rgb, level)
+
+
+class Twinkle(Effect):
+    """Each pixel glows and fades at its own random rate and phase."""
+
+    LEVELS = 32
+
+    def __init__(self, rgb, rate=0.5, seed=None):
+        self.rgb = tuple(rgb)
+        self.rate = rate
+        self.seed = seed
+        self.cache = None
+
+    def render(self, engine, t):
+        if self.cache is None or self.cache[0] is not engine.lut:
+            rnd = random.Random(self.seed)
+            n = engine.num_pixels
+            rates = [self.rate * (0.5 + rnd.random()) for _ in range(n)]
+            phases = [rnd.random() for _ in range(n)]
+            levels = [engine.encode([c * i / (self.LEVELS - 1.0) for c in self.rgb])
+                      for i in range(self.LEVELS)]
+            if numpy is not None:
+                table = numpy.frombuffer(b''.join(levels), dtype=numpy.uint8).reshape(self.LEVELS, engine.bpp)
+                self.cache = (engine.lut, numpy.array(rates), numpy.array(phases), table)
+            else:
+                self.cache = (engine.lut, rates, phases, levels)
+        lut, rates, phases, table = self.cache
+        top = self.LEVELS - 1
+        if numpy is not None:
+            wave = numpy.sin(2 * numpy.pi * (rates * t + phases))
+            index = (numpy.clip(wave, 0, 1) ** 2 * top).astype(numpy.intp)
+            return table[index].tobytes()
+        out = []
+        for r, p in zip(rates, phases):
+            wave = max(0.0, math.sin(2 * math.pi * (r * t + p)))
+            out.append(table[int(wave * wave * top)])
+        return b''.join(out)
+
+
+class Crossfade(Effect):
+    """Blend from `a` (already `a_time` seconds in) to `b` over `duration` seconds."""
+
+    def __init__(self, a, b, duration, a_time=0.0):
+        self.a = a
+        self.b = b
+        self.duration = duration
+        self.a_time = a_time
+
+    def done(self, t):
+        return t >= self.duration
+
+    def render(self, engine, t):
+        alpha = t / self.duration if self.duration > 0 else 1.0
+        if alpha >= 1:
+            return self.b.render(engine, t)
+        return blend(self.a.render(engine, self.a_time + t), self.b.render(engine, t), alpha)
+
+
+class Sequence(Effect):
+    """Play `steps` [(effect, seconds), ...] in a loop, crossfading between them."""
+
+    def __init__(self, steps, crossfade=0.25):
+        self.steps = list(steps)
+        self.crossfade = crossfade
+        self.total = sum(seconds for effect, seconds in self.steps)
+
+    def render(self, engine, t):
+        t %= self.total
+        for i, (effect, seconds) in enumerate(self.steps):
+            if t < seconds:
+                break
+            t -= seconds
+        frame = effect.render(engine, t)
+        left = seconds - t
+        if self.crossfade > 0 and left < self.crossfade and len(self.steps) > 1:
+            following = self.steps[(i + 1) % len(self.steps)][0]
+            alpha = 1 - left / self.crossfade
+            frame = blend(frame, following.render(engine, 0.0), alpha)
+        return frame
+
+
+class AnimationScheduler(object):
+    """Shows `effect` frames at a fixed rate on a monotonic clock.
+
+    Frame n is due at start + n / fps. If drawing falls behind, the missed
+    slots are skipped (and counted as dropped) so animations keep their real
+    speed; frames shown more than half a frame after their slot count as late.
+    """
+
+    def __init__(self, engine, show, fps=60, clock=time.monotonic):
+        self.engine = engine
+        self.show = show
+        self.fps = fps
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+        self.running = False
+        self.effect = Off()
+        self.effect_start = clock()
+        self.pending = None
+        self.pending_brightness = None
+        self.frames = 0
+        self.dropped = 0
+        self.late = 0
+        self.measured_fps = 0.0
+
+    def play(self, effect, crossfade=0.0):
+        """Switch to `effect`, blending from the current one over `crossfade` seconds."""
+        with self.lock:
+            self.pending = (effect, crossfade)
+        self.changed.set()
+
+    def set_brightness(self, brightness):
+        with self.lock:
+            self.pending_brightness = brightness
+        self.changed.set()
+
+    def stats(self):
+        return {'target_fps': self.fps, 'fps': round(self.measured_fps, 1),
+                'frames': self.frames, 'dropped': self.dropped, 'late': self.late}
+
+    def stop(self):
+        self.running = False
+        self.changed.set()
+
+    def _apply_pending(self, now):
+        with self.lock:
+            pending, self.pending = self.pending, None
+            brightness, self.pending_brightness = self.pending_brightness, None
+        if brightness is not None and brightness != self.engine.brightness:
+            self.engine.set_brightness(brightness)
+        if pending is not None:
+            effect, crossfade = pending
+            if crossfade > 0:
+                effect = Crossfade(self.effect, effect, crossfade, now - self.effect_start)
+            self.effect = effect
+            self.effect_start = now
+
+    def run(self):
+        period = 1.0 / self.fps
+        self.running = True
+        start = self.clock()
+        frame_no = -1
+        last_shown = None
+        while self.running:
+            if self.changed.is_set():
+                # a command restarts the timeline so it shows up immediately
+                self.changed.clear()
+                self._apply_pending(self.clock())
+                start = self.clock()
+                frame_no = -1
+            now = self.clock()
+            due = max(int((now - start) / period), frame_no + 1)
+            if frame_no >= 0 and due > frame_no + 1:
+                self.dropped += due - frame_no - 1
+            slot = start + due * period
+            if now - slot > period / 2:
+                self.late += 1
+            effect = self.effect
+            t = slot - self.effect_start
+            if isinstance(effect, Crossfade) and effect.done(t):
+                # crossfade finished: carry on with the target, keeping its clock
+                self.effect = effect = effect.b
+            self.show(effect.render(self.engine, t))
+            self.frames += 1
+            frame_no = due
+            shown = self.clock()
+            if last_shown is not None and shown > last_shown:
+                self.measured_fps = 0.9 * self.measured_fps + 0.1 / (shown - last_shown)
+            last_shown = shown
+            if effect.static:
+                # nothing moves: sleep until the next command
+                self.changed.wait()
+                last_shown = None
+                continue
+            self.changed.wait(max(0.0, start + (frame_no + 1) * period - self.clock()))
@@ -1,28 +1,25 @@
 #!/usr/bin/bash
 
 # Configuration
-TARGET="8.8.8.8"          # IP to ping (Google DNS). Use your router IP for local check.
-TIMEOUT=15                # Time to wait in seconds
-FALLBACK_SCRIPT="/home/mark/xmasjumper/cslm-christmas.py" # Path to your fallback script
+JUMPER_DIR="/home/mark/xmasjumper"
+JUMPER_SCRIPT="$JUMPER_DIR/cslm-christmas.py"
 MODE="sqs"
+ROUTE_WAIT=15             # seconds to wait for a default route (Wi-Fi at boot)
 
-echo "Starting network check..."
-
-# Loop for the duration of TIMEOUT
-end_time=$((SECONDS + TIMEOUT))
-
-while [ $SECONDS -lt $end_time ]; do
-    if ping -c 1 -W 1 "$TARGET" &> /dev/null; then
-        echo "Network connection established."
-        /usr/bin/git -C /home/mark/xmasjumper pull >> /home/mark/xmasjumper/git_reboot.log 2>&1
-        /usr/bin/python3 $FALLBACK_SCRIPT $MODE
-        exit 0
-    fi
+# cslm-christmas.py watches the network itself (and replays logged messages
+# while it is down), so the network is only waited for to update the
+# checkout: give Wi-Fi up to ROUTE_WAIT seconds to come up, pull if there
+# is a default route by then, and hand over either way.
+end_time=$((SECONDS + ROUTE_WAIT))
+while [ -z "$(ip route show default 2> /dev/null)" ] && [ $SECONDS -lt $end_time ]; do
     sleep 1
 done
 
-# If we reach here, the timeout has passed with no connection
-echo "No network found after $TIMEOUT seconds. Starting fallback script..."
+if [ -n "$(ip route show default 2> /dev/null)" ]; then
+    echo "Updating $JUMPER_DIR..."
+    timeout 30 /usr/bin/git -C "$JUMPER_DIR" pull >> "$JUMPER_DIR/git_reboot.log" 2>&1
+else
+    echo "No default route; starting without updating."
+fi
 
-# Execute the fallback script (ensure python or bash is used depending on script type)
-/usr/bin/python3 $FALLBACK_SCRIPT $MODE
+exec /usr/bin/python3 "$JUMPER_SCRIPT" "$MODE"
@@ -0,0 +1,207 @@
+"""Background connectivity monitor with a cached online/offline state.
+
+One daemon thread owns all network checking. It probes with a TCP connect
+(with its own timeout, so no process-wide socket default is touched) every
+`interval` seconds while online, and on a backoff schedule (`min_backoff`
+doubling up to `max_backoff`) while offline. Between probes it watches the
+links: with a netlink socket it sleeps until the kernel reports a link or
+address change, otherwise it reads /sys/class/net now and then. A link
+change, or any netlink event while offline (an address from a late DHCP
+lease), triggers a probe straight away, and with no link up at all the
+state goes offline without probing.
+
+Readers use `online` and `changed_at` (or `state()`), which never block;
+`on_change(online)` is called from the thread when the state flips.
+"""
+import logging
+import os
+import select
+import socket
+import threading
+import time
+
+SYS_CLASS_NET = '/sys/class/net'
+
+# rtnetlink multicast groups (linux/rtnetlink.h)
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+
+def read_links(root=SYS_CLASS_NET):
+    """{interface: operstate} for every interface but loopback ({} off Linux)."""
+    links = {}
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return links
+    for name in names:
+        if name == 'lo':
+            continue
+        try:
+            with open(os.path.join(root, name, 'operstate')) as fh:
+                state = fh.read().strip()
+            if state == 'unknown':
+                # tunnels and some drivers never report 'up'; trust the carrier
+                with open(os.path.join(root, name, 'carrier')) as fh:
+                    state = 'up' if fh.read().strip() == '1' else 'down'
+        except OSError:
+            state = 'down'
+        links[name] = state
+    return links
+
+
+class NetworkMonitor(object):
+
+    def __init__(self, address=('1.1.1.1', 53), timeout=2.0, interval=30, min_backoff=2, max_backoff=60,
+                 settle=1.0, link_poll=2.0, confirm=2, on_change=None, sys_class_net=SYS_CLASS_NET,
+                 clock=time.monotonic):
+        self.address = address
+        self.timeout = timeout
+        self.interval = interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.settle = settle        # delay after a link change before probing (DHCP)
+        self.link_poll = link_poll  # /sys/class/net polling when netlink is unavailable
+        self.confirm = confirm      # failed probes in a row before going offline
+        self.on_change = on_change
+        self.sys_class_net = sys_class_net
+        self.clock = clock          # monotonic, for the probe schedule
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.online = None          # None until the first check
+        self.changed_at = None      # time.time() of the last flip
+        self.checked_at = None
+        self.links = {}
+        self.probes = 0
+        self.probe_failures = 0
+        self.link_changes = 0
+        self.netlink = None
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name='network-monitor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+
+    def state(self):
+        with self.lock:
+            return {'online': self.online, 'changed_at': self.changed_at, 'checked_at': self.checked_at,
+                    'links': dict(self.links), 'probes': self.probes, 'probe_failures': self.probe_failures,
+                    'link_changes': self.link_changes}
+
+    def probe(self):
+        """True if a TCP connection to `address` succeeds within `timeout`."""
+        ok = self._connect()
+        with self.lock:
+            self.probes += 1
+            if not ok:
+                self.probe_failures += 1
+        return ok
+
+    def _connect(self):
+        try:
+            socket.create_connection(self.address, timeout=self.timeout).close()
+            return True
+        except OSError:
+            return False
+
+    def _publish(self, online, reason):
+        with self.lock:
+            self.checked_at = time.time()
+            if online == self.online:
+                return
+            self.online = online
+            self.changed_at = self.checked_at
+        logging.info('Network is %s (%s)', 'up' if online else 'down', reason)
+        if self.on_change is not None:
+            try:
+                self.on_change(online)
+            except Exception:
+                logging.exception('Network change callback failed')
+
+    def _open_netlink(self):
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+            sock.setblocking(False)
+            return sock
+        except (AttributeError, OSError):
+            return None     # not Linux, or not allowed: poll /sys/class/net instead
+
+    def _wait_for_link_change(self, timeout):
+        """Sleep up to `timeout` seconds; True if the links may have changed."""
+        deadline = time.monotonic() + timeout
+        while not self.stopping.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self.netlink is not None:
+                # wake up now and then to notice stop()
+                ready, _, _ = select.select([self.netlink], [], [], min(remaining, 5.0))
+                if ready:
+                    try:
+                        while self.netlink.recv(65536):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    return True
+            else:
+                self.stopping.wait(min(remaining, self.link_poll))
+                if read_links(self.sys_class_net) != self.links:
+                    return True
+        return False
+
+    def _run(self):
+        self.netlink = self._open_netlink()
+        self.links = read_links(self.sys_class_net)
+        failures = 0
+        backoff = self.min_backoff
+        next_probe = self.clock()
+        try:
+            while not self.stopping.is_set():
+                if self._wait_for_link_change(next_probe - self.clock()):
+                    links = read_links(self.sys_class_net)
+                    changed = links != self.links
+                    if changed:
+                        with self.lock:
+                            self.links = links
+                            self.link_changes += 1
+                        logging.info('Network links changed: %s', links)
+                    # a new link, or while offline any address event (a DHCP
+                    # lease arriving after carrier-up), deserves a prompt
+                    # check, not the rest of a long backoff
+                    if changed or self.online is not True:
+                        backoff = self.min_backoff
+                        next_probe = min(next_probe, self.clock() + self.settle)
+                    continue
+                if self.stopping.is_set():
+                    break
+                if self.links and 'up' not in self.links.values():
+                    self._publish(False, 'no link')
+                    failures = 0
+                    next_probe = self.clock() + self.max_backoff
+                    continue
+                if self.probe():
+                    self._publish(True, 'probe')
+                    failures = 0
+                    backoff = self.min_backoff
+                    next_probe = self.clock() + self.interval
+                    continue
+                failures += 1
+                if self.online is not False and failures < self.confirm:
+                    # one lost probe is not an outage: retry soon before going offline
+                    next_probe = self.clock() + self.min_backoff
+                    continue
+                self._publish(False, 'probe failed')
+                next_probe = self.clock() + backoff
+                backoff = min(backoff * 2, self.max_backoff)
+        finally:
+            if self.netlink is not None:
+                self.netlink.close()
+                self.netlink = None
@@ -0,0 +1,47 @@
+"""Which message from the journal to show next while the jumper is offline.
+
+Only the newest `window` messages are read (with MessageJournal.last, so
+memory stays bounded however big the journal is). Each pick is weighted
+towards recent messages and away from ones already replayed this time
+offline, and never repeats the message just shown, so a short journal
+still rotates and a long one does not keep showing the same favourite.
+"""
+import random
+import time
+
+
+class OfflineReplay(object):
+
+    def __init__(self, journal, window=200, half_life=24 * 3600, min_recency=0.1, rng=None, clock=time.time):
+        self.journal = journal
+        self.window = window
+        self.half_life = half_life
+        self.min_recency = min_recency   # weight floor so old messages still come up
+        self.rng = rng or random.Random()
+        self.clock = clock
+        self.messages = []      # (time, text), oldest first
+        self.shown = []         # replays of each message since reload()
+        self.last = None
+
+    def reload(self):
+        """Read the newest messages again and forget what was replayed."""
+        self.messages = self.journal.last(self.window)
+        self.shown = [0] * len(self.messages)
+        self.last = None
+        return len(self.messages)
+
+    def weight(self, i, now):
+        age = max(0.0, now - self.messages[i][0])
+        recency = max(self.min_recency, 0.5 ** (age / self.half_life))
+        return recency / (1 + self.shown[i])
+
+    def next(self):
+        """(time, text) of the message to replay, or None if the journal is empty."""
+        if not self.messages:
+            return None
+        now = self.clock()
+        candidates = [i for i in range(len(self.messages)) if i != self.last] or [self.last]
+        i = self.rng.choices(candidates, [self.weight(i, now) for i in candidates])[0]
+        self.shown[i] += 1
+        self.last = i
+        return self.messages[i]
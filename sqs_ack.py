@@ -0,0 +1,134 @@
+"""Batched, background deletion of SQS messages that have been displayed.
+
+Receipt handles are queued with `add()` and deleted with
+`delete_message_batch` from a worker thread, either as soon as a full batch
+of 10 is waiting or every `flush_interval` seconds. Entries that fail for a
+transient reason are retried on later flushes, up to `max_attempts`. Under
+asyncio, `run_async()` does the flushing instead of the worker thread.
+"""
+import asyncio
+import logging
+import threading
+
+
+class AckBuffer(object):
+
+    BATCH_SIZE = 10     # SQS limit for delete_message_batch
+
+    def __init__(self, sqs, queue_url, flush_interval=2.0, max_attempts=3, on_api_call=None, on_result=None):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.on_api_call = on_api_call
+        self.on_result = on_result  # called with (receipt, deleted) once a receipt is settled
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.loop = None        # set with async_wakeup by run_async()
+        self.async_wakeup = None
+        self.pending = []       # (receipt handle, failed attempts so far)
+        self.thread = None
+        self.running = False
+        self.deleted = 0
+        self.failed = 0
+
+    def add(self, receipt):
+        """Queue a receipt handle for deletion."""
+        with self.lock:
+            self.pending.append((receipt, 0))
+            full = len(self.pending) >= self.BATCH_SIZE
+        if not self.running:
+            self.start()
+        if full:
+            self.wakeup.set()
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.async_wakeup.set)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='sqs-ack', daemon=True)
+        self.thread.start()
+
+    async def run_async(self, executor):
+        """Flush from an asyncio loop instead of a worker thread; the deletes
+        run on `executor`."""
+        loop = asyncio.get_running_loop()
+        self.async_wakeup = asyncio.Event()
+        self.loop = loop
+        self.running = True
+        while self.running:
+            # a full batch is flushed at once, anything else after flush_interval
+            try:
+                await asyncio.wait_for(self.async_wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.async_wakeup.clear()
+            try:
+                await loop.run_in_executor(executor, self.flush)
+            except Exception:
+                logging.exception('Failed to flush SQS deletes')
+
+    def close(self):
+        """Stop the worker and delete whatever is still queued."""
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def _run(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logging.exception('Failed to flush SQS deletes')
+
+    def _settled(self, receipt, deleted):
+        if self.on_result:
+            try:
+                self.on_result(receipt, deleted)
+            except Exception:
+                logging.exception('SQS delete callback failed')
+
+    def flush(self):
+        """Delete everything queued right now. Returns the number deleted;
+        retryable failures go back on the queue for the next flush."""
+        with self.lock:
+            queued, self.pending = self.pending, []
+        deleted = 0
+        retry = []
+        for i in range(0, len(queued), self.BATCH_SIZE):
+            batch = queued[i:i + self.BATCH_SIZE]
+            entries = [{'Id': str(n), 'ReceiptHandle': receipt} for n, (receipt, attempts) in enumerate(batch)]
+            try:
+                if self.on_api_call:
+                    self.on_api_call('delete_message_batch')
+                resp = self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+                failed = resp.get('Failed') or []
+            except Exception:
+                logging.exception('SQS delete_message_batch failed')
+                failed = [{'Id': e['Id'], 'SenderFault': False} for e in entries]
+            failed_ids = set()
+            for entry in failed:
+                failed_ids.add(int(entry['Id']))
+                receipt, attempts = batch[int(entry['Id'])]
+                attempts += 1
+                # sender faults (e.g. an expired receipt handle) will never succeed
+                if entry.get('SenderFault') or attempts >= self.max_attempts:
+                    self.failed += 1
+                    logging.warning('Giving up deleting SQS message: %s', entry.get('Code', 'error'))
+                    self._settled(receipt, False)
+                else:
+                    retry.append((receipt, attempts))
+            for n, (receipt, attempts) in enumerate(batch):
+                if n not in failed_ids:
+                    self._settled(receipt, True)
+            deleted += len(batch) - len(failed)
+        if retry:
+            with self.lock:
+                self.pending[:0] = retry
+        self.deleted += deleted
+        return deleted
@@ -0,0 +1,159 @@
+"""In-memory stand-in for the parts of the boto3 SQS client the jumper uses.
+
+Lets the poller, the acknowledgement buffer and the benchmarks run without
+AWS: messages honour visibility timeouts and long polling, receipt handles
+change on every receive, and latency or batch-entry failures can be
+injected to exercise retries.
+
+    sqs = LocalSQS(latency=0.05, fail_rate=0.2)
+    sqs.send_message(QueueUrl='local', MessageBody='{"message": "hi"}')
+"""
+import itertools
+import random
+import threading
+import time
+import uuid
+
+# Queue URL that selects the stand-in in cslm-christmas.py
+LOCAL_QUEUE_URL = 'local'
+
+
+class LocalSQSError(Exception):
+    """Raised where the real client would raise botocore's ClientError."""
+
+    def __init__(self, code, message=''):
+        Exception.__init__(self, '%s: %s' % (code, message))
+        self.code = code
+
+
+class LocalSQS(object):
+
+    def __init__(self, latency=0.0, fail_rate=0.0, seed=None, clock=time.time):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.cond = threading.Condition()
+        self.messages = []          # dicts, in send order
+        self.ids = itertools.count(1)
+        self.calls = {}             # API name -> number of calls
+
+    def _call(self, name):
+        with self.cond:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _fails(self):
+        return self.fail_rate and self.random.random() < self.fail_rate
+
+    def _find(self, receipt):
+        for msg in self.messages:
+            if msg['receipt'] == receipt:
+                return msg
+        return None
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self._call('send_message')
+        with self.cond:
+            msg = {
+                'id': str(uuid.UUID(int=next(self.ids))),
+                'body': MessageBody,
+                'sent': self.clock(),
+                'visible_at': self.clock() + kwargs.get('DelaySeconds', 0),
+                'receives': 0,
+                'receipt': None,
+            }
+            self.messages.append(msg)
+            self.cond.notify_all()
+        return {'MessageId': msg['id']}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0,
+                        VisibilityTimeout=30, **kwargs):
+        self._call('receive_message')
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self.cond:
+            while True:
+                now = self.clock()
+                ready = [m for m in self.messages if m['visible_at'] <= now]
+                if ready:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return {}
+                # wake for new messages or when the next hidden one reappears
+                hidden = [m['visible_at'] - now for m in self.messages]
+                self.cond.wait(min([remaining] + hidden))
+            out = []
+            for msg in ready[:MaxNumberOfMessages]:
+                msg['visible_at'] = now + VisibilityTimeout
+                msg['receives'] += 1
+                msg['receipt'] = uuid.uuid4().hex
+                out.append({
+                    'MessageId': msg['id'],
+                    'ReceiptHandle': msg['receipt'],
+                    'Body': msg['body'],
+                    'Attributes': {
+                        'SentTimestamp': str(int(msg['sent'] * 1000)),
+                        'ApproximateReceiveCount': str(msg['receives']),
+                    },
+                })
+        return {'Messages': out}
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self._call('delete_message')
+        with self.cond:
+            msg = self._find(ReceiptHandle)
+            if msg is None:
+                raise LocalSQSError('ReceiptHandleIsInvalid', ReceiptHandle)
+            self.messages.remove(msg)
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self._call('delete_message_batch')
+        ok, failed = [], []
+        with self.cond:
+            for entry in Entries:
+                msg = self._find(entry['ReceiptHandle'])
+                if msg is None:
+                    failed.append({'Id': entry['Id'], 'SenderFault': True, 'Code': 'ReceiptHandleIsInvalid'})
+                elif self._fails():
+                    failed.append({'Id': entry['Id'], 'SenderFault': False, 'Code': 'InternalError'})
+                else:
+                    self.messages.remove(msg)
+                    ok.append({'Id': entry['Id']})
+        return {'Successful': ok, 'Failed': failed}
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout):
+        self._call('change_message_visibility')
+        with self.cond:
+            msg = self._find(ReceiptHandle)
+            if msg is None:
+                raise LocalSQSError('ReceiptHandleIsInvalid', ReceiptHandle)
+            msg['visible_at'] = self.clock() + VisibilityTimeout
+            self.cond.notify_all()
+        return {}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self._call('change_message_visibility_batch')
+        ok, failed = [], []
+        with self.cond:
+            for entry in Entries:
+                msg = self._find(entry['ReceiptHandle'])
+                if msg is None:
+                    failed.append({'Id': entry['Id'], 'SenderFault': True, 'Code': 'ReceiptHandleIsInvalid'})
+                else:
+                    msg['visible_at'] = self.clock() + entry['VisibilityTimeout']
+                    ok.append({'Id': entry['Id']})
+            self.cond.notify_all()
+        return {'Successful': ok, 'Failed': failed}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None):
+        self._call('get_queue_attributes')
+        with self.cond:
+            now = self.clock()
+            visible = sum(1 for m in self.messages if m['visible_at'] <= now)
+            return {'Attributes': {
+                'ApproximateNumberOfMessages': str(visible),
+                'ApproximateNumberOfMessagesNotVisible': str(len(self.messages) - visible),
+            }}
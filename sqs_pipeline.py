@@ -0,0 +1,253 @@
+"""Prefetching side of the SQS display pipeline.
+
+A fetch worker keeps a bounded local buffer of upcoming messages filled
+with long-polling receives, so the display never waits for a round trip,
+and a lease worker extends the visibility timeout of every message that is
+buffered or on screen so SQS does not hand it out again before it has been
+shown and deleted.
+
+The fetcher also keeps a rough idea of how many messages are still waiting
+on the queue (for the adaptive hold time) without polling for it: a receive
+that comes back short means the queue is drained, and only when receives
+keep coming back full is ApproximateNumberOfMessages sampled, at most every
+`depth_interval` seconds.
+
+The fetcher runs either on its own threads (`start()`) or as coroutines on
+an asyncio loop (`run_async()`), with the blocking calls on an executor.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+from message_layout import DisplayMessage
+from message_trace import MessageTrace
+
+
+class BufferedMessage(object):
+
+    def __init__(self, raw, message, trace=None):
+        self.raw = raw
+        self.message = message      # DisplayMessage, parsed once on receipt
+        self.text = message.text
+        self.receipt = raw.get('ReceiptHandle')
+        self.received_at = time.monotonic()
+        self.trace = trace if trace is not None else MessageTrace()
+
+
+class MessageFetcher(object):
+
+    BATCH_SIZE = 10     # SQS limit for receive and visibility batches
+    ERROR_BACKOFF = 5
+
+    def __init__(self, sqs, queue_url, buffer_size=10, wait_time=20,
+                 visibility_timeout=90, renew_margin=30, depth_interval=30, on_api_call=None,
+                 clock=time.monotonic):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.wait_time = wait_time
+        self.visibility_timeout = visibility_timeout
+        self.renew_margin = renew_margin
+        self.depth_interval = depth_interval
+        self.on_api_call = on_api_call
+        self.clock = clock      # monotonic; for leases and the depth sample interval
+        self.remote_depth = 0
+        self.depth_sampled_at = None
+        self.queue_full = False    # last receive filled every slot we asked for
+        self.lock = threading.Lock()
+        self.space = threading.Event()
+        self.leases = {}        # receipt handle -> monotonic time the message becomes visible again
+        self.running = False
+        self.received = 0
+        self.renewed = 0
+        self.receives = 0
+        self.empty_receives = 0
+
+    def _count(self, name):
+        if self.on_api_call:
+            self.on_api_call(name)
+
+    def start(self):
+        self.running = True
+        for target, name in ((self._fetch_loop, 'sqs-fetch'), (self._lease_loop, 'sqs-lease')):
+            threading.Thread(target=target, name=name, daemon=True).start()
+
+    async def run_async(self, executor, arrived=None, online=None):
+        """Drive fetching and lease renewal from an asyncio loop instead of
+        threads; the blocking SQS calls run on `executor`. `arrived` (an
+        asyncio.Event) is set whenever new messages have been buffered.
+        With `online` (an asyncio.Event) each receive and each renewal first
+        waits for it, so an outage costs no failing calls or error backoff."""
+        self.running = True
+        await asyncio.gather(self._fetch_async(executor, arrived, online),
+                             self._lease_async(executor, online))
+
+    async def _fetch_async(self, executor, arrived, online):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            if online is not None and not online.is_set():
+                await online.wait()
+                continue
+            free = self._free_slots()
+            if free <= 0:
+                self.queue_full = True
+                if self._depth_due():
+                    await loop.run_in_executor(executor, self._maybe_sample_depth)
+                await asyncio.sleep(1)
+                continue
+            try:
+                buffered = await loop.run_in_executor(executor, self._receive, free)
+            except Exception:
+                logging.exception('SQS receive error')
+                await asyncio.sleep(self.ERROR_BACKOFF)
+                continue
+            if buffered and arrived is not None:
+                arrived.set()
+
+    async def _lease_async(self, executor, online):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            await asyncio.sleep(self._lease_interval())
+            if online is not None:
+                # leases that lapse meanwhile just put the messages back on the queue
+                await online.wait()
+            await loop.run_in_executor(executor, self._renew_due)
+
+    def stop(self):
+        self.running = False
+        self.space.set()
+
+    def get(self, timeout=None):
+        """Next buffered message, or None if none arrives within `timeout` seconds."""
+        try:
+            msg = self.buffer.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self.space.set()
+        return msg
+
+    def pending(self):
+        """Number of messages waiting in the local buffer."""
+        return self.buffer.qsize()
+
+    def backlog(self):
+        """Messages waiting behind the one on screen, locally and on the queue."""
+        return self.buffer.qsize() + self.remote_depth
+
+    def release(self, receipt):
+        """Stop extending a message's visibility (it has been shown)."""
+        with self.lock:
+            self.leases.pop(receipt, None)
+
+    def _fetch_loop(self):
+        while self.running:
+            free = self._free_slots()
+            if free <= 0:
+                # buffer full: the queue may well have more, and we wait for
+                # the display to take something
+                self.queue_full = True
+                self._maybe_sample_depth()
+                self.space.wait(1)
+                self.space.clear()
+                continue
+            try:
+                self._receive(free)
+            except Exception:
+                logging.exception('SQS receive error')
+                time.sleep(self.ERROR_BACKOFF)
+
+    def _free_slots(self):
+        return self.buffer.maxsize - self.buffer.qsize()
+
+    def _receive(self, free):
+        """One long-polling receive for up to `free` messages; returns how many were buffered."""
+        self._count('receive_message')
+        resp = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(self.BATCH_SIZE, free),
+            WaitTimeSeconds=self.wait_time,
+            VisibilityTimeout=self.visibility_timeout,
+            AttributeNames=['SentTimestamp', 'ApproximateReceiveCount'],
+            MessageAttributeNames=['All']
+        )
+        received = time.time()
+        messages = resp.get('Messages') or []
+        self.receives += 1
+        if not messages:
+            self.empty_receives += 1
+        self.queue_full = len(messages) >= min(self.BATCH_SIZE, free)
+        if not self.queue_full:
+            self.remote_depth = 0
+        self._maybe_sample_depth()
+        expires = self.clock() + self.visibility_timeout
+        for raw in messages:
+            trace = MessageTrace.from_sqs(raw)
+            trace.mark('received', received)
+            message = DisplayMessage.from_body(raw.get('Body', ''))
+            trace.mark('parsed')
+            msg = BufferedMessage(raw, message, trace)
+            if msg.receipt:
+                with self.lock:
+                    self.leases[msg.receipt] = expires
+            self.received += 1
+            # never blocks: we only asked for as many as there was room for
+            self.buffer.put(msg)
+        return len(messages)
+
+    def _depth_due(self):
+        if not self.queue_full:
+            return False
+        return self.depth_sampled_at is None or self.clock() - self.depth_sampled_at >= self.depth_interval
+
+    def _maybe_sample_depth(self):
+        """Read ApproximateNumberOfMessages if it is due; blocking, so off the event loop."""
+        if not self._depth_due():
+            return
+        self.depth_sampled_at = self.clock()
+        try:
+            self._count('get_queue_attributes')
+            resp = self.sqs.get_queue_attributes(QueueUrl=self.queue_url,
+                                                 AttributeNames=['ApproximateNumberOfMessages'])
+            self.remote_depth = int(resp['Attributes']['ApproximateNumberOfMessages'])
+        except Exception:
+            logging.exception('Failed to read SQS queue depth')
+
+    def _lease_loop(self):
+        while self.running:
+            time.sleep(self._lease_interval())
+            self._renew_due()
+
+    def _lease_interval(self):
+        return min(5, self.renew_margin / 2.0)
+
+    def _renew_due(self):
+        now = self.clock()
+        with self.lock:
+            due = [r for r, expires in self.leases.items() if expires - now < self.renew_margin]
+        for i in range(0, len(due), self.BATCH_SIZE):
+            self._renew(due[i:i + self.BATCH_SIZE])
+
+    def _renew(self, receipts):
+        entries = [{'Id': str(n), 'ReceiptHandle': r, 'VisibilityTimeout': self.visibility_timeout}
+                   for n, r in enumerate(receipts)]
+        try:
+            self._count('change_message_visibility_batch')
+            resp = self.sqs.change_message_visibility_batch(QueueUrl=self.queue_url, Entries=entries)
+            failed = {int(f['Id']) for f in resp.get('Failed') or []}
+        except Exception:
+            logging.exception('SQS visibility renewal failed')
+            return
+        expires = self.clock() + self.visibility_timeout
+        with self.lock:
+            for n, receipt in enumerate(receipts):
+                if receipt not in self.leases:
+                    continue    # shown and released meanwhile
+                if n in failed:
+                    # the message will reappear on the queue; stop renewing it
+                    logging.warning('Could not extend SQS message visibility')
+                    del self.leases[receipt]
+                else:
+                    self.leases[receipt] = expires
+                    self.renewed += 1
@@ -0,0 +1,135 @@
+"""Crash-safe stats persistence for an SD card that loses power a lot.
+
+`write_json_atomic` replaces a file with write-temp + fsync + rename, so a
+reader only ever sees the old or the new version, never half of one.
+
+`MinuteRing` is a fixed-size binary file with one slot per minute
+(slot = minute % slots) holding a CRC-protected snapshot of the counters.
+Each write touches one small record in place, the file never grows, and a
+record torn by a power cut fails its CRC and is skipped on reload.
+"""
+import json
+import os
+import struct
+import time
+import zlib
+
+
+def write_json_atomic(path, data):
+    """Replace `path` with `data` as JSON; the old file stays intact until the new one is complete."""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp = '%s.tmp' % path
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+    # make the rename itself durable
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class MinuteRing(object):
+
+    MAGIC = b'XMRG'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHI')    # magic, version, field count, slots
+
+    def __init__(self, path, fields, slots=1440):
+        self.path = path
+        self.fields = tuple(fields)
+        self.slots = slots
+        # crc32, minute since the epoch, then one unsigned 64-bit value per field
+        self.record = struct.Struct('<II%dQ' % len(self.fields))
+
+    def _header(self):
+        return self.HEADER.pack(self.MAGIC, self.VERSION, len(self.fields), self.slots)
+
+    def _open(self):
+        """Open for update, (re)creating the file if it is missing or has another layout."""
+        size = self.HEADER.size + self.slots * self.record.size
+        try:
+            fh = open(self.path, 'r+b')
+        except FileNotFoundError:
+            fh = None
+        if fh is not None:
+            if fh.read(self.HEADER.size) == self._header() and os.fstat(fh.fileno()).st_size == size:
+                return fh
+            fh.close()
+        with open(self.path, 'wb') as fh:
+            fh.write(self._header())
+            fh.truncate(size)
+        return open(self.path, 'r+b')
+
+    def write(self, values, when=None):
+        """Store the counter values (a dict keyed by field) in this minute's slot."""
+        minute = int((time.time() if when is None else when) // 60)
+        numbers = [max(0, int(values.get(field, 0))) for field in self.fields]
+        body = struct.pack('<I%dQ' % len(numbers), minute, *numbers)
+        data = struct.pack('<I', zlib.crc32(body)) + body
+        fh = self._open()
+        try:
+            fh.seek(self.HEADER.size + (minute % self.slots) * self.record.size)
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        finally:
+            fh.close()
+
+    def records(self):
+        """[(minute, {field: value})] for every intact slot, oldest first."""
+        try:
+            with open(self.path, 'rb') as fh:
+                if fh.read(self.HEADER.size) != self._header():
+                    return []
+                data = fh.read(self.slots * self.record.size)
+        except OSError:
+            return []
+        out = []
+        for offset in range(0, len(data) - self.record.size + 1, self.record.size):
+            chunk = data[offset:offset + self.record.size]
+            crc, minute = struct.unpack_from('<II', chunk)
+            if minute == 0 or crc != zlib.crc32(chunk[4:]):
+                continue    # never written, or torn by a power cut
+            values = self.record.unpack(chunk)[2:]
+            out.append((minute, dict(zip(self.fields, values))))
+        out.sort(key=lambda record: record[0])
+        return out
+
+    def latest(self):
+        """The newest intact snapshot as {field: value}, or None."""
+        records = self.records()
+        return records[-1][1] if records else None
+
+    def series(self, minutes=60, now=None):
+        """Per-minute increases of each counter over the last `minutes` minutes,
+        as [(minute start as epoch seconds, {field: increase})]. Minutes without
+        a snapshot carry the previous values; counters that went backwards
+        (a restart) count from zero."""
+        end = int((time.time() if now is None else now) // 60)
+        start = end - minutes
+        records = [r for r in self.records() if r[0] > end - self.slots]
+        previous = None
+        for minute, values in records:
+            if minute <= start:
+                previous = values
+        snapshots = dict(records)
+        out = []
+        for minute in range(start + 1, end + 1):
+            current = snapshots.get(minute, previous)
+            if current is None:
+                continue
+            if previous is None:
+                previous = current
+            out.append((minute * 60, {f: current[f] - previous[f] if current[f] >= previous[f] else current[f]
+                                      for f in self.fields}))
+            previous = current
+        return out
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+
+from countdown_clock import ChristmasTarget, TickScheduler
+
+
+def local(*args):
+    return datetime(*args).timestamp()
+
+
+def test_remaining_counts_down_to_christmas_midnight():
+    target = ChristmasTarget()
+    assert target.remaining(local(2026, 12, 24, 23, 59, 30)) == (0, 0, 0, 30)
+    assert target.remaining(local(2026, 12, 23, 22, 58, 57) + 0.5) == (1, 1, 1, 2)
+
+
+@pytest.mark.parametrize('now, year', [
+    ((2026, 12, 25, 0, 0, 0), 2027),    # Christmas day counts down to next year's
+    ((2026, 12, 25, 18, 0, 0), 2027),
+    ((2026, 12, 26, 9, 0, 0), 2027),
+    ((2027, 1, 1, 0, 0, 0), 2027),
+])
+def test_target_rolls_over_on_christmas_day(now, year):
+    target = ChristmasTarget()
+    target.seconds_left(local(*now))
+    assert target.target == local(year, 12, 25)
+
+
+def test_target_is_worked_out_once_a_day():
+    target = ChristmasTarget()
+    for hour in range(24):
+        target.seconds_left(local(2026, 11, 30, hour, 30))
+    assert target.computes == 1
+    target.seconds_left(local(2026, 12, 1, 0, 0, 1))
+    assert target.computes == 2
+    # a clock stepped back to the day before is noticed too
+    target.seconds_left(local(2026, 11, 30, 23, 59))
+    assert target.computes == 3
+
+
+def test_fields_wake_on_their_own_boundaries():
+    ticks = TickScheduler({'clock': 60, 'temperature': 5}, slack=0.005)
+    assert sorted(ticks.due(100.2)) == ['clock', 'temperature']
+    assert ticks.delay(100.2) == pytest.approx(4.805)      # just after 105
+    assert ticks.due(105.01) == ['temperature']
+    assert ticks.delay(105.01) == pytest.approx(4.995)
+    assert ticks.due(107) == []
+    assert sorted(ticks.due(120.01)) == ['clock', 'temperature']
+    assert ticks.next_due == {'clock': pytest.approx(180.005), 'temperature': pytest.approx(125.005)}
+
+
+def test_backwards_clock_step_restarts_the_schedule():
+    ticks = TickScheduler({'clock': 60}, slack=0.005)
+    ticks.due(1000.5)
+    assert ticks.due(1010) == []
+    # NTP steps the clock back ten minutes: do not wait for the old boundary
+    assert ticks.due(400.5) == ['clock']
+    assert ticks.delay(400.5) == pytest.approx(19.505)
+
+
+def test_reset_makes_everything_due():
+    ticks = TickScheduler({'clock': 60, 'temperature': 5})
+    ticks.due(100.2)
+    ticks.reset()
+    assert ticks.delay(100.3) == 0.0
+    assert sorted(ticks.due(100.3)) == ['clock', 'temperature']
@@ -0,0 +1,38 @@
+from hold_policy import HoldPolicy
+
+
+class Clock(object):
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_hold_shrinks_with_the_backlog_within_bounds():
+    policy = HoldPolicy(max_hold=60, min_hold=10, target_clear=300, clock=Clock())
+    assert policy.hold_seconds(0) == 60
+    assert policy.hold_seconds(2) == 60      # 150 s, clamped to max_hold
+    assert policy.hold_seconds(10) == 30
+    assert policy.hold_seconds(100) == 10    # 3 s, clamped to min_hold
+
+
+def test_backlog_clear_time_is_tracked():
+    clock = Clock(100)
+    policy = HoldPolicy(clock=clock)
+    policy.observe(3)
+    clock.now = 150
+    policy.observe(5)           # the same backlog, still growing
+    clock.now = 400
+    policy.observe(0)
+    assert policy.stats() == {'last_backlog_clear_seconds': 300, 'max_backlog_clear_seconds': 300,
+                              'backlogs_cleared': 1}
+    clock.now = 450
+    policy.observe(0)           # nothing waiting: nothing to clear
+    clock.now = 500
+    policy.observe(1)
+    clock.now = 520
+    policy.observe(0)
+    assert policy.stats() == {'last_backlog_clear_seconds': 20, 'max_backlog_clear_seconds': 300,
+                              'backlogs_cleared': 2}
@@ -0,0 +1,147 @@
+import pytest
+
+from Adafruit_LCD2004 import Adafruit_CharLCD
+from PCF8574 import PCF8574_GPIO
+from lcd_bigdigits import PREVIEW, SEGMENTS, BigCountdown
+from lcd_emulator import EmulatedSMBus
+from lcd_framebuffer import LCDFramebuffer
+from lcd_glyphs import GLYPHS, GlyphCache
+from lcd_marquee import Marquee
+
+ADDRESS = 0x27
+
+
+class Panel(object):
+    """The jumper's LCD stack on an emulated bus, wired as in cslm-christmas.py."""
+
+    def __init__(self):
+        # bus time as on a 400 kHz bus, accounted for but not slept
+        self.bus = EmulatedSMBus(address=ADDRESS, byte_time=22.5e-6, realtime=False)
+        mcp = PCF8574_GPIO(ADDRESS, bus=self.bus)
+        self.lcd = Adafruit_CharLCD(pin_rs=0, pin_e=2, pins_db=[4, 5, 6, 7], GPIO=mcp, timing='datasheet')
+        self.lcd.begin(20, 4)
+        glyphs = dict(GLYPHS, **SEGMENTS)
+        self.glyphs = GlyphCache(self.lcd, glyphs)
+        self.fb = LCDFramebuffer(self.lcd, 20, 4, glyphs=self.glyphs)
+        self.bus.lcd.glyph_names = {rows: PREVIEW.get(char, char) for char, rows in glyphs.items()}
+
+    def lines(self):
+        return self.bus.lcd.lines()
+
+    def transactions(self, fn, *args):
+        """I2C transactions `fn` takes."""
+        before = self.bus.transactions
+        fn(*args)
+        return self.bus.transactions - before
+
+
+@pytest.fixture
+def panel():
+    return Panel()
+
+
+def show(fb, rows):
+    for row, text in enumerate(rows):
+        fb.write_row(row, text)
+    fb.commit()
+
+
+def test_framebuffer_renders_rows(panel):
+    show(panel.fb, ['Happy Christmas day', '68 days 9 hours', '59 minutes to xmas', 'Time: 14:01'])
+    assert panel.lines() == [
+        'Happy Christmas day ',
+        '68 days 9 hours     ',
+        '59 minutes to xmas  ',
+        'Time: 14:01         ',
+    ]
+    assert panel.bus.lcd.overruns == 0
+
+
+def test_framebuffer_sends_only_changed_cells(panel):
+    show(panel.fb, ['Happy Christmas day', '68 days 9 hours', '59 minutes to xmas', 'Time: 14:01'])
+    # one cell: a cursor move and a data byte, one transaction each
+    assert panel.transactions(show, panel.fb, ['Happy Christmas day', '68 days 9 hours',
+                                               '58 minutes to xmas', 'Time: 14:01']) == 2
+    assert panel.lines()[2] == '58 minutes to xmas  '
+    # nothing changed: nothing sent
+    assert panel.transactions(panel.fb.commit) == 0
+
+
+def test_glyphs_stay_resident_across_repaints(panel):
+    show(panel.fb, ['Merry Xmas \U0001F384', 'Grün ❤️ 3°C', '', ''])
+    assert panel.lines()[:2] == ['Merry Xmas \U0001F384        ', 'Grün ♥ 3°C          ']
+    uploads = panel.glyphs.uploads
+    show(panel.fb, ['Happy Xmas \U0001F384', 'Grün ❤️ 3°C', '', ''])
+    assert panel.glyphs.uploads == uploads
+    assert panel.lines()[0] == 'Happy Xmas \U0001F384        '
+
+
+def test_more_than_eight_glyphs_fall_back(panel):
+    show(panel.fb, ['\U0001F384❄★♥\U0001F381\U0001F514⛄\U0001F642€£', '', '', ''])
+    assert panel.lines()[0] == '\U0001F384❄★♥\U0001F381\U0001F514⛄\U0001F642??' + ' ' * 10
+
+
+def test_marquee_steps_with_single_writes(panel):
+    text = 'Merry Christmas from everyone on the third floor, see you at the party'
+    marquee = Marquee(panel.lcd, text, glyphs=panel.glyphs)
+    marquee.start()
+    stream = marquee.stream
+
+    def window(start, count):
+        return ''.join(stream[(start + i) % len(stream)] for i in range(count))
+
+    for position in range(1, 2 * len(stream)):
+        sent = panel.transactions(marquee.step)
+        # the address counter is put back at the start of the line once per lap
+        assert sent == (2 if (position - 1) % 40 == 0 and position > 1 else 1)
+        lines = panel.lines()
+        assert lines[0] == window(position, 20)
+        assert lines[2] == window(position + 20, 20)
+        assert lines[1] == lines[3] == ' ' * 20
+    marquee.stop()
+    assert panel.bus.lcd.overruns == 0
+
+
+def test_big_countdown_renders_digits(panel):
+    big = BigCountdown(panel.fb)
+    big.draw(68, 9, 5, 7)
+    panel.fb.commit()
+    assert panel.lines() == [
+        '    ▛▀▀ ▛▀▜ days to ',
+        '    ▙▄▟ ▙▄▟ Xmas!   ',
+        '▛▀▜▛▀▜･▛▀▜▙▀▀･▛▀▜▀▀▜',
+        '▙▄▟  █･▙▄▟▄▄▟･▙▄▟  █',
+    ]
+
+
+def test_big_countdown_redraws_after_other_screens(panel):
+    big = BigCountdown(panel.fb)
+    big.draw(68, 9, 5, 7)
+    panel.fb.commit()
+    expected = panel.lines()
+    show(panel.fb, ['A message', '', '', ''])
+    big.draw(68, 9, 5, 7)
+    panel.fb.commit()
+    assert panel.lines() == expected
+
+
+def test_big_countdown_tick_costs(panel):
+    big = BigCountdown(panel.fb)
+
+    def tick(left):
+        days, left = divmod(left, 24 * 3600)
+        hours, left = divmod(left, 3600)
+        minutes, seconds = divmod(left, 60)
+        big.draw(days, hours, minutes, seconds)
+        panel.fb.commit()
+
+    start = 68 * 24 * 3600 + 10 * 3600 - 1     # 68 days 09:59:59
+    tick(start)
+    costs = [panel.transactions(tick, start - n) for n in range(1, 3600)]
+    # each changed row of a digit is a cursor move and a data write
+    assert costs[0] == 2       # :59 -> :58, only the bottom row differs
+    assert costs[1] == 4       # :58 -> :57, both rows
+    assert costs[9] == 5       # :50 -> :49, the tens digit too
+    assert max(costs) == 10
+    assert 3.6 < sum(costs) / float(len(costs)) < 3.9
+    assert panel.bus.lcd.overruns == 0
@@ -0,0 +1,37 @@
+import os
+import time
+
+from message_journal import MessageJournal, format_line
+
+
+def test_a_lone_message_reaches_the_disk_within_flush_seconds(tmp_path):
+    path = str(tmp_path / 'messages')
+    journal = MessageJournal(path, flush_seconds=0.2)
+    try:
+        journal.append('Merry Christmas', when=time.time())
+        # no later append comes along to flush it
+        deadline = time.monotonic() + 2.0
+        while os.path.getsize(path) == 0 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        with open(path, encoding='utf-8') as fh:
+            assert fh.read().endswith(' - Merry Christmas\n')
+        assert [text for when, text in journal.last(5)] == ['Merry Christmas']
+    finally:
+        journal.close()
+
+
+def test_since_keeps_messages_stamped_at_a_rotation_boundary(tmp_path):
+    when = float(int(time.time()))
+    line = len(format_line(when, 'message 0').encode('utf-8'))
+    # two messages per segment, so the second and third share a stamp across a rotation
+    journal = MessageJournal(str(tmp_path / 'messages'), max_bytes=2 * line, flush_seconds=0)
+    try:
+        journal.append('message 0', when=when - 10)
+        journal.append('message 1', when=when)
+        journal.append('message 2', when=when)
+        journal.append('message 3', when=when + 1)
+        assert journal.rotations == 1
+        assert list(journal.since(when)) == [(when, 'message 1'), (when, 'message 2'), (when + 1, 'message 3')]
+        assert [text for stamp, text in journal.since(when + 1)] == ['message 3']
+    finally:
+        journal.close()
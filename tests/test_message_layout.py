@@ -0,0 +1,56 @@
+import json
+
+from message_layout import DisplayMessage, LayoutEngine, wrap
+
+
+def test_plain_json_and_sns_bodies():
+    assert DisplayMessage.from_body('Merry  Christmas\n').text == 'Merry Christmas'
+    message = DisplayMessage.from_body('{"message": "Happy holidays"}')
+    assert (message.text, message.kind) == ('Happy holidays', 'json')
+    envelope = json.dumps({'Message': json.dumps({'message': 'From SNS'})})
+    message = DisplayMessage.from_body(envelope)
+    assert (message.text, message.kind) == ('From SNS', 'sns')
+
+
+def test_null_message_is_empty():
+    assert DisplayMessage.from_body('{"message": null}').text == ''
+    assert DisplayMessage.from_body(json.dumps({'Message': '{"message": null}'})).text == ''
+    assert DisplayMessage.from_body('null').text == ''
+
+
+def test_wrap_splits_words_longer_than_a_line():
+    assert wrap('abcdefghij klm', 10) == ['abcdefghij', 'klm']
+    # a long word starts in the room left on the current line
+    assert wrap('a ' + 'x' * 25, 10) == ['a ' + 'x' * 8, 'x' * 10, 'x' * 7]
+    assert wrap('', 10) == []
+
+
+def test_long_text_is_paged_four_rows_at_a_time():
+    engine = LayoutEngine(cols=10, rows=4)
+    layout = engine.layout('one two three four five six seven eight nine ten eleven twelve')
+    assert layout.pages == (
+        ('one two   ', 'three four', 'five six  ', 'seven     '),
+        ('eight nine', 'ten eleven', 'twelve    ', '          '),
+    )
+    assert not layout.truncated
+    assert engine.layout('').pages == ((' ' * 10,) * 4,)
+
+
+def test_text_past_max_pages_ends_in_an_ellipsis():
+    engine = LayoutEngine(cols=10, rows=2, max_pages=1)
+    layout = engine.layout('alpha beta gamma delta epsilon')
+    assert layout.truncated
+    assert layout.pages == (('alpha beta', 'gamma...  '),)
+    # a full last line is cut to make room
+    assert engine.layout('alpha beta abcdefghij more').pages == (('alpha beta', 'abcdefg...'),)
+
+
+def test_layouts_are_cached_least_recently_used_first_out():
+    engine = LayoutEngine(cache_size=2)
+    first = engine.layout('Merry Christmas')
+    engine.layout('Happy holidays')
+    assert engine.layout(DisplayMessage('Merry  Christmas')) is first    # a hit refreshes it
+    engine.layout('Season\'s greetings')                                # evicts 'Happy holidays'
+    assert list(engine.cache) == ['Merry Christmas', "Season's greetings"]
+    engine.layout('Happy holidays')
+    assert (engine.hits, engine.misses) == (1, 4)
@@ -0,0 +1,53 @@
+from message_trace import Histogram
+from metrics import MetricsWriter
+
+
+def test_render_exposition_text():
+    out = MetricsWriter()
+    out.counter('xmas_messages_displayed_total', 'Messages shown', 3)
+    out.gauge('xmas_network_online', 'Network reachable\nat the last check', None)
+    out.counter('xmas_messages_displayed_total', 'Messages shown', 1, {'source': 'C:\\jumper "2"\nx'})
+    out.histogram('xmas_latency_seconds', 'Latency', [(0.5, 1), (1, 3)], 4.25, 4, {'stage': 'display'})
+    out.gauge('xmas_hold_seconds', 'Hold', float('inf'))
+    assert out.render() == '\n'.join([
+        '# HELP xmas_messages_displayed_total Messages shown',
+        '# TYPE xmas_messages_displayed_total counter',
+        'xmas_messages_displayed_total 3',
+        'xmas_messages_displayed_total{source="C:\\\\jumper \\"2\\"\\nx"} 1',
+        '# HELP xmas_network_online Network reachable\\nat the last check',
+        '# TYPE xmas_network_online gauge',
+        'xmas_network_online NaN',
+        '# HELP xmas_latency_seconds Latency',
+        '# TYPE xmas_latency_seconds histogram',
+        'xmas_latency_seconds_bucket{le="0.5",stage="display"} 1',
+        'xmas_latency_seconds_bucket{le="1",stage="display"} 3',
+        'xmas_latency_seconds_bucket{le="+Inf",stage="display"} 4',
+        'xmas_latency_seconds_sum{stage="display"} 4.25',
+        'xmas_latency_seconds_count{stage="display"} 4',
+        '# HELP xmas_hold_seconds Hold',
+        '# TYPE xmas_hold_seconds gauge',
+        'xmas_hold_seconds +Inf',
+    ]) + '\n'
+
+
+def test_latency_histogram_buckets_are_cumulative():
+    hist = Histogram()
+    for seconds in (0.0015, 0.003, 0.003, 2e6):     # the last is past every bound
+        hist.record(seconds)
+    out = MetricsWriter()
+    out.histogram('xmas_message_latency_seconds', 'Latency', hist.cumulative(), hist.sum, hist.count,
+                  {'stage': 'queued'})
+    samples = {}
+    for line in out.render().splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = value
+    buckets = [int(value) for name, value in samples.items() if '_bucket' in name]
+    assert buckets == sorted(buckets)
+    assert samples['xmas_message_latency_seconds_bucket{le="0.001",stage="queued"}'] == '0'
+    assert samples['xmas_message_latency_seconds_bucket{le="0.002",stage="queued"}'] == '1'
+    assert samples['xmas_message_latency_seconds_bucket{le="0.004",stage="queued"}'] == '3'
+    assert buckets[-2:] == [3, 4]       # the overflow only shows in +Inf
+    assert samples['xmas_message_latency_seconds_bucket{le="+Inf",stage="queued"}'] == '4'
+    assert samples['xmas_message_latency_seconds_count{stage="queued"}'] == '4'
+    assert float(samples['xmas_message_latency_seconds_sum{stage="queued"}']) == hist.sum
@@ -0,0 +1,90 @@
+import pytest
+
+from neopixel_effects import AnimationScheduler, Effect, FrameEngine
+
+PERIOD = 0.125      # 8 fps, exact in binary so slot arithmetic is too
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeEvent(object):
+    """The scheduler's wakeup event; waiting advances the fake clock instead of sleeping."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.flag = False
+
+    def set(self):
+        self.flag = True
+
+    def clear(self):
+        self.flag = False
+
+    def is_set(self):
+        return self.flag
+
+    def wait(self, timeout=None):
+        if not self.flag and timeout is not None:
+            self.clock.now += timeout
+        return self.flag
+
+
+class Level(Effect):
+    """Every byte of the frame at `level`, so blends can be read back."""
+
+    def __init__(self, level):
+        self.level = level
+
+    def render(self, engine, t):
+        return bytes([self.level]) * (engine.num_pixels * engine.bpp)
+
+
+def scheduler_with(clock, frames, costs=None, actions=None):
+    """A scheduler that stops after `frames` frames; drawing frame n takes costs[n] seconds."""
+    shown = []
+    costs = costs or {}
+    actions = actions or {}
+
+    def show(frame):
+        shown.append((clock.now, frame[0]))
+        clock.now += costs.get(len(shown) - 1, 1 / 64.0)
+        if len(shown) in actions:
+            actions[len(shown)](scheduler)
+        if len(shown) == frames:
+            scheduler.stop()
+
+    scheduler = AnimationScheduler(FrameEngine(2), show, fps=8, clock=clock)
+    scheduler.changed = FakeEvent(clock)
+    return scheduler, shown
+
+
+def test_overrun_drops_the_missed_slots():
+    clock = Clock()
+    # frame 2 takes 4.75 frame periods to draw
+    scheduler, shown = scheduler_with(clock, 60, costs={2: 0.59375})
+    scheduler.play(Level(0))
+    scheduler.run()
+    assert [when for when, level in shown[:5]] == [0, 0.125, 0.25, 0.84375, 0.875]
+    stats = scheduler.stats()
+    # slots 3-5 skipped; slot 6 shown 0.09 s after its time, more than half a period
+    assert (stats['frames'], stats['dropped'], stats['late']) == (60, 3, 1)
+    assert stats['fps'] == pytest.approx(8.0, abs=0.1)
+
+
+def test_crossfade_blends_then_hands_over():
+    clock = Clock()
+    actions = {3: lambda scheduler: scheduler.play(Level(200), crossfade=0.5)}
+    scheduler, shown = scheduler_with(clock, 10, actions=actions)
+    scheduler.play(Level(0))
+    scheduler.run()
+    # alpha 0, 0.25, 0.5, 0.75 over the four slots of the crossfade, then the new effect
+    assert [level for when, level in shown] == [0, 0, 0, 0, 50, 100, 150, 200, 200, 200]
+    assert isinstance(scheduler.effect, Level) and scheduler.effect.level == 200
+    assert scheduler.stats()['dropped'] == 0
@@ -0,0 +1,77 @@
+import os
+
+from network_monitor import NetworkMonitor
+
+
+class ScriptedMonitor(NetworkMonitor):
+    """Runs `_run` on a fake clock: waits return at once, probes follow `results`."""
+
+    def __init__(self, results, events=None, max_waits=100, **kwargs):
+        self.now = 0.0
+        NetworkMonitor.__init__(self, clock=lambda: self.now, **kwargs)
+        self.results = list(results)
+        self.events = events or {}      # wait number -> callable; that wait is woken by a link event
+        self.max_waits = max_waits
+        self.waits = []
+        self.probed_at = []
+        self.changes = []
+        self.on_change = self.changes.append
+
+    def _open_netlink(self):
+        return None
+
+    def _wait_for_link_change(self, timeout):
+        self.waits.append(timeout)
+        event = self.events.get(len(self.waits))
+        if event is not None:
+            event()
+            return True
+        self.now += max(0.0, timeout)
+        if len(self.waits) >= self.max_waits:
+            self.stopping.set()
+        return False
+
+    def _connect(self):
+        self.probed_at.append(self.now)
+        ok = self.results.pop(0)
+        if not self.results:
+            self.stopping.set()
+        return ok
+
+
+def set_link(root, name, state):
+    os.makedirs(os.path.join(root, name), exist_ok=True)
+    with open(os.path.join(root, name, 'operstate'), 'w') as fh:
+        fh.write(state + '\n')
+
+
+def test_offline_needs_confirming_and_backs_off(tmp_path):
+    root = str(tmp_path)
+    set_link(root, 'eth0', 'up')
+    results = [True, False, True, False, False, False, False, False, True, False, False, False]
+    monitor = ScriptedMonitor(results, interval=30, min_backoff=2, max_backoff=8, confirm=2,
+                              sys_class_net=root)
+    monitor._run()
+    assert monitor.probed_at == [
+        0, 30,
+        32,                 # one failure while online: a quick retry, still online
+        62, 64,             # the second failure in a row goes offline
+        66, 70, 78, 86,     # backoff 2, 4, 8, capped at 8
+        116, 118, 120,      # back online reset the backoff
+    ]
+    assert monitor.changes == [True, False, True, False]
+    state = monitor.state()
+    assert (state['probes'], state['probe_failures']) == (12, 9)
+
+
+def test_no_link_goes_offline_without_probing(tmp_path):
+    root = str(tmp_path)
+    set_link(root, 'eth0', 'down')
+    monitor = ScriptedMonitor([True], events={3: lambda: set_link(root, 'eth0', 'up')},
+                              max_backoff=8, settle=1.0, sys_class_net=root)
+    monitor._run()
+    # offline straight away, then link checks only until the link comes up
+    assert monitor.waits == [0, 8, 8, 1.0]
+    assert monitor.probed_at == [9.0]
+    assert monitor.changes == [False, True]
+    assert monitor.state()['link_changes'] == 1
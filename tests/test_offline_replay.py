@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from offline_replay import OfflineReplay
+
+NOW = 1800000000.0
+DAY = 24 * 3600
+
+
+class StubJournal(object):
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.asked = []
+
+    def last(self, n):
+        self.asked.append(n)
+        return self.messages[-n:]
+
+
+def replay_of(messages, **kwargs):
+    journal = StubJournal(messages)
+    replay = OfflineReplay(journal, half_life=DAY, rng=random.Random(1225), clock=lambda: NOW, **kwargs)
+    replay.reload()
+    return replay, journal
+
+
+def test_only_the_window_is_read():
+    messages = [(NOW - n, 'message %d' % n) for n in range(10, 0, -1)]
+    replay, journal = replay_of(messages, window=3)
+    assert journal.asked == [3]
+    assert {replay.next() for _ in range(20)} == set(messages[-3:])
+
+
+def test_weights_favour_recent_and_unshown_messages():
+    replay, journal = replay_of([(NOW - 30 * DAY, 'ancient'), (NOW - DAY, 'yesterday'), (NOW, 'today')])
+    assert replay.weight(0, NOW) == pytest.approx(0.1)     # floored at min_recency
+    assert replay.weight(1, NOW) == pytest.approx(0.5)
+    assert replay.weight(2, NOW) == pytest.approx(1.0)
+    replay.shown[2] = 3
+    assert replay.weight(2, NOW) == pytest.approx(0.25)
+
+
+def test_picks_rotate_without_repeating():
+    replay, journal = replay_of([(NOW - 30 * DAY, 'ancient'), (NOW - DAY, 'yesterday'), (NOW, 'today')])
+    picks = [replay.next()[1] for _ in range(300)]
+    assert all(a != b for a, b in zip(picks, picks[1:]))
+    counts = {text: picks.count(text) for text in set(picks)}
+    assert counts['today'] > counts['yesterday'] > counts['ancient'] > 0
+
+
+def test_a_single_message_is_repeated_and_an_empty_journal_gives_none():
+    replay, journal = replay_of([(NOW, 'only')])
+    assert [replay.next() for _ in range(3)] == [(NOW, 'only')] * 3
+    replay, journal = replay_of([])
+    assert replay.next() is None
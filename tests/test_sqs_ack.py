@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from sqs_ack import AckBuffer
+from sqs_local import LocalSQS
+
+
+def receive(sqs, count):
+    for n in range(count):
+        sqs.send_message(QueueUrl='local', MessageBody='message %d' % n)
+    resp = sqs.receive_message(QueueUrl='local', MaxNumberOfMessages=count)
+    return [m['ReceiptHandle'] for m in resp['Messages']]
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_full_batch_is_flushed_without_waiting_for_the_timer():
+    sqs = LocalSQS()
+    acks = AckBuffer(sqs, 'local', flush_interval=60)
+    try:
+        receipts = receive(sqs, 10)
+        for receipt in receipts[:9]:
+            acks.add(receipt)
+        time.sleep(0.1)
+        assert acks.deleted == 0
+        acks.add(receipts[9])
+        assert wait_for(lambda: acks.deleted == 10)
+        assert sqs.calls['delete_message_batch'] == 1
+        assert sqs.messages == []
+    finally:
+        acks.close()
+
+
+def test_timer_flushes_a_partial_batch():
+    sqs = LocalSQS()
+    acks = AckBuffer(sqs, 'local', flush_interval=0.05)
+    try:
+        receipts = receive(sqs, 3)
+        for receipt in receipts:
+            acks.add(receipt)
+        assert wait_for(lambda: acks.deleted == 3)
+        assert sqs.messages == []
+    finally:
+        acks.close()
+
+
+def test_transient_failures_are_retried_on_the_next_flush():
+    sqs = LocalSQS(fail_rate=1.0)
+    settled = {}
+    acks = AckBuffer(sqs, 'local', max_attempts=3, on_result=settled.__setitem__)
+    receipts = receive(sqs, 4)
+    acks.pending = [(receipt, 0) for receipt in receipts]   # queued without starting the worker
+    assert acks.flush() == 0
+    assert [attempts for receipt, attempts in acks.pending] == [1, 1, 1, 1]
+    assert settled == {}
+    sqs.fail_rate = 0.0
+    assert acks.flush() == 4
+    assert acks.pending == []
+    assert settled == dict.fromkeys(receipts, True)
+    assert sqs.messages == []
+
+
+def test_gives_up_after_max_attempts():
+    sqs = LocalSQS(fail_rate=1.0)
+    settled = {}
+    acks = AckBuffer(sqs, 'local', max_attempts=3, on_result=settled.__setitem__)
+    receipts = receive(sqs, 2)
+    acks.pending = [(receipt, 0) for receipt in receipts]
+    for _ in range(3):
+        assert acks.flush() == 0
+    assert acks.pending == []
+    assert acks.failed == 2
+    assert settled == dict.fromkeys(receipts, False)
+    assert len(sqs.messages) == 2
+
+
+def test_sender_faults_are_not_retried():
+    sqs = LocalSQS()
+    settled = {}
+    acks = AckBuffer(sqs, 'local', on_result=settled.__setitem__)
+    acks.pending = [('not-a-receipt', 0)]
+    assert acks.flush() == 0
+    assert acks.pending == []
+    assert settled == {'not-a-receipt': False}
+
+
+def test_full_batch_wakes_the_asyncio_flusher():
+    async def scenario():
+        sqs = LocalSQS()
+        acks = AckBuffer(sqs, 'local', flush_interval=60)
+        flusher = asyncio.ensure_future(acks.run_async(None))
+        await asyncio.sleep(0.01)
+        receipts = receive(sqs, 10)
+        loop = asyncio.get_running_loop()
+        # receipts are added from the display's executor thread in the jumper
+        await loop.run_in_executor(None, lambda: [acks.add(receipt) for receipt in receipts])
+        for _ in range(200):
+            if acks.deleted == 10:
+                break
+            await asyncio.sleep(0.01)
+        acks.running = False
+        flusher.cancel()
+        return acks.deleted, acks.thread
+    deleted, thread = asyncio.run(scenario())
+    assert deleted == 10
+    assert thread is None   # no worker thread under asyncio
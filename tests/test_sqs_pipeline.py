@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+from sqs_local import LocalSQS
+from sqs_pipeline import MessageFetcher
+
+
+class StubSQS(object):
+    """Always has `depth` messages waiting."""
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.calls = {}
+
+    def _call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, **kwargs):
+        self._call('receive_message')
+        count = min(MaxNumberOfMessages, self.depth)
+        return {'Messages': [{'ReceiptHandle': 'r%d' % n, 'Body': 'message'} for n in range(count)]}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None):
+        self._call('get_queue_attributes')
+        return {'Attributes': {'ApproximateNumberOfMessages': str(self.depth)}}
+
+
+class Clock(object):
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_fetcher_waits_for_the_network():
+    async def scenario():
+        sqs = LocalSQS()
+        sqs.send_message(QueueUrl='local', MessageBody='Merry Christmas')
+        fetcher = MessageFetcher(sqs, 'local', wait_time=0.2, visibility_timeout=1, renew_margin=0.9)
+        arrived = asyncio.Event()
+        online = asyncio.Event()
+        task = asyncio.ensure_future(fetcher.run_async(None, arrived, online))
+        await asyncio.sleep(0.3)
+        offline_calls = dict(sqs.calls)
+        online.set()
+        await asyncio.wait_for(arrived.wait(), 2)
+        await asyncio.sleep(0.6)
+        renewed = fetcher.renewed
+        online.clear()
+        await asyncio.sleep(0.05)
+        calls = dict(sqs.calls)
+        await asyncio.sleep(1)
+        fetcher.stop()
+        task.cancel()
+        return offline_calls, renewed, calls, dict(sqs.calls), fetcher.pending()
+    offline_calls, renewed, calls, later, pending = asyncio.run(scenario())
+    # nothing is tried while offline, before or after the message came in
+    assert offline_calls.get('receive_message', 0) == 0
+    assert pending == 1
+    assert renewed >= 1
+    assert later == calls
+
+
+def test_depth_sample_runs_off_the_event_loop():
+    class DepthSQS(LocalSQS):
+        def get_queue_attributes(self, QueueUrl, AttributeNames=None):
+            self.sampled_on.append(threading.current_thread())
+            return LocalSQS.get_queue_attributes(self, QueueUrl, AttributeNames)
+
+    async def scenario():
+        sqs = DepthSQS()
+        sqs.sampled_on = []
+        for n in range(5):
+            sqs.send_message(QueueUrl='local', MessageBody='message %d' % n)
+        # the buffer fills on the first receive; later samples come from the full-buffer wait
+        fetcher = MessageFetcher(sqs, 'local', buffer_size=2, wait_time=0.2, depth_interval=0.01)
+        task = asyncio.ensure_future(fetcher.run_async(None))
+        for _ in range(300):
+            if len(sqs.sampled_on) >= 2:
+                break
+            await asyncio.sleep(0.01)
+        fetcher.stop()
+        task.cancel()
+        return sqs.sampled_on, fetcher.remote_depth
+    sampled_on, depth = asyncio.run(scenario())
+    assert len(sampled_on) >= 2
+    assert threading.main_thread() not in sampled_on
+    assert depth == 3
+
+
+def test_depth_is_sampled_at_most_every_depth_interval():
+    sqs = StubSQS(depth=50)
+    clock = Clock()
+    fetcher = MessageFetcher(sqs, 'queue', buffer_size=100, depth_interval=30, clock=clock)
+    fetcher._receive(10)        # a full receive: the queue has more
+    assert sqs.calls['get_queue_attributes'] == 1
+    assert fetcher.backlog() == 60
+    clock.now = 10
+    fetcher._receive(10)
+    assert sqs.calls['get_queue_attributes'] == 1
+    clock.now = 30
+    fetcher._receive(10)
+    assert sqs.calls['get_queue_attributes'] == 2
+    # a short receive means the queue is drained: no sample, and no remote backlog
+    sqs.depth = 3
+    clock.now = 90
+    fetcher._receive(10)
+    assert sqs.calls['get_queue_attributes'] == 2
+    assert fetcher.backlog() == fetcher.pending() == 33
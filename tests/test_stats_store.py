@@ -0,0 +1,58 @@
+import json
+import os
+
+import pytest
+
+from stats_store import MinuteRing, write_json_atomic
+
+MINUTE = 29000000       # a minute since the epoch, in early 2025
+
+
+def test_write_json_atomic_keeps_the_old_file_on_failure(tmp_path):
+    path = str(tmp_path / 'stats.json')
+    write_json_atomic(path, {'messages': 1})
+    with pytest.raises(TypeError):
+        write_json_atomic(path, {'messages': object()})
+    with open(path, encoding='utf-8') as fh:
+        assert json.load(fh) == {'messages': 1}
+    write_json_atomic(path, {'messages': 2})
+    with open(path, encoding='utf-8') as fh:
+        assert json.load(fh) == {'messages': 2}
+    assert not os.path.exists(path + '.tmp')
+
+
+def test_torn_record_is_skipped(tmp_path):
+    ring = MinuteRing(str(tmp_path / 'ring'), ['messages', 'deletes'], slots=10)
+    for n in range(3):
+        ring.write({'messages': 10 + n, 'deletes': n}, when=(MINUTE + n) * 60)
+    # a power cut halfway through the middle record
+    with open(ring.path, 'r+b') as fh:
+        fh.seek(ring.HEADER.size + ((MINUTE + 1) % ring.slots) * ring.record.size + ring.record.size - 1)
+        fh.write(b'\xff')
+    assert ring.records() == [(MINUTE, {'messages': 10, 'deletes': 0}),
+                              (MINUTE + 2, {'messages': 12, 'deletes': 2})]
+    assert ring.latest() == {'messages': 12, 'deletes': 2}
+
+
+def test_file_is_recreated_when_the_layout_changes(tmp_path):
+    path = str(tmp_path / 'ring')
+    MinuteRing(path, ['messages'], slots=10).write({'messages': 5}, when=MINUTE * 60)
+    ring = MinuteRing(path, ['messages', 'deletes'], slots=10)
+    # the old header does not match: nothing is read from it
+    assert ring.records() == []
+    ring.write({'messages': 6, 'deletes': 1}, when=MINUTE * 60)
+    assert ring.records() == [(MINUTE, {'messages': 6, 'deletes': 1})]
+    assert os.path.getsize(path) == ring.HEADER.size + 10 * ring.record.size
+
+
+def test_series_carries_gaps_and_counts_resets_from_zero(tmp_path):
+    ring = MinuteRing(str(tmp_path / 'ring'), ['messages'], slots=10)
+    ring.write({'messages': 10}, when=(MINUTE - 3) * 60)
+    ring.write({'messages': 15}, when=(MINUTE - 2) * 60)
+    # nothing at MINUTE - 1, then a restart
+    ring.write({'messages': 3}, when=MINUTE * 60)
+    assert ring.series(minutes=3, now=MINUTE * 60 + 30) == [
+        ((MINUTE - 2) * 60, {'messages': 5}),
+        ((MINUTE - 1) * 60, {'messages': 0}),
+        (MINUTE * 60, {'messages': 3}),
+    ]